@@ -1,8 +1,14 @@
 from flask import Flask, render_template, request, jsonify, session, flash
 from flask import redirect, url_for, abort, send_from_directory
-from modules.external.zabbix import get_hosts, get_unknown_hosts
-from modules.external.graylog import get_logs
-from modules.external.glpi import get_glpi_data
+from modules.external.zabbix import zabbix_client, item_cache
+from modules.external.zabbix_poller import zabbix_poller
+from modules.external.zabbix_state import alert_state_tracker, setup_zabbix_state_table
+from modules.external.graylog import (
+    get_logs, graylog_ingestor, graylog_buffer, setup_graylog_ingest_table, load_graylog_templates
+)
+from modules.external.glpi import get_glpi_data, setup_glpi_sync_state_table, sync_cache as glpi_sync_cache
+from modules.external.glpi_http import glpi_http
+from modules.external.glpi_dropdowns import dropdown_resolver
 from modules.auth.ldap_auth import authenticate_user
 from config import *  # Importujemy wszystkie zmienne konfiguracyjne
 import urllib3
@@ -18,10 +24,12 @@ from modules.core.database import (
     get_db_cursor, 
     get_historical_metrics, 
     get_host_status_history,
+    get_host_status_current,
     get_messages_timeline,
-    get_detailed_messages  # Dodaj ten import
+    get_detailed_messages,  # Dodaj ten import
+    get_top_templates
 )
-from datetime import datetime, timedelta  # Keep this import as is
+from datetime import datetime, timedelta, timezone  # Keep this import as is
 from modules.data.user_data import update_user_profile
 # Import the new permissions module
 from modules.core.permissions import permission_required, role_required, admin_required, has_permission, get_user_permissions
@@ -32,6 +40,7 @@ import logging
 from modules.tasks.tasks import tasks, setup_tasks_tables  # Import from the modules directory
 # Import report functions outside conditional blocks to ensure they're always available
 from modules.reports.reports import ReportGenerator, get_recent_reports, get_report_by_id, delete_report, REPORTS_DIR
+from modules.reports.sla import get_host_sla
 
 # Handle PDF dependency imports
 import importlib.util
@@ -141,6 +150,12 @@ def isdigit_filter(s):
 
 # Import translation utility
 from modules.utils.translations import get_message
+from modules.utils.metric_format import format_metric
+
+@app.template_filter('format_metric')
+def format_metric_filter(value, metric_type, unit=''):
+    """Format a raw numeric metric for display"""
+    return format_metric(metric_type, value, unit)
 
 # Add this with the other filters
 @app.template_filter('count_values')
@@ -288,6 +303,16 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+@app.route('/api/glpi/sync_stats')
+@login_required
+@permission_required('view_glpi')
+def get_glpi_sync_stats():
+    """GLPI request latency per endpoint, sync progress, dropdown resolver and sync cache counters"""
+    stats = glpi_http.get_stats()
+    stats['dropdowns'] = dropdown_resolver.get_stats()
+    stats['sync_cache'] = glpi_sync_cache.get_stats()
+    return jsonify(stats)
+
 @app.route('/api/glpi/refresh')
 @login_required
 @permission_required('view_glpi')
@@ -298,7 +323,9 @@ def refresh_glpi():
         logger.info("Starting GLPI data refresh from API")
         
         # First refresh data from API to database with clear parameters
-        refreshed_data = get_glpi_data(refresh_api=True, from_db=False)
+        # (?full=1 pomija synchronizację przyrostową)
+        full = request.args.get('full', '0') == '1'
+        refreshed_data = get_glpi_data(refresh_api=True, from_db=False, full=full)
         
         # Then get fresh data from database
         glpi_cache = get_glpi_data(refresh_api=False, from_db=True)
@@ -476,6 +503,14 @@ def index():
         logger.error(f"Error loading dashboard: {e}")
         return render_template('errors/error.html', error=str(e)), 500
 
+def get_zabbix_snapshot():
+    """Return the poller snapshot, seeding it synchronously on the first request"""
+    zabbix_poller.ensure_started()
+    snapshot = zabbix_poller.get_snapshot()
+    if snapshot is None:
+        snapshot = zabbix_poller.refresh_now(max_age=zabbix_poller.interval)
+    return snapshot
+
 # Add new API endpoints for cached data
 @app.route('/api/zabbix/refresh')
 @login_required
@@ -483,11 +518,7 @@ def index():
 def get_cached_zabbix_data():
     start_time = datetime.now()
     
-    @cache.cached(timeout=60, key_prefix='zabbix_data')
-    def get_data():
-        return get_hosts()
-    
-    data = get_data()
+    data = get_zabbix_snapshot().data
     response_time = (datetime.now() - start_time).total_seconds()
     logger.info(f"Zabbix data retrieved in {response_time:.2f} seconds")
     
@@ -519,9 +550,37 @@ def get_cached_graylog_data():
 @login_required
 @permission_required('view_monitoring')
 def force_refresh_zabbix():
-    cache.delete('zabbix_data')
+    zabbix_poller.refresh_now()
     return get_cached_zabbix_data()
 
+@app.route('/api/zabbix/client_stats')
+@login_required
+@permission_required('view_monitoring')
+def get_zabbix_client_stats():
+    """Per-method Zabbix API latency, incremental polling counters and the age of the poller snapshot"""
+    snapshot = zabbix_poller.get_snapshot()
+    return jsonify({
+        'calls': zabbix_client.get_stats(),
+        'items': item_cache.get_stats(),
+        'poller': {
+            'interval': zabbix_poller.interval,
+            'last_poll': datetime.fromtimestamp(snapshot.fetched_at).strftime('%Y-%m-%d %H:%M:%S') if snapshot else None,
+            'last_poll_duration': round(snapshot.duration, 3) if snapshot else None,
+            'last_error': snapshot.error if snapshot else None
+        }
+    })
+
+@app.route('/api/zabbix/problems')
+@login_required
+@permission_required('view_monitoring')
+def get_zabbix_open_problems():
+    """Open Zabbix problems with the time they have been open"""
+    try:
+        return jsonify({'problems': alert_state_tracker.get_open_problems()})
+    except Exception as e:
+        logger.error(f"Error in get_zabbix_open_problems: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/glpi/force_refresh')
 @login_required
 @permission_required('view_glpi')
@@ -546,6 +605,15 @@ def force_refresh_glpi():
         logger.error(f"Error in force_refresh_glpi: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/graylog/ingest_stats')
+@login_required
+@permission_required('view_logs')
+def get_graylog_ingest_stats():
+    """Incremental ingest counters, high-water mark, ingest lag and result cache counters"""
+    stats = graylog_ingestor.get_stats()
+    stats['buffer'] = graylog_buffer.get_stats()
+    return jsonify(stats)
+
 @app.route('/api/graylog/force_refresh')
 @login_required
 @permission_required('view_logs')
@@ -613,9 +681,10 @@ def unknown_hosts():
 def get_data():
     """API endpoint zwraca dane Zabbix, Graylog i informacje o nieznanych hostach"""
     try:
-        zabbix_data = get_hosts()
+        snapshot = get_zabbix_snapshot()
+        zabbix_data = snapshot.data
         graylog_data = get_logs()
-        unknown_hosts = get_unknown_hosts()
+        unknown_hosts = snapshot.unknown_hosts
         
         return {
             'zabbix': zabbix_data,
@@ -874,6 +943,49 @@ def get_graylog_messages():
         print(f"Error in get_graylog_messages: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/graylog/templates')
+@login_required
+@permission_required('view_logs')
+def get_graylog_templates_summary():
+    """Most frequent message templates of the last range minutes/hours/days"""
+    try:
+        range_value = request.args.get('range', 5, type=int)
+        range_type = request.args.get('range_type', 'minutes')
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        
+        # Wiadomości i rollupy są zapisane w UTC (jak w get_logs)
+        end_time = datetime.now(timezone.utc).replace(tzinfo=None)
+        if range_type == 'hours':
+            start_time = end_time - timedelta(hours=range_value)
+        elif range_type == 'days':
+            start_time = end_time - timedelta(days=range_value)
+        else:
+            range_type = 'minutes'
+            start_time = end_time - timedelta(minutes=range_value)
+        
+        templates = get_top_templates(start_time, end_time, limit=limit)
+        return jsonify({
+            'templates': [
+                {
+                    # Identyfikator jako tekst - BIGINT przekracza zakres liczb całkowitych w JS
+                    'template_id': str(row['template_id']),
+                    'template': row['template'],
+                    'first_seen': row['first_seen'].strftime('%Y-%m-%d %H:%M:%S'),
+                    'last_seen': row['last_seen'].strftime('%Y-%m-%d %H:%M:%S'),
+                    'high_count': row['high_count'],
+                    'medium_count': row['medium_count'],
+                    'low_count': row['low_count'],
+                    'total_count': row['total_count']
+                }
+                for row in templates
+            ],
+            'total_count': sum(row['total_count'] for row in templates),
+            'time_range': f"Last {range_value} {range_type} • {len(templates)} templates"
+        })
+    except Exception as e:
+        print(f"Error in get_graylog_templates_summary: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/graylog/timeline')
 @login_required
 @permission_required('view_logs')
@@ -1149,6 +1261,9 @@ def get_host_metrics_history(host_id):
         start_time = end_time - timedelta(days=days)
         
         metrics = get_historical_metrics(host_id, metric_type, start_time, end_time)
+        # Wartości są liczbowe; tekst do wyświetlenia formatujemy dopiero tutaj
+        for metric in metrics:
+            metric['display'] = format_metric(metric['metric_type'], metric['value'], metric.get('unit') or '')
         return jsonify({'metrics': metrics})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1156,11 +1271,20 @@ def get_host_metrics_history(host_id):
 @app.route('/api/history/status/<host_id>')
 @login_required
 def get_host_history(host_id):
-    """Get historical status for a host"""
+    """Get status transitions, current status and availability (SLA) for a host"""
     try:
         limit = int(request.args.get('limit', 100))
+        days = int(request.args.get('days', 7))
+        
+        end_time = datetime.now()
+        start_time = end_time - timedelta(days=days)
+        
         history = get_host_status_history(host_id, limit)
-        return jsonify({'history': history})
+        return jsonify({
+            'history': history,
+            'current': get_host_status_current(host_id),
+            'sla': get_host_sla(host_id, start_time, end_time)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1427,6 +1551,7 @@ def generate_report():
         start_date = request.form.get('startDate')
         end_date = request.form.get('endDate')
         report_language = request.form.get('reportLanguage', 'current')
+        reclassify = request.form.get('reclassify', 'false').lower() == 'true'
         
         # If report language is set to current, use the interface language
         if report_language == 'current':
@@ -1479,7 +1604,8 @@ def generate_report():
                 end_date=end_date_obj,
                 record_limit=500,
                 preview=False,
-                language=report_language
+                language=report_language,
+                reclassify=reclassify
             )
         except Exception as e:
             logger.error(f"Error initializing report generator: {str(e)}")
@@ -2048,7 +2174,7 @@ def update_role_permissions():
 
 if __name__ == '__main__':
     # Import required modules
-    from modules.core.database import setup_departments_table, ensure_default_departments
+    from modules.core.database import setup_departments_table, ensure_default_departments, setup_metrics_tables, setup_host_status_tables, setup_graylog_rollup_tables, setup_graylog_message_hash, setup_graylog_template_tables
     from modules.core.permissions import initialize_roles_and_permissions
     from modules.tasks.tasks_permissions import initialize_task_permissions
     from modules.admin.permission_cleanup import cleanup_task_view_permissions
@@ -2057,6 +2183,15 @@ if __name__ == '__main__':
     setup_departments_table()
     ensure_default_departments()
     setup_tasks_tables()  # Add this line to initialize tasks tables
+    setup_zabbix_state_table()
+    setup_metrics_tables()
+    setup_host_status_tables()
+    setup_graylog_ingest_table()
+    setup_graylog_message_hash()
+    setup_graylog_rollup_tables()
+    setup_graylog_template_tables()
+    load_graylog_templates()
+    setup_glpi_sync_state_table()
     
     print("Initializing roles and permissions system...")
     if initialize_roles_and_permissions():
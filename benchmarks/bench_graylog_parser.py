@@ -0,0 +1,133 @@
+"""
+Benchmark: previous try/except payload parsing vs. the fast-path parser.
+
+Builds a synthetic stream of Graylog search results (10k messages per round
+by default) with a realistic mix of nested Forms JSON payloads, repeated
+heartbeat/session lines, plain text lines and truncated JSON, and reports
+CPU time per 10k messages for the previous extract_nested_json() /
+parse_log_message() pair and for modules.external.graylog_parser. Both must
+produce identical results. No Graylog connection is needed.
+
+Usage:
+    python benchmarks/bench_graylog_parser.py --messages 10000 --rounds 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.external import graylog_parser
+
+
+def legacy_extract_nested_json(message_str):
+    """The previous extract_nested_json() from graylog.py"""
+    try:
+        dash_pos = message_str.find('-')
+        if dash_pos == -1:
+            return None
+        process_id = message_str[:dash_pos].strip()
+        json_start = message_str.find('{', dash_pos)
+        if json_start != -1:
+            data = json.loads(message_str[json_start:])
+            data['process_id'] = process_id
+            return data
+        return None
+    except json.JSONDecodeError:
+        return None
+
+
+def legacy_parse_log_message(raw_message):
+    """The previous parse_log_message() from graylog.py (without the flask error print)"""
+    try:
+        message_data = json.loads(raw_message) if isinstance(raw_message, str) else raw_message
+        inner_message = message_data.get('message', '')
+        nested_data = legacy_extract_nested_json(str(inner_message))
+        if nested_data:
+            return {
+                'process_id': nested_data.get('process_id'),
+                'formssessionname': nested_data.get('formsSessionName'),
+                'formsformname': nested_data.get('formsFormName'),
+                'formsdbsessionid': nested_data.get('formsDbSessionId'),
+                'formsusername': nested_data.get('formsUsername'),
+                'callsite': nested_data.get('callSite'),
+                'thread': nested_data.get('thread'),
+                'type': nested_data.get('type', 'INFO'),
+                'message': nested_data.get('message', '').strip()
+            }
+        return {'message': inner_message}
+    except (json.JSONDecodeError, AttributeError):
+        return {'message': str(raw_message)}
+
+
+def forms_payload(rng, message, level='INFO'):
+    return json.dumps({
+        'formsSessionName': f"FRM{rng.randint(1, 200)}",
+        'formsFormName': rng.choice(['ORDERS', 'INVOICES', 'EMP', 'DEPT']),
+        'formsDbSessionId': str(rng.randint(100, 999)),
+        'formsUsername': f"USR{rng.randint(1, 300)}",
+        'callSite': 'oracle.forms.engine.Runform',
+        'thread': f"[ACTIVE] ExecuteThread: '{rng.randint(0, 50)}'",
+        'type': level,
+        'message': message
+    })
+
+
+def make_stream(count, seed):
+    rng = random.Random(seed)
+    heartbeats = [f"wls_forms{i} - {forms_payload(random.Random(i), 'Heartbeat OK')}" for i in range(20)]
+    stream = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.45:
+            text = f"{rng.randint(1000, 99999)} - " + forms_payload(
+                rng, f"Executing query on block EMP returned {rng.randint(1, 500)} rows",
+                rng.choice(['INFO', 'INFO', 'WARN', 'ERROR']))
+        elif kind < 0.75:
+            # Powtarzające się wpisy (heartbeat, otwarcie/zamknięcie sesji)
+            text = rng.choice(heartbeats)
+        elif kind < 0.97:
+            text = (f"<{rng.randint(1, 9)}> WLS_FORMS - Server state changed to RUNNING "
+                    f"after {rng.randint(1, 900)} ms")
+        else:
+            # Ucięty JSON
+            text = f"{rng.randint(1000, 99999)} - " + forms_payload(rng, 'truncated')[:80]
+        stream.append({'message': text, 'source': 'forms01', '_id': str(rng.getrandbits(64))})
+    return stream
+
+
+def measure(label, func, rounds):
+    cpu = 0.0
+    results = []
+    count = 0
+    for stream in rounds:
+        start = time.process_time()
+        results.extend(func(fields) for fields in stream)
+        cpu += time.process_time() - start
+        count += len(stream)
+    per_10k = cpu / count * 10000
+    print(f"{label:<10} {count:>8} messages {cpu * 1000:>9.1f} ms CPU {per_10k * 1000:>9.1f} ms / 10k msg")
+    return per_10k, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    # Kolejne rundy to kolejne odświeżenia - cache parsera jest już częściowo ciepły
+    rounds = [make_stream(args.messages, seed) for seed in range(args.rounds)]
+    print(f"JSON backend: {'orjson' if graylog_parser.ORJSON_AVAILABLE else 'json'}")
+    legacy, legacy_results = measure('legacy', legacy_parse_log_message, rounds)
+    fast, fast_results = measure('fast-path', graylog_parser.parse_log_message, rounds)
+
+    mismatches = sum(1 for a, b in zip(legacy_results, fast_results) if a != b)
+    print(f"fast-path vs legacy: {legacy / fast:.2f}x, {mismatches} mismatches, cache {graylog_parser.get_cache_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: substring-chain message classification vs. the compiled LogClassifier.
+
+Builds a synthetic corpus of Oracle Forms / WebLogic style log messages
+(100k by default, mostly routine lines with a realistic share of errors,
+warnings, timeouts and access denials) and compares the previous chain of
+`in` tests from process_message() with LogClassifier.classify(). Both must
+produce identical results. No Graylog or database connection is needed.
+
+Usage:
+    python benchmarks/bench_log_classifier.py --messages 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.utils.log_classifier import log_classifier
+
+MESSAGE_TEMPLATES = [
+    ('INFO', 'Session {n} opened for user USR{n} on form FRM{m}'),
+    ('INFO', 'Executing query on block {blk} returned {n} rows in {m} ms'),
+    ('INFO', 'Commit completed for transaction {n}'),
+    ('INFO', 'Form FRM{m} loaded from /u01/app/forms/frm{m}.fmx'),
+    ('INFO', 'Heartbeat received from managed server WLS_FORMS{m}'),
+    ('INFO', 'Service ReportsServer{m} started'),
+    ('INFO', 'User USR{n} logged out, session duration {m} s'),
+    ('WARN', 'Slow response from database, {m} ms for block {blk}'),
+    ('INFO', 'Warning: deprecated built-in used in FRM{m}'),
+    ('INFO', 'Access denied for user USR{n} to module FRM{m}'),
+    ('INFO', 'Connection timeout after {m} ms to db{n}.example.local'),
+    ('ERROR', 'FRM-40735: ON-ERROR trigger raised unhandled exception ORA-{n}'),
+    ('INFO', 'Unexpected error while processing request {n}'),
+    ('INFO', 'Service ReportsServer{m} stopped'),
+    ('INFO', 'Forbidden: invalid token for USR{n}'),
+]
+
+# Rutynowe wpisy dominują w prawdziwym strumieniu logów
+TEMPLATE_WEIGHTS = [20, 20, 15, 10, 10, 2, 8, 3, 2, 2, 2, 2, 2, 1, 1]
+
+
+def make_corpus(count):
+    random.seed(42)
+    corpus = []
+    for _ in range(count):
+        level, template = random.choices(MESSAGE_TEMPLATES, weights=TEMPLATE_WEIGHTS)[0]
+        message = template.format(n=random.randint(1000, 99999), m=random.randint(1, 500),
+                                  blk=random.choice(['EMP', 'DEPT', 'ORDERS', 'INVOICES']))
+        corpus.append((level, message))
+    return corpus
+
+
+def classify_legacy(message, level):
+    """The substring chain previously used in process_message()"""
+    actual_message = message.lower()
+    level = level.upper()
+
+    severity = ("high" if level == "ERROR" or "error" in actual_message else
+                "medium" if level == "WARN" or "warning" in actual_message else
+                "low")
+
+    category = ("System Error" if "error" in actual_message else
+                "Security Alert" if any(k in actual_message for k in ["unauthorized", "forbidden", "denied"]) else
+                "Performance Issue" if any(k in actual_message for k in ["timeout", "slow", "performance"]) else
+                "Service Status" if any(k in actual_message for k in ["service", "started", "stopped"]) else
+                "General Warning")
+    return severity, category
+
+
+def measure(label, func, corpus):
+    start = time.perf_counter()
+    results = [func(message, level) for level, message in corpus]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {len(corpus):>8} messages {elapsed * 1000:>9.1f} ms {len(corpus) / elapsed:>12.0f} msg/s")
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages)
+    legacy, legacy_results = measure('legacy', classify_legacy, corpus)
+    compiled, compiled_results = measure('classifier', log_classifier.classify, corpus)
+
+    mismatches = sum(1 for a, b in zip(legacy_results, compiled_results) if a != b)
+    print(f"classifier vs legacy: {legacy / compiled:.2f}x, {mismatches} mismatches")
+
+
+if __name__ == '__main__':
+    main()
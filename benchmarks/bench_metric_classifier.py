@@ -0,0 +1,148 @@
+"""
+Benchmark: substring-chain item classification vs. the metric key registry.
+
+Builds a synthetic host.get payload (100k items by default) with a realistic
+mix of Linux/Windows agent keys and compares the previous if/elif chain with
+MetricKeyRegistry.collect(). No Zabbix or database connection is needed.
+
+Usage:
+    python benchmarks/bench_metric_classifier.py --items 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.external.zabbix_metrics import metric_registry
+
+ITEMS_PER_HOST = 50
+
+KEY_TEMPLATES = [
+    ('system.cpu.util', '%'),
+    ('system.cpu.util[,idle]', '%'),
+    ('system.cpu.load[all,avg1]', ''),
+    ('vm.memory.size[total]', 'B'),
+    ('vm.memory.size[available]', 'B'),
+    ('vfs.fs.size[{fs},total]', 'B'),
+    ('vfs.fs.size[{fs},used]', 'B'),
+    ('vfs.fs.size[{fs},pused]', '%'),
+    ('vfs.fs.inode[{fs},pfree]', '%'),
+    ('net.if.in["{iface}"]', 'bps'),
+    ('net.if.out["{iface}"]', 'bps'),
+    ('net.if.in["{iface}",errors]', ''),
+    ('icmpping', ''),
+    ('icmppingsec', 's'),
+    ('icmppingloss', '%'),
+    ('system.uptime', 's'),
+    ('proc.num[]', ''),
+    ('agent.ping', ''),
+    ('system.swap.size[,pfree]', '%'),
+    ('vfs.dev.read.rate[{dev}]', 'r/s'),
+]
+
+
+def make_payload(item_count):
+    random.seed(42)
+    hosts = []
+    for h in range(item_count // ITEMS_PER_HOST):
+        items = []
+        for i in range(ITEMS_PER_HOST):
+            template, unit = KEY_TEMPLATES[i % len(KEY_TEMPLATES)]
+            key = template.format(
+                fs=random.choice(['/', '/boot', '/var', '/home', 'C:', 'D:']),
+                iface=random.choice(['eth0', 'eth1', 'ens192', 'lo']),
+                dev=random.choice(['sda', 'sdb', 'nvme0n1'])
+            )
+            items.append({'key_': key, 'lastvalue': str(random.uniform(0, 10**9)), 'units': unit})
+        hosts.append({'hostid': str(10000 + h), 'items': items})
+    return hosts
+
+
+def classify_legacy(items):
+    """The substring chain previously used in get_hosts()"""
+    metrics = {}
+    for item in items:
+        key = item.get('key_', '')
+        value = item.get('lastvalue', '')
+        if 'system.cpu.util' in key:
+            metrics['cpu'] = float(value)
+        elif 'vm.memory.size[total]' in key:
+            metrics['memory'] = float(value)
+        elif 'vfs.fs.size' in key and 'total' in key:
+            metrics['disk'] = float(value)
+        elif 'net.if.in' in key or 'net.if.out' in key:
+            metrics['network'] = float(value)
+        elif 'icmpping' in key:
+            metrics['ping'] = 1.0 if value == '1' else 0.0
+        elif 'system.uptime' in key:
+            metrics['uptime'] = float(value)
+    return metrics
+
+
+def family_legacy(key):
+    """Key -> family part of the previous chain, without value parsing"""
+    if 'system.cpu.util' in key:
+        return 'cpu'
+    elif 'vm.memory.size[total]' in key:
+        return 'memory'
+    elif 'vfs.fs.size' in key and 'total' in key:
+        return 'disk'
+    elif 'net.if.in' in key or 'net.if.out' in key:
+        return 'network'
+    elif 'icmpping' in key:
+        return 'ping'
+    elif 'system.uptime' in key:
+        return 'uptime'
+    return None
+
+
+def measure_keys(label, func, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(keys):>8} keys  {elapsed * 1000:>9.1f} ms {len(keys) / elapsed:>12.0f} keys/s")
+    return elapsed
+
+
+def measure(label, func, hosts, item_count):
+    start = time.perf_counter()
+    series = 0
+    for host in hosts:
+        series += len(func(host['items']))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {item_count:>8} items {elapsed * 1000:>9.1f} ms "
+          f"{item_count / elapsed:>12.0f} items/s {series:>8} series")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args()
+
+    hosts = make_payload(args.items)
+    item_count = sum(len(h['items']) for h in hosts)
+
+    print("Key classification only:")
+    keys = [item['key_'] for host in hosts for item in host['items']]
+    legacy_keys = measure_keys('legacy', family_legacy, keys)
+    metric_registry.classify.cache_clear()
+    registry_keys = measure_keys('registry', metric_registry.classify, keys)
+    print(f"registry vs legacy: {legacy_keys / registry_keys:.2f}x")
+
+    print("Full collection (classification + value parsing + series):")
+    legacy = measure('legacy', classify_legacy, hosts, item_count)
+    metric_registry.classify.cache_clear()
+    cold = measure('registry', metric_registry.collect, hosts, item_count)
+    warm = measure('registry*', metric_registry.collect, hosts, item_count)
+    print(f"registry vs legacy: {legacy / cold:.2f}x (cold cache), {legacy / warm:.2f}x (warm cache)")
+    print("* second poll, key classification already memoized")
+    print("legacy keeps one value per family; the registry keeps every filesystem/interface series")
+
+
+if __name__ == '__main__':
+    main()
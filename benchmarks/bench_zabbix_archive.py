@@ -0,0 +1,101 @@
+"""
+Throughput benchmark: per-host Zabbix archiving vs. the batched archive API.
+
+Requires the MySQL database configured in modules/core/database.py.
+Rows are written with synthetic host ids and deleted afterwards.
+
+Usage:
+    python benchmarks/bench_zabbix_archive.py --hosts 2000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.core.database import get_db_cursor, archive_poll_results
+
+BENCH_HOST_ID_BASE = 900000000
+
+
+def make_hosts(count):
+    hosts = []
+    for i in range(count):
+        hosts.append({
+            'hostid': str(BENCH_HOST_ID_BASE + i),
+            'name': f'bench-host-{i:05d}',
+            'availability': 'Available' if i % 10 else 'Unavailable',
+            'metric_values': {
+                'cpu': {'value': float(i % 100), 'unit': '%'},
+                'memory': {'value': 8375186227.0, 'unit': 'B'},
+                'disk': {'value': 128849018880.0, 'unit': 'B'},
+                'network': {'value': 1310720.0, 'unit': 'bps'},
+                'ping': {'value': 1.0, 'unit': ''},
+                'uptime': {'value': 276480.0, 'unit': 's'}
+            }
+        })
+    return hosts
+
+
+def cleanup():
+    with get_db_cursor() as cursor:
+        cursor.execute("DELETE FROM performance_metrics WHERE host_id >= %s", (BENCH_HOST_ID_BASE,))
+        cursor.execute("DELETE FROM host_status_history WHERE host_id >= %s", (BENCH_HOST_ID_BASE,))
+        cursor.execute("DELETE FROM host_status_current WHERE host_id >= %s", (BENCH_HOST_ID_BASE,))
+
+
+def run_legacy(hosts):
+    # Poprzednia ścieżka: osobne połączenie i commit na hosta, jeden INSERT na metrykę
+    for host in hosts:
+        with get_db_cursor() as cursor:
+            for metric_type, metric in host['metric_values'].items():
+                cursor.execute("""
+                    INSERT INTO performance_metrics 
+                    (host_id, metric_type, value, numeric_value, unit, timestamp, details)
+                    VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s)
+                """, (host['hostid'], metric_type, metric['value'], metric['value'], metric['unit'], None))
+            # Wiersz statusu z blobem metryk przy każdym pollu
+            cursor.execute("""
+                INSERT INTO host_status_history 
+                (host_id, host_name, status, response_time, details)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (host['hostid'], host['name'], host['availability'].lower(), None, json.dumps(host['metric_values'])))
+
+
+def run_batched(hosts):
+    # Syntetyczne hosty to nie cała flota - nie zamykamy pozostałych
+    archive_poll_results(hosts, complete=False)
+
+
+def measure(label, func, hosts):
+    rows = sum(len(h['metric_values']) + 1 for h in hosts)
+    # get_db_cursor wypisuje komunikat przy każdym commicie - wyciszamy go na czas pomiaru
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func(hosts)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(hosts):>6} hosts {rows:>7} rows {elapsed:>8.2f}s {rows / elapsed:>10.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=2000)
+    args = parser.parse_args()
+
+    hosts = make_hosts(args.hosts)
+    try:
+        legacy = measure('legacy', run_legacy, hosts)
+        cleanup()
+        batched = measure('batched', run_batched, hosts)
+        print(f"speedup: {legacy / batched:.1f}x")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
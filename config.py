@@ -7,16 +7,63 @@ load_dotenv()
 # Konfiguracja Zabbix
 ZABBIX_URL = os.getenv("ZABBIX_URL")
 ZABBIX_TOKEN = os.getenv("ZABBIX_TOKEN")
+# Poller Zabbix działający w tle (interwał w sekundach)
+ZABBIX_POLL_INTERVAL = int(os.getenv("ZABBIX_POLL_INTERVAL", 60))
+ZABBIX_POLLER_ENABLED = os.getenv("ZABBIX_POLLER_ENABLED", "true").lower() == "true"
+# Opcjonalny plik JSON z regułami klasyfikacji kluczy itemów
+ZABBIX_METRIC_RULES = os.getenv("ZABBIX_METRIC_RULES")
+# Poll przyrostowy (tylko zmienione itemy) i co ile sekund pełna resynchronizacja
+ZABBIX_INCREMENTAL_POLLING = os.getenv("ZABBIX_INCREMENTAL_POLLING", "true").lower() == "true"
+ZABBIX_FULL_RESYNC_INTERVAL = int(os.getenv("ZABBIX_FULL_RESYNC_INTERVAL", 900))
+# Zakładka (s) przy pobieraniu historii - wartości spóźnione (np. przez proxy) ze starszym clock
+ZABBIX_HISTORY_OVERLAP = int(os.getenv("ZABBIX_HISTORY_OVERLAP", 5))
+# Pełny poll dzielony na shardy hostów (0 = jedno zapytanie host.get), 'hostid' lub 'group'
+ZABBIX_SHARD_SIZE = int(os.getenv("ZABBIX_SHARD_SIZE", 0))
+ZABBIX_SHARD_BY = os.getenv("ZABBIX_SHARD_BY", "hostid")
+ZABBIX_POLL_WORKERS = int(os.getenv("ZABBIX_POLL_WORKERS", 4))
+# Import historii (backfill): liczba równoległych zapytań i długość chunka w godzinach
+ZABBIX_BACKFILL_WORKERS = int(os.getenv("ZABBIX_BACKFILL_WORKERS", 4))
+ZABBIX_BACKFILL_CHUNK_HOURS = int(os.getenv("ZABBIX_BACKFILL_CHUNK_HOURS", 6))
 
 # Konfiguracja Graylog
 GRAYLOG_URL = os.getenv("GRAYLOG_URL")
 GRAYLOG_USERNAME = os.getenv("GRAYLOG_USERNAME")
 GRAYLOG_PASSWORD = os.getenv("GRAYLOG_PASSWORD")
+# Pobieranie przyrostowe: rozmiar strony, opóźnienie indeksowania (s) i limit okna wyników Graylog
+GRAYLOG_PAGE_SIZE = int(os.getenv("GRAYLOG_PAGE_SIZE", 500))
+GRAYLOG_INGEST_DELAY = int(os.getenv("GRAYLOG_INGEST_DELAY", 5))
+GRAYLOG_MAX_RESULT_WINDOW = int(os.getenv("GRAYLOG_MAX_RESULT_WINDOW", 10000))
+# Liczba wierszy w jednym INSERT przy zapisie wiadomości i ich kopii w system_logs
+GRAYLOG_WRITE_BATCH_SIZE = int(os.getenv("GRAYLOG_WRITE_BATCH_SIZE", 1000))
+# Liczba stron wyników pobieranych równolegle (po pierwszej stronie z total_results)
+GRAYLOG_FETCH_WORKERS = int(os.getenv("GRAYLOG_FETCH_WORKERS", 4))
+# Opcjonalny plik JSON z regułami ważności i kategorii wiadomości
+LOG_CLASSIFIER_RULES = os.getenv("LOG_CLASSIFIER_RULES")
+# Bufor wyników logów: limit pamięci w bajtach i czas życia wpisu w sekundach
+GRAYLOG_CACHE_MAX_BYTES = int(os.getenv("GRAYLOG_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+GRAYLOG_CACHE_TTL = int(os.getenv("GRAYLOG_CACHE_TTL", 24 * 60 * 60))
+# Grupowanie wiadomości w szablony: próg podobieństwa (0-1) i limit zapamiętanych szablonów
+LOG_TEMPLATE_SIMILARITY = float(os.getenv("LOG_TEMPLATE_SIMILARITY", 0.5))
+LOG_TEMPLATE_MAX_TEMPLATES = int(os.getenv("LOG_TEMPLATE_MAX_TEMPLATES", 5000))
 
 # Konfiguracja GLPI
 GLPI_URL = os.getenv("GLPI_URL")
 GLPI_USER_TOKEN = os.getenv("GLPI_USER_TOKEN")
 GLPI_APP_TOKEN = os.getenv("GLPI_APP_TOKEN")
+# Czas ważności (s) pobranych słowników GLPI (lokalizacje, modele, producenci, systemy, użytkownicy)
+GLPI_DROPDOWN_TTL = int(os.getenv("GLPI_DROPDOWN_TTL", 900))
+# Tryb synchronizacji: search (search/ i expand_dropdowns, jeden strumień stron) lub items (zapytania per element)
+GLPI_SYNC_MODE = os.getenv("GLPI_SYNC_MODE", "search")
+# Cache wyników synchronizacji po stronie serwera: czas świeżości (s) i limit pamięci w bajtach
+GLPI_SYNC_CACHE_TTL = int(os.getenv("GLPI_SYNC_CACHE_TTL", 900))
+GLPI_SYNC_CACHE_MAX_BYTES = int(os.getenv("GLPI_SYNC_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Równoległe wzbogacanie elementów (tryb items) i limit zapytań do GLPI (zapytań/s, 0 = bez limitu; burst)
+GLPI_ENRICH_WORKERS = int(os.getenv("GLPI_ENRICH_WORKERS", 8))
+GLPI_RATE_LIMIT = float(os.getenv("GLPI_RATE_LIMIT", 20))
+GLPI_RATE_BURST = int(os.getenv("GLPI_RATE_BURST", 40))
+# Synchronizacja przyrostowa (tylko elementy zmienione od ostatniej, date_mod) i odstęp (s) między pełnymi synchronizacjami
+GLPI_DELTA_SYNC = os.getenv("GLPI_DELTA_SYNC", "true").lower() == "true"
+GLPI_FULL_SYNC_INTERVAL = int(os.getenv("GLPI_FULL_SYNC_INTERVAL", 24 * 60 * 60))
 
 # Konfiguracja LDAP
 LDAP_SERVER = os.getenv("LDAP_SERVER")
@@ -26,5 +73,5 @@ LDAP_DOMAIN = os.getenv("LDAP_DOMAIN")
 LDAP_SERVICE_USER = os.getenv("LDAP_SERVICE_USER")
 LDAP_SERVICE_PASSWORD = os.getenv("LDAP_SERVICE_PASSWORD")
 
-
-
+# Wspólny cache dla wszystkich workerów (np. redis://localhost:6379/0), puste = pamięć procesu
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
@@ -0,0 +1,185 @@
+"""
+Memory-bounded cache with LRU eviction and TTL.
+
+Entries are kept under a byte budget (the pickled size of each value);
+when a new entry does not fit, the least recently used entries are evicted.
+Expired entries are dropped lazily on access and during eviction, so no
+cleanup thread is needed.
+
+With CACHE_REDIS_URL set (and the redis package installed) entries are
+stored in Redis instead, so every gunicorn worker sees one copy; TTL is
+then enforced by Redis and the overall memory limit by its maxmemory
+policy, the byte budget still bounds the size of a single entry.
+Hit/miss/eviction counters are kept per process in both modes.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from config import CACHE_REDIS_URL
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class RedisCacheBackend:
+    """Shared storage of pickled entries in Redis under a key prefix"""
+
+    def __init__(self, url, prefix):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, data, ttl):
+        self.client.set(self.prefix + key, data, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+
+class BoundedCache:
+    def __init__(self, name, max_bytes, ttl, backend=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'rejected': 0, 'sets': 0}
+
+    @staticmethod
+    def _serialize(value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        """Return a cached value, or default when missing or expired"""
+        if self.backend is not None:
+            try:
+                data = self.backend.get(key)
+            except Exception as e:
+                print(f"Cache {self.name}: shared backend read failed: {e}")
+                data = None
+            with self._lock:
+                self._stats['hits' if data is not None else 'misses'] += 1
+            return pickle.loads(data) if data is not None else default
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            value, _, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value for ttl seconds (the cache default if None).
+
+        Returns False when the value alone exceeds the byte budget.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        data = self._serialize(value)
+        size = len(data)
+
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats['rejected'] += 1
+                return False
+            self._stats['sets'] += 1
+
+        if self.backend is not None:
+            try:
+                self.backend.set(key, data, ttl)
+            except Exception as e:
+                print(f"Cache {self.name}: shared backend write failed: {e}")
+                return False
+            return True
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._evict(size)
+            expires = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+        return True
+
+    def _evict(self, needed):
+        """Drop expired entries, then least recently used ones until needed bytes fit"""
+        if self._bytes + needed <= self.max_bytes:
+            return
+        now = time.monotonic()
+        for key in [k for k, (_, _, expires) in self._entries.items() if expires is not None and expires <= now]:
+            self._remove(key)
+            self._stats['expirations'] += 1
+        while self._entries and self._bytes + needed > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def delete(self, key):
+        if self.backend is not None:
+            try:
+                self.backend.delete(key)
+            except Exception as e:
+                print(f"Cache {self.name}: shared backend delete failed: {e}")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except Exception as e:
+                print(f"Cache {self.name}: shared backend clear failed: {e}")
+            return
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Counters, hit ratio and memory usage (used bytes/entries only for the local backend)"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+            stats['backend'] = 'redis' if self.backend is not None else 'local'
+            stats['max_bytes'] = self.max_bytes
+            if self.backend is None:
+                stats['used_bytes'] = self._bytes
+                stats['entries'] = len(self._entries)
+        return stats
+
+
+def create_cache(name, max_bytes, ttl):
+    """BoundedCache using the shared Redis backend when configured, local memory otherwise"""
+    backend = None
+    if CACHE_REDIS_URL:
+        if REDIS_AVAILABLE:
+            backend = RedisCacheBackend(CACHE_REDIS_URL, f"monitoring:{name}:")
+        else:
+            print(f"Cache {name}: CACHE_REDIS_URL set but the redis package is not installed, using local memory")
+    return BoundedCache(name, max_bytes, ttl, backend)
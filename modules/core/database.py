@@ -2,7 +2,8 @@ import mysql.connector
 from mysql.connector import pooling
 from contextlib import contextmanager
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 # Database configuration
 DB_CONFIG = {
@@ -36,31 +37,78 @@ def get_db_cursor():
         cursor.close()
         conn.close()
 
+@contextmanager
+def named_lock(name, timeout=0):
+    """
+    Hold a MySQL named lock (GET_LOCK) for the block; yields whether it was acquired.
+
+    The lock lives on its own connection outside the pool - a lock held for
+    a long operation must not keep one of the few pooled connections idle.
+    """
+    conn = mysql.connector.connect(**{k: v for k, v in DB_CONFIG.items() if not k.startswith('pool_')})
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (name, timeout))
+        acquired = bool(cursor.fetchone()['acquired'])
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cursor.execute("SELECT RELEASE_LOCK(%s) AS released", (name,))
+                cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+ALLOWED_LOG_SEVERITIES = ['emergency', 'alert', 'critical', 'error',
+                          'warning', 'notice', 'info', 'debug']
+
+def _system_log_row(source, severity, host_name, message):
+    """Normalize a system_logs row to the column limits and ENUM values"""
+    # Ensure severity is one of the allowed ENUM values
+    normalized_severity = severity.lower() if severity else 'info'
+    if normalized_severity not in ALLOWED_LOG_SEVERITIES:
+        normalized_severity = 'info'
+    return (
+        source[:255] if source else 'unknown',
+        normalized_severity,
+        host_name[:255] if host_name else 'unknown',
+        message[:65535] if message else 'No message'
+    )
+
 def log_system_event(source, severity, host_name, message):
     """Log system events to database"""
     try:
         with get_db_cursor() as cursor:
-            # Ensure severity is one of the allowed ENUM values
-            allowed_severities = ['emergency', 'alert', 'critical', 'error', 
-                                'warning', 'notice', 'info', 'debug']
-            normalized_severity = severity.lower()
-            if (normalized_severity not in allowed_severities):
-                normalized_severity = 'info'
-
             cursor.execute("""
                 INSERT INTO system_logs 
                 (source, severity, host_name, message)
                 VALUES (%s, %s, %s, %s)
-            """, (
-                source[:255] if source else 'unknown',
-                normalized_severity,
-                host_name[:255] if host_name else 'unknown',
-                message[:65535] if message else 'No message'
-            ))
+            """, _system_log_row(source, severity, host_name, message))
             print(f"Logged event: {source} - {severity} - {host_name} - {message[:100]}...")
     except Exception as e:
         print(f"Error logging system event: {e}")
 
+def log_system_events(events: list, cursor=None):
+    """
+    Log many system events with one multi-row INSERT.
+
+    events is a list of (source, severity, host_name, message) tuples. When a
+    cursor is given the rows join the caller's transaction.
+    """
+    if not events:
+        return 0
+    rows = [_system_log_row(*event) for event in events]
+    if cursor is None:
+        with get_db_cursor() as own_cursor:
+            return log_system_events(events, own_cursor)
+    cursor.executemany("""
+        INSERT INTO system_logs 
+        (source, severity, host_name, message)
+        VALUES (%s, %s, %s, %s)
+    """, rows)
+    return len(rows)
+
 def update_host_status(host_id, host_name, status, response_time=None, details=None):
     """Record host status changes"""
     with get_db_cursor() as cursor:
@@ -70,40 +118,204 @@ def update_host_status(host_id, host_name, status, response_time=None, details=N
             VALUES (%s, %s, %s, %s, %s)
         """, (host_id, host_name, status, response_time, details))
 
-def archive_metrics(host_id: str, metrics: dict, timestamp=None):
-    """Archive host metrics to database"""
+def _normalize_host_status(status):
+    """Map Zabbix availability to host_status_history ENUM values"""
+    status_mapping = {
+        'Available': 'available',
+        'Unavailable': 'unavailable',
+        None: 'unknown',
+        '': 'unknown'
+    }
+    return status_mapping.get(status, 'unknown')
+
+def setup_metrics_tables():
+    """Add typed numeric columns to performance_metrics if they are missing"""
     with get_db_cursor() as cursor:
-        for metric_type, value in metrics.items():
+        cursor.execute("SHOW COLUMNS FROM performance_metrics")
+        columns = {row['Field'] for row in cursor.fetchall()}
+
+        if 'numeric_value' not in columns:
             cursor.execute("""
-                INSERT INTO performance_metrics 
-                (host_id, metric_type, value, timestamp, details)
-                VALUES (%s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), %s)
-            """, (host_id, metric_type, value, timestamp, None))
+                ALTER TABLE performance_metrics
+                ADD COLUMN numeric_value DOUBLE NULL AFTER value
+            """)
+            print("Added numeric_value column to performance_metrics")
+        if 'unit' not in columns:
+            cursor.execute("""
+                ALTER TABLE performance_metrics
+                ADD COLUMN unit VARCHAR(16) NULL AFTER numeric_value
+            """)
+            print("Added unit column to performance_metrics")
 
-def archive_host_status(host_data: dict):
-    """Archive host status and details"""
+        cursor.execute("SHOW INDEX FROM performance_metrics WHERE Key_name = 'idx_metrics_host_type_time'")
+        if not cursor.fetchall():
+            cursor.execute("""
+                CREATE INDEX idx_metrics_host_type_time
+                ON performance_metrics (host_id, metric_type, timestamp)
+            """)
+            print("Added idx_metrics_host_type_time index to performance_metrics")
+
+def _metric_rows(host_id, metric_values: dict, timestamp):
+    """Build performance_metrics rows from {metric_type: {'value': float, 'unit': str}}"""
+    return [
+        (host_id, metric_type, metric['value'], metric['value'], metric.get('unit'), timestamp, None)
+        for metric_type, metric in metric_values.items()
+        if metric.get('value') is not None
+    ]
+
+def archive_metrics(host_id: str, metric_values: dict, timestamp=None):
+    """Archive numeric host metrics to database"""
     with get_db_cursor() as cursor:
-        status = host_data.get('availability', 'unknown')
-        # Mapowanie statusów na dozwolone wartości ENUM
-        status_mapping = {
-            'Available': 'available',
-            'Unavailable': 'unavailable',
-            None: 'unknown',
-            '': 'unknown'
-        }
-        normalized_status = status_mapping.get(status, 'unknown')
+        cursor.executemany("""
+            INSERT INTO performance_metrics 
+            (host_id, metric_type, value, numeric_value, unit, timestamp, details)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, _metric_rows(host_id, metric_values, timestamp or datetime.now()))
 
+def setup_host_status_tables():
+    """Create host_status_current table and index host_status_history by host and time"""
+    with get_db_cursor() as cursor:
         cursor.execute("""
+            CREATE TABLE IF NOT EXISTS host_status_current (
+                host_id VARCHAR(64) NOT NULL PRIMARY KEY,
+                host_name VARCHAR(255),
+                status VARCHAR(16) NOT NULL,
+                since DATETIME NOT NULL,
+                host_groups TEXT,
+                updated_at DATETIME NOT NULL,
+                removed_at DATETIME NULL
+            )
+        """)
+
+        cursor.execute("SHOW COLUMNS FROM host_status_current")
+        if 'removed_at' not in {row['Field'] for row in cursor.fetchall()}:
+            cursor.execute("""
+                ALTER TABLE host_status_current
+                ADD COLUMN removed_at DATETIME NULL AFTER updated_at
+            """)
+            print("Added removed_at column to host_status_current")
+
+        cursor.execute("SHOW INDEX FROM host_status_history WHERE Key_name = 'idx_status_history_host_time'")
+        if not cursor.fetchall():
+            cursor.execute("""
+                CREATE INDEX idx_status_history_host_time
+                ON host_status_history (host_id, timestamp)
+            """)
+            print("Added idx_status_history_host_time index to host_status_history")
+
+def _host_groups(host):
+    """Sorted host group names from host.get (selectHostGroups, older API: selectGroups)"""
+    groups = host.get('hostgroups') or host.get('groups') or []
+    return sorted(group['name'] for group in groups if group.get('name'))
+
+def _record_status_transitions(cursor, hosts: list, timestamp, batch_size: int = 1000,
+                               complete: bool = False):
+    """
+    Write host status as transitions.
+
+    host_status_history gets a row only when a host's status differs from
+    host_status_current (or the host is new); host_status_current keeps the
+    status with the time it has been in effect. When hosts is a complete
+    poll (complete=True), hosts missing from it were removed from Zabbix:
+    they get an 'unknown' transition and removed_at, so SLA stops counting
+    them in their last status. Returns the number of transitions written.
+    """
+    cursor.execute("SELECT host_id, host_name, status, host_groups, removed_at FROM host_status_current")
+    current = {row['host_id']: row for row in cursor.fetchall()}
+
+    history_rows = []
+    current_rows = []
+    seen = set()
+    for host in hosts:
+        if 'hostid' not in host or 'name' not in host:
+            continue
+        host_id = str(host['hostid'])
+        seen.add(host_id)
+        # Mapowanie statusów na dozwolone wartości ENUM
+        status = _normalize_host_status(host.get('availability', 'unknown'))
+        groups = json.dumps(_host_groups(host))
+        previous = current.get(host_id)
+
+        if previous is None or previous['status'] != status:
+            history_rows.append((host_id, host['name'], status, None, None, timestamp))
+        elif (previous['host_name'] == host['name'] and previous['host_groups'] == groups
+              and previous['removed_at'] is None):
+            continue
+        current_rows.append((host_id, host['name'], status, timestamp, groups, timestamp))
+
+    # Pusty poll to raczej błąd uprawnień/filtra niż usunięcie całej floty
+    removed = []
+    if complete and seen:
+        removed = [row for host_id, row in current.items()
+                   if host_id not in seen and row['removed_at'] is None]
+    for row in removed:
+        if row['status'] != 'unknown':
+            history_rows.append((row['host_id'], row['host_name'], 'unknown', None, None, timestamp))
+
+    for i in range(0, len(history_rows), batch_size):
+        cursor.executemany("""
             INSERT INTO host_status_history 
-            (host_id, host_name, status, response_time, details)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (
-            host_data.get('hostid', '0'),
-            host_data.get('name', 'Unknown'),
-            normalized_status,
-            None,  # response_time
-            json.dumps(host_data.get('metrics', {}))
-        ))
+            (host_id, host_name, status, response_time, details, timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, history_rows[i:i + batch_size])
+    for i in range(0, len(current_rows), batch_size):
+        # since zmienia się tylko przy zmianie statusu (przypisanie przed status = ...)
+        cursor.executemany("""
+            INSERT INTO host_status_current 
+            (host_id, host_name, status, since, host_groups, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+            since = IF(status = VALUES(status), since, VALUES(since)),
+            status = VALUES(status),
+            host_name = VALUES(host_name),
+            host_groups = VALUES(host_groups),
+            updated_at = VALUES(updated_at),
+            removed_at = NULL
+        """, current_rows[i:i + batch_size])
+    for i in range(0, len(removed), batch_size):
+        cursor.executemany("""
+            UPDATE host_status_current
+            SET since = IF(status = 'unknown', since, %s),
+                status = 'unknown',
+                removed_at = %s
+            WHERE host_id = %s
+        """, [(timestamp, timestamp, row['host_id']) for row in removed[i:i + batch_size]])
+
+    return len(history_rows)
+
+def archive_host_status(host_data: dict):
+    """Archive host status (a history row is written only when the status changes)"""
+    with get_db_cursor() as cursor:
+        _record_status_transitions(cursor, [host_data], datetime.now())
+
+def archive_poll_results(hosts: list, timestamp=None, batch_size: int = 1000, complete: bool = True):
+    """
+    Archive metrics and status of a whole Zabbix poll in one transaction.
+
+    Rows are written with executemany, which mysql-connector turns into
+    multi-row INSERT statements, so a poll costs a handful of round trips
+    and a single commit instead of one connection and commit per host.
+    Host status is recorded only for hosts whose status changed; with
+    complete=True hosts absent from the poll are closed out as removed.
+    """
+    timestamp = timestamp or datetime.now()
+    metric_rows = []
+
+    for host in hosts:
+        if 'hostid' not in host or 'name' not in host:
+            continue
+        metric_rows.extend(_metric_rows(host['hostid'], host.get('metric_values', {}), timestamp))
+
+    with get_db_cursor() as cursor:
+        for i in range(0, len(metric_rows), batch_size):
+            cursor.executemany("""
+                INSERT INTO performance_metrics 
+                (host_id, metric_type, value, numeric_value, unit, timestamp, details)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, metric_rows[i:i + batch_size])
+        transitions = _record_status_transitions(cursor, hosts, timestamp, batch_size, complete)
+
+    return {'metrics': len(metric_rows), 'statuses': transitions}
 
 def archive_asset(asset_data: dict):
     """Archive asset information with proper update logic"""
@@ -189,11 +401,24 @@ def archive_asset(asset_data: dict):
         import traceback
         traceback.print_exc()
 
+def mark_assets_deleted(names):
+    """Mark assets moved to the GLPI trash as deleted; returns the number of updated rows"""
+    names = [name for name in dict.fromkeys(names) if name]
+    if not names:
+        return 0
+    with get_db_cursor() as cursor:
+        placeholders = ', '.join(['%s'] * len(names))
+        cursor.execute(f"""
+            UPDATE assets SET status = 'deleted', last_seen = CURRENT_TIMESTAMP
+            WHERE name IN ({placeholders}) AND (status IS NULL OR status <> 'deleted')
+        """, names)
+        return cursor.rowcount
+
 def get_historical_metrics(host_id: str, metric_type: str, start_time: datetime, end_time: datetime) -> list:
     """Get historical metrics for a host"""
     with get_db_cursor() as cursor:
         cursor.execute("""
-            SELECT metric_type, value, timestamp, details
+            SELECT metric_type, COALESCE(numeric_value, value) AS value, unit, timestamp, details
             FROM performance_metrics
             WHERE host_id = %s 
             AND metric_type = %s
@@ -202,6 +427,16 @@ def get_historical_metrics(host_id: str, metric_type: str, start_time: datetime,
         """, (host_id, metric_type, start_time, end_time))
         return cursor.fetchall()
 
+def get_host_status_current(host_id: str):
+    """Get the current status of a host and the time it has been in effect"""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            SELECT host_id, host_name, status, since, host_groups, removed_at
+            FROM host_status_current
+            WHERE host_id = %s
+        """, (host_id,))
+        return cursor.fetchone()
+
 def get_host_status_history(host_id: str, limit: int = 100) -> list:
     """Get historical status changes for a host"""
     with get_db_cursor() as cursor:
@@ -214,95 +449,432 @@ def get_host_status_history(host_id: str, limit: int = 100) -> list:
         """, (host_id, limit))
         return cursor.fetchall()
 
-def store_graylog_messages(messages: list):
-    """Store Graylog messages in database"""
+# Tabele z liczbą wiadomości per ważność w kubełkach minutowych, godzinowych i dziennych
+GRAYLOG_ROLLUP_TABLES = {
+    'minute': 'graylog_rollup_minute',
+    'hour': 'graylog_rollup_hour',
+    'day': 'graylog_rollup_day'
+}
+
+# Początek kubełka: obcięcie znacznika czasu 'YYYY-MM-DD HH:MM:SS' (Python) / DATE_FORMAT (SQL)
+_ROLLUP_BUCKETS = {
+    'minute': (lambda ts: ts[:16] + ':00', '%Y-%m-%d %H:%i:00'),
+    'hour': (lambda ts: ts[:13] + ':00:00', '%Y-%m-%d %H:00:00'),
+    'day': (lambda ts: ts[:10] + ' 00:00:00', '%Y-%m-%d 00:00:00')
+}
+
+_SEVERITY_COLUMNS = {'high': 0, 'medium': 1, 'low': 2}
+
+def setup_graylog_rollup_tables():
+    """Create the Graylog timeline rollup tables and fill empty ones from graylog_messages"""
     with get_db_cursor() as cursor:
+        for granularity, table in GRAYLOG_ROLLUP_TABLES.items():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket DATETIME NOT NULL PRIMARY KEY,
+                    high_count INT NOT NULL DEFAULT 0,
+                    medium_count INT NOT NULL DEFAULT 0,
+                    low_count INT NOT NULL DEFAULT 0,
+                    total_count INT NOT NULL DEFAULT 0
+                )
+            """)
+            cursor.execute(f"SELECT bucket FROM {table} LIMIT 1")
+            if cursor.fetchone() is not None:
+                continue
+            # Jednorazowe wypełnienie z wiadomości zapisanych przed wprowadzeniem rollupów
+            cursor.execute(f"""
+                INSERT INTO {table} (bucket, high_count, medium_count, low_count, total_count)
+                SELECT
+                    DATE_FORMAT(timestamp, '{_ROLLUP_BUCKETS[granularity][1]}') AS rollup_bucket,
+                    SUM(severity = 'high'),
+                    SUM(severity = 'medium'),
+                    SUM(severity = 'low'),
+                    COUNT(*)
+                FROM graylog_messages
+                GROUP BY rollup_bucket
+            """)
+            if cursor.rowcount:
+                print(f"Filled {table} with {cursor.rowcount} buckets from graylog_messages")
+
+def _update_graylog_rollups(cursor, messages: list, batch_size: int = 1000):
+    """Add the severity counts of newly stored messages to every rollup table"""
+    for granularity, table in GRAYLOG_ROLLUP_TABLES.items():
+        bucket_of = _ROLLUP_BUCKETS[granularity][0]
+        counts = {}
         for msg in messages:
+            bucket = bucket_of(str(msg['timestamp']))
+            row = counts.get(bucket)
+            if row is None:
+                row = counts[bucket] = [0, 0, 0, 0]
+            column = _SEVERITY_COLUMNS.get(msg['severity'])
+            if column is not None:
+                row[column] += 1
+            row[3] += 1
+
+        rows = [(bucket, *row) for bucket, row in counts.items()]
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(f"""
+                INSERT INTO {table} (bucket, high_count, medium_count, low_count, total_count)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                high_count = high_count + VALUES(high_count),
+                medium_count = medium_count + VALUES(medium_count),
+                low_count = low_count + VALUES(low_count),
+                total_count = total_count + VALUES(total_count)
+            """, rows[i:i + batch_size])
+
+# Liczniki wiadomości per szablon (template_id z log_templates) w kubełkach minutowych i godzinowych
+GRAYLOG_TEMPLATE_ROLLUP_TABLES = {
+    'minute': 'graylog_template_rollup_minute',
+    'hour': 'graylog_template_rollup_hour'
+}
+
+# Okna dłuższe niż ten próg są liczone z rollupu godzinowego
+_TEMPLATE_MINUTE_WINDOW = timedelta(hours=6)
+
+def setup_graylog_template_tables():
+    """Create the template registry and template rollup tables and the template_id column of graylog_messages"""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS graylog_templates (
+                template_id BIGINT NOT NULL PRIMARY KEY,
+                template TEXT NOT NULL,
+                first_seen DATETIME NOT NULL,
+                last_seen DATETIME NOT NULL,
+                message_count BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        for table in GRAYLOG_TEMPLATE_ROLLUP_TABLES.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket DATETIME NOT NULL,
+                    template_id BIGINT NOT NULL,
+                    high_count INT NOT NULL DEFAULT 0,
+                    medium_count INT NOT NULL DEFAULT 0,
+                    low_count INT NOT NULL DEFAULT 0,
+                    total_count INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket, template_id)
+                )
+            """)
+
+        cursor.execute("SHOW COLUMNS FROM graylog_messages LIKE 'template_id'")
+        if not cursor.fetchall():
+            # Wiadomości zapisane wcześniej nie mają szablonu (NULL)
             cursor.execute("""
-                INSERT INTO graylog_messages 
-                (timestamp, level, severity, category, message, details)
+                ALTER TABLE graylog_messages
+                ADD COLUMN template_id BIGINT NULL,
+                ADD INDEX idx_graylog_messages_template (template_id, timestamp)
+            """)
+            print("Added template_id column to graylog_messages")
+
+def get_graylog_templates() -> list:
+    """All known templates as (template_id, template) pairs, for TemplateMiner.load()"""
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT template_id, template FROM graylog_templates")
+        return [(row['template_id'], row['template']) for row in cursor.fetchall()]
+
+def _update_graylog_templates(cursor, messages: list, batch_size: int = 1000):
+    """Upsert the templates of newly stored messages and add them to the template rollups"""
+    templates = {}
+    for msg in messages:
+        template_id = msg.get('template_id')
+        if template_id is None:
+            continue
+        timestamp = str(msg['timestamp'])[:19]
+        entry = templates.get(template_id)
+        if entry is None:
+            templates[template_id] = [msg['template'], timestamp, timestamp, 1]
+        else:
+            # Szablon mógł się uogólnić w trakcie strony - zapisz najnowszą postać
+            entry[0] = msg['template']
+            entry[1] = min(entry[1], timestamp)
+            entry[2] = max(entry[2], timestamp)
+            entry[3] += 1
+    if not templates:
+        return
+
+    rows = [(template_id, *entry) for template_id, entry in templates.items()]
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany("""
+            INSERT INTO graylog_templates (template_id, template, first_seen, last_seen, message_count)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+            template = VALUES(template),
+            first_seen = LEAST(first_seen, VALUES(first_seen)),
+            last_seen = GREATEST(last_seen, VALUES(last_seen)),
+            message_count = message_count + VALUES(message_count)
+        """, rows[i:i + batch_size])
+
+    for granularity, table in GRAYLOG_TEMPLATE_ROLLUP_TABLES.items():
+        bucket_of = _ROLLUP_BUCKETS[granularity][0]
+        counts = {}
+        for msg in messages:
+            if msg.get('template_id') is None:
+                continue
+            key = (bucket_of(str(msg['timestamp'])), msg['template_id'])
+            row = counts.get(key)
+            if row is None:
+                row = counts[key] = [0, 0, 0, 0]
+            column = _SEVERITY_COLUMNS.get(msg['severity'])
+            if column is not None:
+                row[column] += 1
+            row[3] += 1
+
+        rows = [(*key, *row) for key, row in counts.items()]
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(f"""
+                INSERT INTO {table} (bucket, template_id, high_count, medium_count, low_count, total_count)
                 VALUES (%s, %s, %s, %s, %s, %s)
                 ON DUPLICATE KEY UPDATE
-                level = VALUES(level),
-                severity = VALUES(severity),
-                category = VALUES(category)
-            """, (
-                msg['timestamp'],
-                msg['level'],
-                msg['severity'],
-                msg['category'],
-                msg['message'],
-                json.dumps(msg['details'])
-            ))
+                high_count = high_count + VALUES(high_count),
+                medium_count = medium_count + VALUES(medium_count),
+                low_count = low_count + VALUES(low_count),
+                total_count = total_count + VALUES(total_count)
+            """, rows[i:i + batch_size])
+
+def get_top_templates(start_time: datetime, end_time: datetime, limit: int = 50) -> list:
+    """
+    Get the most frequent message templates of a time window.
+
+    Counts come from the template rollups: the minute table for windows up
+    to six hours, the hour table (whole hours around the window) otherwise.
+    """
+    granularity = 'minute' if end_time - start_time <= _TEMPLATE_MINUTE_WINDOW else 'hour'
+    with get_db_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT
+                r.template_id,
+                t.template,
+                t.first_seen,
+                t.last_seen,
+                SUM(r.high_count) AS high_count,
+                SUM(r.medium_count) AS medium_count,
+                SUM(r.low_count) AS low_count,
+                SUM(r.total_count) AS total_count
+            FROM {GRAYLOG_TEMPLATE_ROLLUP_TABLES[granularity]} r
+            JOIN graylog_templates t ON t.template_id = r.template_id
+            WHERE r.bucket >= %s AND r.bucket <= %s
+            GROUP BY r.template_id, t.template, t.first_seen, t.last_seen
+            ORDER BY total_count DESC
+            LIMIT %s
+        """, (_floor_to_rollup(start_time, granularity), end_time, limit))
+        return [
+            {
+                'template_id': row['template_id'],
+                'template': row['template'],
+                'first_seen': row['first_seen'],
+                'last_seen': row['last_seen'],
+                'high_count': int(row['high_count']),
+                'medium_count': int(row['medium_count']),
+                'low_count': int(row['low_count']),
+                'total_count': int(row['total_count'])
+            }
+            for row in cursor.fetchall()
+        ]
+
+def setup_graylog_message_hash():
+    """Add the message_hash identity column and its unique index to graylog_messages if missing"""
+    with get_db_cursor() as cursor:
+        cursor.execute("SHOW COLUMNS FROM graylog_messages LIKE 'message_hash'")
+        if not cursor.fetchall():
+            # Starsze wiersze zostają z NULL - indeks UNIQUE dopuszcza wiele wartości NULL
+            cursor.execute("""
+                ALTER TABLE graylog_messages
+                ADD COLUMN message_hash BINARY(16) NULL
+            """)
+            print("Added message_hash column to graylog_messages")
+
+        cursor.execute("SHOW INDEX FROM graylog_messages WHERE Key_name = 'uq_graylog_messages_hash'")
+        if not cursor.fetchall():
+            cursor.execute("""
+                CREATE UNIQUE INDEX uq_graylog_messages_hash
+                ON graylog_messages (message_hash)
+            """)
+            print("Added uq_graylog_messages_hash index to graylog_messages")
+
+def _graylog_message_row(msg):
+    return (
+        msg['timestamp'],
+        msg['level'],
+        msg['severity'],
+        msg['category'],
+        msg['message'],
+        json.dumps(msg['details']),
+        msg.get('template_id'),
+        msg.get('message_hash')
+    )
+
+def _new_graylog_messages(cursor, messages: list, batch_size: int = 1000) -> list:
+    """
+    Return the indexes of messages not stored yet.
+
+    Known hashes are looked up with one indexed IN query per batch;
+    repeats within the list are dropped too. Messages without a hash are
+    always treated as new.
+    """
+    hashes = {msg['message_hash'] for msg in messages if msg.get('message_hash')}
+    existing = set()
+    hash_list = list(hashes)
+    for i in range(0, len(hash_list), batch_size):
+        chunk = hash_list[i:i + batch_size]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+            SELECT message_hash FROM graylog_messages
+            WHERE message_hash IN ({placeholders})
+        """, chunk)
+        existing.update(bytes(row['message_hash']) for row in cursor.fetchall())
+
+    new_indexes = []
+    for index, msg in enumerate(messages):
+        message_hash = msg.get('message_hash')
+        if message_hash:
+            if message_hash in existing:
+                continue
+            existing.add(message_hash)
+        new_indexes.append(index)
+    return new_indexes
+
+def _store_new_graylog_messages(cursor, messages: list, batch_size: int = 1000) -> list:
+    """
+    Insert messages whose hash is not stored yet and count them in the rollups; returns their indexes.
+
+    Rows are written with INSERT IGNORE, so a message stored meanwhile by a
+    concurrent ingest is dropped by the unique index. A batch whose rowcount
+    shows such a conflict is rolled back to a savepoint and inserted row by
+    row, so only the rows this transaction actually inserted are counted in
+    the rollups, whatever the isolation level.
+    """
+    insert_sql = """
+        INSERT IGNORE INTO graylog_messages 
+        (timestamp, level, severity, category, message, details, template_id, message_hash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    candidate_indexes = _new_graylog_messages(cursor, messages, batch_size)
+
+    new_indexes = []
+    for i in range(0, len(candidate_indexes), batch_size):
+        chunk = candidate_indexes[i:i + batch_size]
+        rows = [_graylog_message_row(messages[index]) for index in chunk]
+        cursor.execute("SAVEPOINT graylog_messages_batch")
+        cursor.executemany(insert_sql, rows)
+        if cursor.rowcount == len(rows):
+            new_indexes.extend(chunk)
+            continue
+        # Część wierszy zapisał równolegle inny proces - rowcount pojedynczego
+        # INSERT IGNORE mówi dokładnie, który wiersz wstawiła ta transakcja
+        cursor.execute("ROLLBACK TO SAVEPOINT graylog_messages_batch")
+        for index, row in zip(chunk, rows):
+            cursor.execute(insert_sql, row)
+            if cursor.rowcount == 1:
+                new_indexes.append(index)
+    new_messages = [messages[index] for index in new_indexes]
+
+    # Rollupy liczą tylko nowe wiersze - ponowne pobranie okna ich nie zawyża
+    _update_graylog_rollups(cursor, new_messages, batch_size)
+    _update_graylog_templates(cursor, new_messages, batch_size)
+    return new_indexes
+
+def store_graylog_messages(messages: list, cursor=None, batch_size: int = 1000):
+    """
+    Store Graylog messages in database with multi-row INSERTs.
+
+    Messages whose message_hash is already stored are skipped, so storing
+    the same window twice is a no-op. The timeline rollups are updated in
+    the same transaction. When a cursor is given the rows join the caller's
+    transaction. Returns the number of new rows.
+    """
+    if not messages:
+        return 0
+    if cursor is None:
+        with get_db_cursor() as own_cursor:
+            return store_graylog_messages(messages, own_cursor, batch_size)
+    return len(_store_new_graylog_messages(cursor, messages, batch_size))
+
+def store_graylog_batch(messages: list, events: list, batch_size: int = 1000) -> dict:
+    """
+    Write a page of Graylog messages and their system_logs mirror in one transaction.
+
+    events are (source, severity, host_name, message) tuples as accepted by
+    log_system_events(), events[i] mirroring messages[i]; only events of
+    new messages are written. Returns the row counts and write throughput.
+    """
+    start = time.perf_counter()
+    with get_db_cursor() as cursor:
+        new_indexes = _store_new_graylog_messages(cursor, messages, batch_size) if messages else []
+        new_events = [events[index] for index in new_indexes]
+        rows = len(new_indexes)
+        for i in range(0, len(new_events), batch_size):
+            rows += log_system_events(new_events[i:i + batch_size], cursor)
+    duration = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'duplicates': len(messages) - len(new_indexes),
+        'duration': duration,
+        'rows_per_sec': rows / duration if duration > 0 else 0.0
+    }
+
+def _floor_to_rollup(dt: datetime, granularity: str) -> datetime:
+    if granularity == 'day':
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'hour':
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(second=0, microsecond=0)
 
 def get_messages_timeline(start_time: datetime, end_time: datetime, interval: str = '5 minutes') -> list:
-    """Get message counts grouped by time intervals from graylog_messages table"""
+    """
+    Get message counts grouped by time intervals.
+
+    Counts are read from the coarsest rollup table whose bucket divides the
+    interval (day, hour or minute), so the cost depends on the number of
+    buckets in the range rather than the number of messages.
+    """
     
-    # Map interval strings to MySQL DATE_FORMAT patterns and INTERVAL values
+    # Map interval strings to label formats, bucket length and the rollup to read
     interval_config = {
-        '1 minutes': {'format': '%Y-%m-%d %H:%i', 'interval': '1 MINUTE'},
-        '2 minutes': {'format': '%Y-%m-%d %H:%i', 'interval': '2 MINUTE'},
-        '5 minutes': {'format': '%Y-%m-%d %H:%i', 'interval': '5 MINUTE'},
-        '10 minutes': {'format': '%Y-%m-%d %H:%i', 'interval': '10 MINUTE'},
-        '15 minutes': {'format': '%Y-%m-%d %H:%i', 'interval': '15 MINUTE'},
-        '30 minutes': {'format': '%Y-%m-%d %H:%i', 'interval': '30 MINUTE'},
-        '60 minutes': {'format': '%Y-%m-%d %H:00', 'interval': '1 HOUR'},
-        '1 day': {'format': '%Y-%m-%d', 'interval': '1 DAY'}
+        '1 minutes': {'format': '%Y-%m-%d %H:%M', 'step': timedelta(minutes=1), 'rollup': 'minute'},
+        '2 minutes': {'format': '%Y-%m-%d %H:%M', 'step': timedelta(minutes=2), 'rollup': 'minute'},
+        '5 minutes': {'format': '%Y-%m-%d %H:%M', 'step': timedelta(minutes=5), 'rollup': 'minute'},
+        '10 minutes': {'format': '%Y-%m-%d %H:%M', 'step': timedelta(minutes=10), 'rollup': 'minute'},
+        '15 minutes': {'format': '%Y-%m-%d %H:%M', 'step': timedelta(minutes=15), 'rollup': 'minute'},
+        '30 minutes': {'format': '%Y-%m-%d %H:%M', 'step': timedelta(minutes=30), 'rollup': 'minute'},
+        '60 minutes': {'format': '%Y-%m-%d %H:00', 'step': timedelta(hours=1), 'rollup': 'hour'},
+        '1 day': {'format': '%Y-%m-%d', 'step': timedelta(days=1), 'rollup': 'day'}
     }
     
     interval_settings = interval_config.get(interval, interval_config['5 minutes'])
-    format_pattern = interval_settings['format']
-    interval_value = interval_settings['interval']
+    step = interval_settings['step']
+    granularity = interval_settings['rollup']
+    
+    # Kubełki wykresu zaczynają się na granicy kubełka rollupu
+    first_bucket = _floor_to_rollup(start_time, granularity)
+    timeline = []
+    point = first_bucket
+    while point <= end_time:
+        timeline.append({
+            'time_interval': point.strftime(interval_settings['format']),
+            'high_count': 0,
+            'medium_count': 0,
+            'low_count': 0,
+            'total_count': 0
+        })
+        point += step
     
     with get_db_cursor() as cursor:
-        if (interval == '1 day'):
-            # Dla dni używamy DATE() do grupowania
-            query = """
-                WITH RECURSIVE time_series AS (
-                    SELECT DATE(%s) as time_point
-                    UNION ALL
-                    SELECT DATE_ADD(time_point, INTERVAL 1 DAY)
-                    FROM time_series
-                    WHERE time_point < DATE(%s)
-                )
-                SELECT 
-                    DATE_FORMAT(ts.time_point, %s) as time_interval,
-                    COALESCE(COUNT(CASE WHEN gm.severity = 'high' THEN 1 END), 0) as high_count,
-                    COALESCE(COUNT(CASE WHEN gm.severity = 'medium' THEN 1 END), 0) as medium_count,
-                    COALESCE(COUNT(CASE WHEN gm.severity = 'low' THEN 1 END), 0) as low_count,
-                    COALESCE(COUNT(*), 0) as total_count
-                FROM time_series ts
-                LEFT JOIN graylog_messages gm ON 
-                    DATE(gm.timestamp) = ts.time_point
-                GROUP BY ts.time_point
-                ORDER BY ts.time_point
-            """
-        else:
-            # Dla minut i godzin używamy standardowego zapytania
-            query = f"""
-                WITH RECURSIVE time_series AS (
-                    SELECT %s as time_point
-                    UNION ALL
-                    SELECT time_point + INTERVAL {interval_value}
-                    FROM time_series
-                    WHERE time_point < %s
-                )
-                SELECT 
-                    DATE_FORMAT(ts.time_point, %s) as time_interval,
-                    COALESCE(COUNT(CASE WHEN gm.severity = 'high' THEN 1 END), 0) as high_count,
-                    COALESCE(COUNT(CASE WHEN gm.severity = 'medium' THEN 1 END), 0) as medium_count,
-                    COALESCE(COUNT(CASE WHEN gm.severity = 'low' THEN 1 END), 0) as low_count,
-                    COALESCE(COUNT(*), 0) as total_count
-                FROM time_series ts
-                LEFT JOIN graylog_messages gm ON 
-                    gm.timestamp >= ts.time_point 
-                    AND gm.timestamp < ts.time_point + INTERVAL {interval_value}
-                GROUP BY time_interval
-                ORDER BY ts.time_point
-            """
+        cursor.execute(f"""
+            SELECT bucket, high_count, medium_count, low_count, total_count
+            FROM {GRAYLOG_ROLLUP_TABLES[granularity]}
+            WHERE bucket >= %s AND bucket <= %s
+            ORDER BY bucket
+        """, (first_bucket, end_time))
         
-        cursor.execute(query, (start_time, end_time, format_pattern))
-        return cursor.fetchall()
+        for row in cursor.fetchall():
+            index = int((row['bucket'] - first_bucket) // step)
+            if 0 <= index < len(timeline):
+                entry = timeline[index]
+                for column in ('high_count', 'medium_count', 'low_count', 'total_count'):
+                    entry[column] += int(row[column])
+    
+    return timeline
 
 def get_detailed_messages(start_time: datetime, end_time: datetime, limit: int = 300) -> dict:
     """Get detailed message data from graylog_messages table with optimization"""
@@ -1,11 +1,17 @@
-import requests
 from requests.exceptions import RequestException, Timeout
 import time
-from config import GLPI_URL, GLPI_USER_TOKEN, GLPI_APP_TOKEN
-from flask import session
-from ..core.database import archive_asset, get_db_cursor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import (
+    GLPI_URL, GLPI_USER_TOKEN, GLPI_APP_TOKEN, GLPI_SYNC_MODE,
+    GLPI_SYNC_CACHE_TTL, GLPI_SYNC_CACHE_MAX_BYTES, GLPI_ENRICH_WORKERS,
+    GLPI_DELTA_SYNC, GLPI_FULL_SYNC_INTERVAL
+)
+from ..core.database import archive_asset, get_db_cursor, mark_assets_deleted
+from ..core.cache import create_cache
+from .glpi_dropdowns import dropdown_resolver
+from .glpi_http import glpi_http
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_caching import Cache
 import logging
 
@@ -19,6 +25,139 @@ cache = Cache()
 def init_cache(app):
     cache.init_app(app)
 
+# Wyniki synchronizacji per endpoint po stronie serwera (wspólne dla użytkowników,
+# a z CACHE_REDIS_URL także dla workerów). Świeże przez GLPI_SYNC_CACHE_TTL,
+# przechowywane dłużej jako zapas na wypadek błędu API.
+SYNC_CACHE_KEEP_SECONDS = 24 * 60 * 60
+sync_cache = create_cache('glpi_sync', GLPI_SYNC_CACHE_MAX_BYTES, SYNC_CACHE_KEEP_SECONDS)
+
+def _sync_cache_key(endpoint):
+    return f'items:{endpoint}'
+
+# Kolumny wyszukiwania search/Computer (ID opcji wyszukiwania GLPI) -> pola elementu.
+# Słowniki przychodzą jako nazwy, więc *_id dostają tę samą wartość co *_name
+# (jak przy expand_dropdowns).
+COMPUTER_SEARCH_FIELDS = {
+    2: ('id',),
+    1: ('name',),
+    5: ('serial',),
+    3: ('locations_id', 'location_name'),
+    23: ('manufacturers_id', 'manufacturer_name'),
+    40: ('computermodels_id', 'model_name'),
+    45: ('operatingsystems_id', 'os_name'),
+    46: ('operatingsystemversions_id', 'os_version'),
+    70: ('users_id', 'owner_name'),
+    24: ('users_id_tech', 'tech_owner_name'),
+    19: ('date_mod',),
+    21: ('mac_addresses',),
+    126: ('ip_addresses',)
+}
+
+# Pola słownikowe rozwinięte przez expand_dropdowns -> pola z nazwą używane przez widoki
+EXPANDED_NAME_FIELDS = {
+    'locations_id': 'location_name',
+    'manufacturers_id': 'manufacturer_name',
+    'users_id': 'owner_name',
+    'users_id_tech': 'tech_owner_name'
+}
+
+# Separator wielu wartości w wynikach search/
+SEARCH_MULTI_SEPARATOR = '$#$'
+
+# Opcja wyszukiwania date_mod (sortowanie i kryterium synchronizacji przyrostowej)
+DATE_MOD_OPTION = 19
+
+# Kolumny wyszukiwania elementów z kosza - wystarczy nazwa (klucz w tabeli assets)
+DELETED_SEARCH_FIELDS = {
+    2: ('id',),
+    1: ('name',),
+    19: ('date_mod',)
+}
+
+# Typy archiwizowane w tabeli assets, synchronizowane przyrostowo
+DELTA_SYNC_ITEMTYPES = ('Computer', 'NetworkEquipment', 'Printer')
+
+# Zapas przy zapytaniu o zmiany: date_mod ma dokładność sekundy, a zegary
+# serwera GLPI i zapis elementów mogą się minąć - zmiany z zakładki pobierane
+# są ponownie i nadpisują te same rekordy
+DELTA_SYNC_OVERLAP = timedelta(minutes=1)
+GLPI_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def setup_glpi_sync_state_table():
+    """Create glpi_sync_state table if not exists"""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS glpi_sync_state (
+                itemtype VARCHAR(64) NOT NULL PRIMARY KEY,
+                last_date_mod VARCHAR(32),
+                last_full_sync DATETIME,
+                updated_at DATETIME NOT NULL
+            )
+        """)
+
+def load_glpi_sync_state():
+    """Sync state per itemtype: {itemtype: {'last_date_mod', 'last_full_sync'}}"""
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT itemtype, last_date_mod, last_full_sync FROM glpi_sync_state")
+        return {row['itemtype']: row for row in cursor.fetchall()}
+
+def save_glpi_sync_state(itemtype, last_date_mod, last_full_sync):
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO glpi_sync_state (itemtype, last_date_mod, last_full_sync, updated_at)
+            VALUES (%s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                last_date_mod = VALUES(last_date_mod),
+                last_full_sync = VALUES(last_full_sync),
+                updated_at = VALUES(updated_at)
+        """, (itemtype, last_date_mod, last_full_sync))
+
+def _range_exceeded(response):
+    """GLPI answers a range past the last item with HTTP 400 ERROR_RANGE_EXCEED_TOTAL - the list has ended"""
+    if response.status_code != 400:
+        return False
+    try:
+        return 'ERROR_RANGE_EXCEED_TOTAL' in response.json()
+    except ValueError:
+        return False
+
+def _delta_since(last_date_mod):
+    """date_mod from which to query changes: the stored mark minus DELTA_SYNC_OVERLAP"""
+    try:
+        return (datetime.strptime(last_date_mod, GLPI_DATE_FORMAT) - DELTA_SYNC_OVERLAP).strftime(GLPI_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+def _search_values(value):
+    """Non-empty values of a (possibly multi-valued) search result column"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = str(value).split(SEARCH_MULTI_SEPARATOR)
+    return [str(v).strip() for v in value if v is not None and str(v).strip()]
+
+def search_row_to_item(row, fields=COMPUTER_SEARCH_FIELDS):
+    """Map a search/ result row (keys are search option ids) to an item dict"""
+    item = {}
+    for option, keys in fields.items():
+        value = row.get(str(option), row.get(option))
+        if keys[0] in ('ip_addresses', 'mac_addresses'):
+            value = _search_values(value)
+        elif value == '' or value == '&nbsp;':
+            value = None
+        for key in keys:
+            item[key] = value
+    if item.get('id') is not None:
+        item['id'] = int(item['id'])
+        item['ID'] = item['id']
+    ip_addresses = item.get('ip_addresses', [])
+    # Preferuj adres IPv4 - porty mają często także adresy IPv6 link-local
+    ipv4 = [ip for ip in ip_addresses if ':' not in ip]
+    item['ip_address'] = (ipv4 or ip_addresses or [''])[0]
+    item['mac'] = (item.get('mac_addresses') or [None])[0]
+    item['networkports'] = [{'name': '', 'ipaddress': ip} for ip in ip_addresses]
+    return item
+
 class GLPIClient:
     def __init__(self):
         self.base_url = GLPI_URL
@@ -26,6 +165,8 @@ class GLPIClient:
         self.app_token = GLPI_APP_TOKEN
         self.session_token = None
         self.timeout = 10
+        self.http = glpi_http
+        self.workers = GLPI_ENRICH_WORKERS
 
     def init_session(self):
         try:
@@ -34,12 +175,7 @@ class GLPIClient:
                 'App-Token': self.app_token
             }
             
-            response = requests.get(
-                f'{self.base_url}/apirest.php/initSession',
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
-            )
+            response = self.http.get('initSession', headers)
             
             if response.status_code == 200:
                 self.session_token = response.json().get('session_token')
@@ -51,12 +187,10 @@ class GLPIClient:
     def get_device_networkports(self, device_id, headers):
         """Pobiera porty sieciowe dla urządzenia"""
         try:
-            url = f'{self.base_url}/apirest.php/NetworkPort?criteria[0][field]=items_id&criteria[0][value]={device_id}'
-            response = requests.get(
-                url,
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
+            response = self.http.get(
+                'NetworkPort',
+                headers,
+                params={'criteria[0][field]': 'items_id', 'criteria[0][value]': device_id}
             )
             
             if response.status_code == 200:
@@ -75,12 +209,10 @@ class GLPIClient:
             for port in networkports:
                 # Pobierz adres IP dla portu sieciowego
                 try:
-                    ip_url = f'{self.base_url}/apirest.php/IPAddress?criteria[0][field]=items_id&criteria[0][value]={port["id"]}'
-                    ip_response = requests.get(
-                        ip_url,
-                        headers=headers,
-                        verify=False,
-                        timeout=self.timeout
+                    ip_response = self.http.get(
+                        'IPAddress',
+                        headers,
+                        params={'criteria[0][field]': 'items_id', 'criteria[0][value]': port['id']}
                     )
                     
                     if ip_response.status_code == 200:
@@ -98,55 +230,27 @@ class GLPIClient:
 
     def get_location_name(self, location_id, headers):
         """Pobiera nazwę lokalizacji na podstawie ID"""
-        try:
-            url = f'{self.base_url}/apirest.php/Location/{location_id}'
-            response = requests.get(
-                url,
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                location_data = response.json()
-                return location_data.get('name', 'Unknown Location')
-            return 'Unknown Location'
-        except Exception as e:
-            print(f"Error fetching location name for ID {location_id}: {e}")
-            return 'Unknown Location'
+        return dropdown_resolver.resolve('Location', location_id, headers, 'Unknown Location')
 
     def get_model_name(self, model_id, headers):
         """Pobiera nazwę modelu na podstawie ID"""
-        try:
-            url = f'{self.base_url}/apirest.php/ComputerModel/{model_id}'
-            response = requests.get(
-                url,
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                model_data = response.json()
-                return model_data.get('name', 'Unknown Model')
-            return 'Unknown Model'
-        except Exception as e:
-            print(f"Error fetching model name for ID {model_id}: {e}")
-            return 'Unknown Model'
+        return dropdown_resolver.resolve('ComputerModel', model_id, headers, 'Unknown Model')
 
     def should_refresh_cache(self, cache_key):
         """Sprawdza czy należy odświeżyć cache"""
-        if cache_key not in session:
+        entry = sync_cache.get(cache_key)
+        if entry is None:
             return True
-            
-        cache_time = session.get(f'{cache_key}_time', 0)
-        # Zwiększamy czas ważności cache do 15 minut
-        return (time.time() - cache_time) > 900  # 15 minut
+        return (time.time() - entry['fetched_at']) > GLPI_SYNC_CACHE_TTL
+
+    def get_cached_items(self, cache_key):
+        """Elementy z cache synchronizacji (także nieświeże), pusta lista gdy brak"""
+        entry = sync_cache.get(cache_key)
+        return entry['items'] if entry else []
 
     def get_device_ip(self, device_id, headers):
         """Pobiera adres IP dla urządzenia z portu zarządzania"""
         try:
-            url = f'{self.base_url}/apirest.php/NetworkPort'
             params = {
                 'criteria[0][field]': 'items_id',
                 'criteria[0][value]': device_id,
@@ -154,13 +258,7 @@ class GLPIClient:
                 'criteria[1][value]': 'Computer',
             }
             
-            response = requests.get(
-                url,
-                headers=headers,
-                params=params,
-                verify=False,
-                timeout=self.timeout
-            )
+            response = self.http.get('NetworkPort', headers, params=params)
             
             if response.status_code == 200:
                 ports = response.json()
@@ -187,182 +285,250 @@ class GLPIClient:
             
     def get_manufacturer_name(self, manufacturer_id, headers):
         """Pobiera nazwę producenta na podstawie ID"""
-        if not manufacturer_id:
-            return 'Unknown Manufacturer'
-            
-        try:
-            url = f'{self.base_url}/apirest.php/Manufacturer/{manufacturer_id}'
-            response = requests.get(
-                url,
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                manufacturer_data = response.json()
-                return manufacturer_data.get('name', 'Unknown Manufacturer')
-            return 'Unknown Manufacturer'
-        except Exception as e:
-            print(f"Error fetching manufacturer name for ID {manufacturer_id}: {e}")
-            return 'Unknown Manufacturer'
+        return dropdown_resolver.resolve('Manufacturer', manufacturer_id, headers, 'Unknown Manufacturer')
             
+
     def get_os_name(self, os_id, headers):
         """Pobiera nazwę systemu operacyjnego na podstawie ID"""
-        if not os_id:
-            return 'Unknown OS'
-            
-        try:
-            url = f'{self.base_url}/apirest.php/OperatingSystem/{os_id}'
-            response = requests.get(
-                url,
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                os_data = response.json()
-                return os_data.get('name', 'Unknown OS')
-            return 'Unknown OS'
-        except Exception as e:
-            print(f"Error fetching OS name for ID {os_id}: {e}")
-            return 'Unknown OS'
+        return dropdown_resolver.resolve('OperatingSystem', os_id, headers, 'Unknown OS')
 
     def get_user_info(self, user_id, headers):
         """Pobiera informacje o użytkowniku na podstawie ID"""
-        if not user_id:
-            return 'Unknown User'
-            
-        try:
-            url = f'{self.base_url}/apirest.php/User/{user_id}'
-            response = requests.get(
-                url,
-                headers=headers,
-                verify=False,
-                timeout=self.timeout
+        return dropdown_resolver.resolve('User', user_id, headers, 'Unknown User')
+
+    def enrich_item(self, endpoint, item, headers):
+        """Uzupełnia element o nazwy ze słowników oraz (dla komputerów) adresy IP"""
+        # Make sure ID is always present and properly named
+        if 'id' in item:
+            item['ID'] = item['id']  # Add uppercase version for compatibility
+
+        # Location information
+        if item.get('locations_id'):
+            item['location_name'] = self.get_location_name(
+                item['locations_id'], 
+                headers
             )
-            
-            if response.status_code == 200:
-                user_data = response.json()
-                user_name = user_data.get('name', 'Unknown User')
-                # Sometimes firstname and realname are available
-                first_name = user_data.get('firstname', '')
-                last_name = user_data.get('realname', '')
-                
-                if first_name and last_name:
-                    return f"{first_name} {last_name}"
-                return user_name
-            return 'Unknown User'
-        except Exception as e:
-            print(f"Error fetching user info for ID {user_id}: {e}")
-            return 'Unknown User'
+
+        # Model information    
+        if endpoint == 'Computer' and item.get('computermodels_id'):
+            item['model_name'] = self.get_model_name(
+                item['computermodels_id'],
+                headers
+            )
+
+        # Manufacturer information
+        if item.get('manufacturers_id'):
+            item['manufacturer_name'] = self.get_manufacturer_name(
+                item['manufacturers_id'],
+                headers
+            )
+
+        # OS information
+        if endpoint == 'Computer' and item.get('operatingsystems_id'):
+            item['os_name'] = self.get_os_name(
+                item['operatingsystems_id'],
+                headers
+            )
+
+        # Owner/User information
+        if item.get('users_id_tech'):
+            item['tech_owner_name'] = self.get_user_info(
+                item['users_id_tech'],
+                headers
+            )
+
+        if item.get('users_id'):
+            item['owner_name'] = self.get_user_info(
+                item['users_id'],
+                headers
+            )
+
+        # Add IP address
+        if endpoint == 'Computer':
+            item['ip_address'] = self.get_device_ip(item['id'], headers)
+            # Add network port details
+            self.enrich_device_with_network_info(item, headers)
+        return item
+
+    def get_items_enriched(self, endpoint, headers):
+        """
+        Pobiera elementy stronami i uzupełnia je o nazwy i adresy IP (zapytania per element).
+
+        Elementy strony są wzbogacane równolegle w puli self.workers wątków;
+        tempo zapytań ogranicza wspólny limiter glpi_http.
+        """
+        # Słowniki pobierane raz (całe tabele) zamiast osobnego zapytania dla każdego elementu
+        dropdowns = ['Location', 'Manufacturer', 'User']
+        if endpoint == 'Computer':
+            dropdowns += ['ComputerModel', 'OperatingSystem']
+        dropdown_resolver.prefetch(dropdowns, headers)
+
+        all_items = []
+        start = 0
+        limit = 999
+        progress_name = f'enrich:{endpoint}'
+        self.http.set_progress(progress_name, 0)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            while True:
+                print(f"Fetching {endpoint} range {start}-{start + limit}")
+                response = self.http.get(endpoint, headers, params={'range': f'{start}-{start + limit}'})
+
+                if response.status_code not in [200, 206]:
+                    break
+                items = response.json()
+                if not items or not isinstance(items, list):
+                    break
+
+                futures = [executor.submit(self.enrich_item, endpoint, item, headers) for item in items]
+                for future in as_completed(futures):
+                    # Błąd jednego elementu nie przerywa strony - element zostaje bez części danych
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Error enriching {endpoint} item: {e}")
+
+                all_items.extend(items)
+                self.http.set_progress(progress_name, len(all_items))
+                print(f"Fetched {len(items)} items from {endpoint}, total: {len(all_items)}")
+
+                if len(items) < limit:
+                    break
+                start += len(items)
+
+        self.http.set_progress(progress_name, len(all_items), len(all_items))
+        return all_items
+
+    def search_items(self, itemtype, fields, headers, limit=1000, criteria=None, is_deleted=False, strict=False):
+        """
+        Pobiera wszystkie wiersze search/{itemtype} z wymuszonymi kolumnami, stronami.
+
+        criteria to lista (opcja wyszukiwania, searchtype, wartość), is_deleted
+        zwraca elementy z kosza. Ze strict błąd HTTP zgłasza RequestException
+        zamiast zwracać dotychczas pobrane wiersze.
+        """
+        params = [(f'forcedisplay[{index}]', option) for index, option in enumerate(fields)]
+        for index, (field, searchtype, value) in enumerate(criteria or []):
+            params += [(f'criteria[{index}][field]', field),
+                       (f'criteria[{index}][searchtype]', searchtype),
+                       (f'criteria[{index}][value]', value)]
+        if is_deleted:
+            params.append(('is_deleted', 1))
+        rows = []
+        start = 0
+        while True:
+            response = self.http.get(
+                f'search/{itemtype}',
+                headers,
+                params=params + [('range', f'{start}-{start + limit - 1}')]
+            )
+            if response.status_code not in [200, 206]:
+                print(f"Search {itemtype} failed with HTTP {response.status_code}")
+                if strict:
+                    raise RequestException(f"search/{itemtype} failed with HTTP {response.status_code}")
+                break
+            result = response.json()
+            page = result.get('data') or []
+            rows.extend(page)
+            total = int(result.get('totalcount', 0))
+            print(f"Fetched {len(page)} rows from search/{itemtype}, total: {len(rows)}/{total}")
+            if not page or len(rows) >= total:
+                break
+            start += len(page)
+        return rows
+
+    def get_items_expanded(self, endpoint, headers, limit=1000, since=None, strict=False):
+        """
+        Pobiera elementy stronami z expand_dropdowns - nazwy słowników bez dodatkowych zapytań.
+
+        Z since (date_mod 'YYYY-MM-DD HH:MM:SS') elementy są sortowane od
+        najnowszej modyfikacji i pobieranie kończy się na pierwszym starszym.
+        Ze strict błąd HTTP zgłasza RequestException.
+        """
+        all_items = []
+        start = 0
+        params = {'expand_dropdowns': 'true'}
+        if since:
+            # Lista elementów sortuje po nazwie pola tabeli, nie po ID opcji wyszukiwania
+            params.update({'sort': 'date_mod', 'order': 'DESC'})
+        while True:
+            response = self.http.get(
+                endpoint,
+                headers,
+                params={**params, 'range': f'{start}-{start + limit - 1}'}
+            )
+            if response.status_code not in [200, 206]:
+                if strict and not (start and _range_exceeded(response)):
+                    raise RequestException(f"{endpoint} failed with HTTP {response.status_code}")
+                break
+            items = response.json()
+            if not items or not isinstance(items, list):
+                break
+            if since:
+                newer = [item for item in items if (item.get('date_mod') or '') > since]
+                reached_older = len(newer) < len(items)
+                items = newer
+            for item in items:
+                if 'id' in item:
+                    item['ID'] = item['id']
+                for field, name_field in EXPANDED_NAME_FIELDS.items():
+                    value = item.get(field)
+                    if value and value != '&nbsp;':
+                        item[name_field] = value
+            all_items.extend(items)
+            print(f"Fetched {len(items)} items from {endpoint}, total: {len(all_items)}")
+            if (since and reached_older) or len(items) < limit:
+                break
+            start += len(items)
+        return all_items
+
+    def get_items_single_pass(self, endpoint, headers, since=None, strict=False):
+        """
+        Pobiera kompletne elementy jednym strumieniem stron.
+
+        Komputery przychodzą z search/Computer z wymuszonymi kolumnami
+        (lokalizacja, model, system, właściciel, adresy IP), pozostałe typy
+        z expand_dropdowns - czas synchronizacji zależy od liczby stron,
+        a nie od liczby urządzeń. Z since tylko elementy zmienione później
+        (date_mod).
+        """
+        if endpoint == 'Computer':
+            criteria = [(DATE_MOD_OPTION, 'morethan', since)] if since else None
+            rows = self.search_items('Computer', COMPUTER_SEARCH_FIELDS, headers, criteria=criteria, strict=strict)
+            return [search_row_to_item(row) for row in rows]
+        return self.get_items_expanded(endpoint, headers, since=since, strict=strict)
+
+    def get_deleted_items(self, itemtype, headers, since=None, strict=False):
+        """Elementy przeniesione do kosza (is_deleted), z since tylko zmienione później"""
+        criteria = [(DATE_MOD_OPTION, 'morethan', since)] if since else None
+        rows = self.search_items(itemtype, DELETED_SEARCH_FIELDS, headers, criteria=criteria,
+                                 is_deleted=True, strict=strict)
+        return [search_row_to_item(row, DELETED_SEARCH_FIELDS) for row in rows]
 
     def get_all_items(self, endpoint, headers):
         """Pobiera wszystkie elementy z danego endpointu"""
-        cache_key = f'glpi_{endpoint}_cache'
+        cache_key = _sync_cache_key(endpoint)
         
         if not self.should_refresh_cache(cache_key):
             print(f"Using cached data for {endpoint}")
-            return session.get(cache_key, [])
+            return self.get_cached_items(cache_key)
 
         try:
-            all_items = []
-            start = 0
-            limit = 999
-
-            while True:
-                url = f'{self.base_url}/apirest.php/{endpoint}?range={start}-{start + limit}'
-                print(f"Fetching {url}")
-                
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    verify=False,
-                    timeout=self.timeout
-                )
-                
-                if response.status_code in [200, 206]:
-                    items = response.json()
-                    if not items or not isinstance(items, list):
-                        break
-                        
-                    if items and isinstance(items, list):
-                        for item in items:
-                            # Make sure ID is always present and properly named
-                            if 'id' in item:
-                                item['ID'] = item['id']  # Add uppercase version for compatibility
-                            
-                            # Location information
-                            if item.get('locations_id'):
-                                item['location_name'] = self.get_location_name(
-                                    item['locations_id'], 
-                                    headers
-                                )
-                                
-                            # Model information    
-                            if endpoint == 'Computer' and item.get('computermodels_id'):
-                                item['model_name'] = self.get_model_name(
-                                    item['computermodels_id'],
-                                    headers
-                                )
-                                
-                            # Manufacturer information
-                            if item.get('manufacturers_id'):
-                                item['manufacturer_name'] = self.get_manufacturer_name(
-                                    item['manufacturers_id'],
-                                    headers
-                                )
-                                
-                            # OS information
-                            if endpoint == 'Computer' and item.get('operatingsystems_id'):
-                                item['os_name'] = self.get_os_name(
-                                    item['operatingsystems_id'],
-                                    headers
-                                )
-                                
-                            # Owner/User information
-                            if item.get('users_id_tech'):
-                                item['tech_owner_name'] = self.get_user_info(
-                                    item['users_id_tech'],
-                                    headers
-                                )
-                            
-                            if item.get('users_id'):
-                                item['owner_name'] = self.get_user_info(
-                                    item['users_id'],
-                                    headers
-                                )
-                                
-                            # Add IP address
-                            if endpoint == 'Computer':
-                                item['ip_address'] = self.get_device_ip(item['id'], headers)
-                                # Add network port details
-                                self.enrich_device_with_network_info(item, headers)
-                    
-                    all_items.extend(items)
-                    print(f"Fetched {len(items)} items from {endpoint}, total: {len(all_items)}")
-                    
-                    if len(items) < limit:
-                        break
-                    
-                    start += len(items)
-                    time.sleep(0.1)
-                else:
-                    break
+            if GLPI_SYNC_MODE == 'search':
+                all_items = self.get_items_single_pass(endpoint, headers)
+            else:
+                all_items = self.get_items_enriched(endpoint, headers)
 
             print(f"Final count for {endpoint}: {len(all_items)} items")
             
-            if all_items:
-                session[cache_key] = all_items
-                session[f'{cache_key}_time'] = time.time()
-                session.modified = True
+            if all_items and not sync_cache.set(cache_key, {'items': all_items, 'fetched_at': time.time()}):
+                print(f"GLPI {endpoint} result exceeds the sync cache budget, not cached")
             
             return all_items
 
         except Exception as e:
             print(f"Error in get_all_items for {endpoint}: {e}")
-            return session.get(cache_key, [])
+            return self.get_cached_items(cache_key)
 
     def categorize_computers(self, computers):
         categories = {
@@ -419,7 +585,7 @@ class GLPIClient:
                     'model': computer.get('computermodels_id'),  # To już jest nazwa modelu dzięki get_model_name
                     'manufacturer': computer.get('manufacturers_id'),
                     'location': computer.get('location_name'),  # To już jest nazwa lokacji dzięki get_location_name
-                    'ip_address': self.get_device_ip(computer['id'], headers),
+                    'ip_address': computer.get('ip_address', ''),
                     'mac_address': computer.get('mac'),
                     'os_info': json.dumps({
                         'os': computer.get('operatingsystems_id'),
@@ -538,6 +704,7 @@ class GLPIClient:
                         specifications,
                         last_seen
                     FROM assets
+                    WHERE status IS NULL OR status <> 'deleted'
                 """)
                 assets = cursor.fetchall()
 
@@ -663,18 +830,152 @@ class GLPIClient:
             print(f"Error getting last refresh time: {e}")
             return None
 
-    def refresh_from_api(self):
-        """Refresh data from GLPI API"""
+    def archive_refreshed_items(self, computers, network_devices, printers):
+        """Archiwizuje pobrane komputery, urządzenia sieciowe i drukarki w tabeli assets"""
+        # Archiwizuj komputery
+        for computer in computers:
+            asset_data = {
+                'name': computer.get('name'),
+                'type': 'computer',
+                'serial_number': computer.get('serial'),
+                'model': computer.get('computermodels_id'),
+                'manufacturer': computer.get('manufacturers_id'),
+                'location': computer.get('location_name'),
+                'ip_address': computer.get('ip_address', ''),
+                'mac_address': computer.get('mac'),
+                'os_info': json.dumps({
+                    'os': computer.get('operatingsystems_id'),
+                    'version': computer.get('operatingsystemversions_id')
+                }),
+                'status': 'active',
+                'specifications': json.dumps(computer)
+            }
+            print(f"Archiwizuję komputer: {asset_data['name']}")
+            archive_asset(asset_data)
+
+        # Archiwizuj urządzenia sieciowe
+        for device in network_devices:
+            asset_data = {
+                'name': device.get('name'),
+                'type': 'network',
+                'serial_number': device.get('serial'),
+                'model': device.get('networkequipmentmodels_id'),
+                'manufacturer': device.get('manufacturers_id'),
+                'location': device.get('location_name'),
+                'ip_address': device.get('ip'),
+                'mac_address': device.get('mac'),
+                'os_info': json.dumps({}),
+                'status': 'active',
+                'specifications': json.dumps(device)
+            }
+            print(f"Archiwizuję urządzenie sieciowe: {asset_data['name']}")
+            archive_asset(asset_data)
+
+        # Archiwizuj drukarki
+        for printer in printers:
+            asset_data = {
+                'name': printer.get('name'),
+                'type': 'printer',
+                'serial_number': printer.get('serial'),
+                'model': printer.get('printermodels_id'),
+                'manufacturer': printer.get('manufacturers_id'),
+                'location': printer.get('location_name'),
+                'ip_address': printer.get('ip'),
+                'mac_address': printer.get('mac'),
+                'os_info': json.dumps({}),
+                'status': 'active',
+                'specifications': json.dumps(printer)
+            }
+            print(f"Archiwizuję drukarkę: {asset_data['name']}")
+            archive_asset(asset_data)
+
+        print("Zakończono archiwizację urządzeń")
+
+    def refresh_delta_from_api(self, headers, full=False):
+        """
+        Incremental refresh of the archived itemtypes.
+
+        Only items with date_mod after the stored mark are fetched and archived,
+        items moved to the GLPI trash in the meantime are marked as deleted.
+        An itemtype without a stored mark, or with the last full sync older
+        than GLPI_FULL_SYNC_INTERVAL (or full=True), is fetched in full.
+        An itemtype whose fetch fails is skipped without moving its mark, so
+        the next refresh asks for the same changes again.
+        Returns the devices from the database.
+        """
+        state = load_glpi_sync_state()
+        now = datetime.now()
+        changed = {}
+        deleted_names = []
+        new_state = {}
+        failed = []
+        for itemtype in DELTA_SYNC_ITEMTYPES:
+            entry = state.get(itemtype) or {}
+            last_full_sync = entry.get('last_full_sync')
+            since = None if full else _delta_since(entry.get('last_date_mod'))
+            if last_full_sync is None or (now - last_full_sync).total_seconds() >= GLPI_FULL_SYNC_INTERVAL:
+                since = None
+
+            try:
+                items = self.get_items_single_pass(itemtype, headers, since=since, strict=True)
+                trashed = self.get_deleted_items(itemtype, headers, since=since, strict=True)
+            except (RequestException, ValueError) as e:
+                print(f"GLPI {itemtype} sync failed, keeping the previous mark: {e}")
+                changed[itemtype] = []
+                failed.append(itemtype)
+                continue
+            changed[itemtype] = items
+            deleted_names.extend(item['name'] for item in trashed if item.get('name'))
+
+            marks = [entry.get('last_date_mod')] + [item.get('date_mod') for item in items + trashed]
+            new_state[itemtype] = (
+                max((mark for mark in marks if mark), default=None),
+                last_full_sync if since else now
+            )
+            print(f"GLPI {itemtype}: {'delta since ' + since if since else 'full sync'}, "
+                  f"{len(items)} changed, {len(trashed)} in trash")
+
+        print("Rozpoczynam archiwizację urządzeń...")
+        self.archive_refreshed_items(changed['Computer'], changed['NetworkEquipment'], changed['Printer'])
+        deleted = mark_assets_deleted(deleted_names)
+
+        # Znacznik zapisywany dopiero po archiwizacji - przerwana synchronizacja zostanie powtórzona
+        for itemtype, (last_date_mod, last_full_sync) in new_state.items():
+            save_glpi_sync_state(itemtype, last_date_mod, last_full_sync)
+
+        summary = ', '.join(f"{itemtype}: {len(items)}" for itemtype, items in changed.items())
+        message = f"GLPI incremental refresh completed (changed {summary}; deleted: {deleted})"
+        if failed:
+            message += f"; failed: {', '.join(failed)}"
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO system_logs (source, severity, host_name, message)
+                VALUES ('glpi', %s, 'system', %s)
+            """, ('warning' if failed else 'info', message))
+
+        return self.get_devices_from_db()
+
+    def refresh_from_api(self, full=False):
+        """Refresh data from GLPI API (incrementally with GLPI_DELTA_SYNC in search mode)"""
         try:
             if not self.session_token:
                 if not self.init_session():
                     return self.get_empty_response()
 
+            # Pełna synchronizacja zaczyna od świeżych słowników (zmienione nazwy lokalizacji itp.)
+            # i pomija cache wyników - odświeżenie na żądanie ma pokazać aktualny stan
+            dropdown_resolver.invalidate()
+            for endpoint in ('Computer', 'NetworkEquipment', 'Printer', 'Monitor', 'Rack'):
+                sync_cache.delete(_sync_cache_key(endpoint))
+
             headers = {
                 'Session-Token': self.session_token,
                 'App-Token': self.app_token
             }
 
+            if GLPI_DELTA_SYNC and GLPI_SYNC_MODE == 'search':
+                return self.refresh_delta_from_api(headers, full)
+
             # Pobierz świeże dane z API
             computers = self.get_all_items('Computer', headers)
             network_devices = self.get_all_items('NetworkEquipment', headers)
@@ -688,64 +989,7 @@ class GLPIClient:
             # Archiwizuj dane o urządzeniach
             print("Rozpoczynam archiwizację urządzeń...")
 
-            # Archiwizuj komputery
-            for computer in computers:
-                asset_data = {
-                    'name': computer.get('name'),
-                    'type': 'computer',
-                    'serial_number': computer.get('serial'),
-                    'model': computer.get('computermodels_id'),
-                    'manufacturer': computer.get('manufacturers_id'),
-                    'location': computer.get('location_name'),
-                    'ip_address': self.get_device_ip(computer['id'], headers),
-                    'mac_address': computer.get('mac'),
-                    'os_info': json.dumps({
-                        'os': computer.get('operatingsystems_id'),
-                        'version': computer.get('operatingsystemversions_id')
-                    }),
-                    'status': 'active',
-                    'specifications': json.dumps(computer)
-                }
-                print(f"Archiwizuję komputer: {asset_data['name']}")
-                archive_asset(asset_data)
-
-            # Archiwizuj urządzenia sieciowe
-            for device in network_devices:
-                asset_data = {
-                    'name': device.get('name'),
-                    'type': 'network',
-                    'serial_number': device.get('serial'),
-                    'model': device.get('networkequipmentmodels_id'),
-                    'manufacturer': device.get('manufacturers_id'),
-                    'location': device.get('location_name'),
-                    'ip_address': device.get('ip'),
-                    'mac_address': device.get('mac'),
-                    'os_info': json.dumps({}),
-                    'status': 'active',
-                    'specifications': json.dumps(device)
-                }
-                print(f"Archiwizuję urządzenie sieciowe: {asset_data['name']}")
-                archive_asset(asset_data)
-
-            # Archiwizuj drukarki
-            for printer in printers:
-                asset_data = {
-                    'name': printer.get('name'),
-                    'type': 'printer',
-                    'serial_number': printer.get('serial'),
-                    'model': printer.get('printermodels_id'),
-                    'manufacturer': printer.get('manufacturers_id'),
-                    'location': printer.get('location_name'),
-                    'ip_address': printer.get('ip'),
-                    'mac_address': printer.get('mac'),
-                    'os_info': json.dumps({}),
-                    'status': 'active',
-                    'specifications': json.dumps(printer)
-                }
-                print(f"Archiwizuję drukarkę: {asset_data['name']}")
-                archive_asset(asset_data)
-
-            print("Zakończono archiwizację urządzeń")
+            self.archive_refreshed_items(computers, network_devices, printers)
 
             # Log success
             with get_db_cursor() as cursor:
@@ -843,7 +1087,7 @@ class GLPIClient:
                         'model': item.get('computermodels_id'),
                         'manufacturer': item.get('manufacturers_id'),
                         'location': item.get('location_name'),
-                        'ip_address': self.get_device_ip(item['id'], headers) if 'id' in item else '',
+                        'ip_address': item.get('ip_address', ''),
                         'mac_address': item.get('mac'),
                         'os_info': json.dumps({
                             'os': item.get('operatingsystems_id'),
@@ -923,9 +1167,11 @@ class GLPIClient:
                 
             return base_data
 
-def get_glpi_data(refresh_api=False, from_db=True, category=None):
+def get_glpi_data(refresh_api=False, from_db=True, category=None, full=False):
     """
     Get GLPI data with flexible source control.
+
+    full forces a full (not incremental) refresh from the API.
     """
     try:
         client = GLPIClient()
@@ -944,7 +1190,7 @@ def get_glpi_data(refresh_api=False, from_db=True, category=None):
                 logger.info(f"Category '{category}' refreshed with {len(api_data.get('computers', []))} computers")
             else:
                 logger.info("Refreshing all data from API to database")
-                api_data = client.refresh_from_api()
+                api_data = client.refresh_from_api(full=full)
                 logger.info(f"All GLPI data refreshed with {len(api_data.get('computers', []))} computers")
         
         # Get data from database if requested
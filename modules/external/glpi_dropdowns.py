@@ -0,0 +1,142 @@
+"""
+Shared resolver of GLPI dropdown ids (locations, models, manufacturers,
+operating systems, users) to display names.
+
+Enrichment used to request every referenced dropdown row separately, once
+per asset. A fleet references only a few dozen distinct locations and
+models, so each dropdown table is instead downloaded once with paged range
+requests and lookups are served from an in-memory map. Tables expire after
+GLPI_DROPDOWN_TTL seconds and can be invalidated explicitly (a full sync
+starts with fresh tables). An id missing from a loaded table - an item
+added after the prefetch - is fetched on its own and remembered.
+"""
+import threading
+import time
+from requests.exceptions import RequestException
+from config import GLPI_DROPDOWN_TTL
+from .glpi_http import glpi_http
+
+# Rozmiar strony przy pobieraniu całego słownika (range=start-end)
+DROPDOWN_PAGE_SIZE = 1000
+
+
+def dropdown_display_name(itemtype, data, default):
+    """Display name of a dropdown row; users as 'firstname realname' when both are set"""
+    if itemtype == 'User':
+        first_name = data.get('firstname', '')
+        last_name = data.get('realname', '')
+        if first_name and last_name:
+            return f"{first_name} {last_name}"
+    return data.get('name') or default
+
+
+class GLPIDropdownResolver:
+    def __init__(self, ttl=GLPI_DROPDOWN_TTL, page_size=DROPDOWN_PAGE_SIZE, http=glpi_http):
+        self.ttl = ttl
+        self.page_size = page_size
+        self.http = http
+        self._tables = {}  # itemtype -> (id -> nazwa, czas pobrania, czy pobrano cały słownik)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'table_requests': 0, 'item_requests': 0}
+
+    def _fresh_table(self, itemtype, complete=False):
+        table = self._tables.get(itemtype)
+        if table is None or time.time() - table[1] > self.ttl or (complete and not table[2]):
+            return None
+        return table[0]
+
+    def _fetch_table(self, itemtype, headers):
+        """Download a whole dropdown table page by page; None when the request fails"""
+        names = {}
+        start = 0
+        while True:
+            response = self.http.get(itemtype, headers, params={'range': f'{start}-{start + self.page_size - 1}'})
+            with self._lock:
+                self._stats['table_requests'] += 1
+            if response.status_code not in (200, 206):
+                return names if start else None
+            rows = response.json()
+            if not rows or not isinstance(rows, list):
+                break
+            for row in rows:
+                if 'id' in row:
+                    names[int(row['id'])] = dropdown_display_name(itemtype, row, None)
+            if len(rows) < self.page_size:
+                break
+            start += len(rows)
+        return names
+
+    def _fetch_item(self, itemtype, item_id, headers):
+        response = self.http.get(f'{itemtype}/{item_id}', headers)
+        with self._lock:
+            self._stats['item_requests'] += 1
+        if response.status_code == 200:
+            return dropdown_display_name(itemtype, response.json(), None)
+        if response.status_code == 404:
+            return None
+        raise RequestException(f"HTTP {response.status_code}")
+
+    def prefetch(self, itemtypes, headers):
+        """Load every dropdown table that is not loaded yet or has expired"""
+        for itemtype in dict.fromkeys(itemtypes):
+            with self._lock:
+                if self._fresh_table(itemtype, complete=True) is not None:
+                    continue
+            try:
+                names = self._fetch_table(itemtype, headers)
+            except (RequestException, ValueError) as e:
+                print(f"Error prefetching GLPI {itemtype} names: {e}")
+                continue
+            if names is not None:
+                with self._lock:
+                    self._tables[itemtype] = (names, time.time(), True)
+                print(f"Prefetched {len(names)} GLPI {itemtype} names")
+
+    def resolve(self, itemtype, item_id, headers, default):
+        """Name for a dropdown id, from the loaded table or a single request"""
+        if not item_id:
+            return default
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return default
+
+        with self._lock:
+            names = self._fresh_table(itemtype)
+            if names is not None and item_id in names:
+                self._stats['hits'] += 1
+                name = names[item_id]
+                return name if name is not None else default
+            self._stats['misses'] += 1
+
+        try:
+            name = self._fetch_item(itemtype, item_id, headers)
+        except (RequestException, ValueError) as e:
+            print(f"Error fetching GLPI {itemtype} name for ID {item_id}: {e}")
+            return default
+        with self._lock:
+            # Zapamiętaj również nieistniejący ID (404), żeby nie pytać o niego ponownie
+            names = self._fresh_table(itemtype)
+            if names is None:
+                names = {}
+                self._tables[itemtype] = (names, time.time(), False)
+            names[item_id] = name
+        return name if name is not None else default
+
+    def invalidate(self, itemtype=None):
+        """Drop one loaded table, or all of them"""
+        with self._lock:
+            if itemtype is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(itemtype, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tables'] = {itemtype: len(table[0]) for itemtype, table in self._tables.items()}
+        return stats
+
+
+# Wspólny resolver dla wszystkich instancji GLPIClient w procesie
+dropdown_resolver = GLPIDropdownResolver()
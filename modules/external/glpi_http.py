@@ -0,0 +1,115 @@
+"""
+Shared HTTP access to the GLPI REST API.
+
+All GLPI requests of the process go through one keep-alive
+requests.Session (sized for the enrichment worker pool) and a token-bucket
+limiter, so a concurrent sync cannot flood the GLPI server: requests may
+burst up to GLPI_RATE_BURST and are then paced at GLPI_RATE_LIMIT per
+second. Latency and errors are collected per endpoint, together with the
+progress of running syncs, and are available through get_stats().
+"""
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config import GLPI_URL, GLPI_RATE_LIMIT, GLPI_RATE_BURST, GLPI_ENRICH_WORKERS
+
+
+class TokenBucket:
+    """Token bucket: rate tokens per second, at most capacity stored; rate <= 0 disables limiting"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available; returns the time waited in seconds"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class GLPIHttp:
+    def __init__(self, base_url=GLPI_URL, rate=GLPI_RATE_LIMIT, burst=GLPI_RATE_BURST,
+                 pool_size=GLPI_ENRICH_WORKERS, timeout=10):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.verify = False
+        self.limiter = TokenBucket(rate, burst)
+        self._stats = {}
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _endpoint(path):
+        parts = path.split('?', 1)[0].split('/')
+        # search/Computer osobno od Computer; Location/5 liczone razem z Location
+        return '/'.join(parts[:2]) if parts[0] == 'search' else parts[0]
+
+    def _record(self, endpoint, elapsed, waited, failed):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0, 'throttled_ms': 0.0
+            })
+            elapsed_ms = elapsed * 1000
+            stats['calls'] += 1
+            stats['errors'] += 1 if failed else 0
+            stats['total_ms'] += elapsed_ms
+            stats['last_ms'] = elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['throttled_ms'] += waited * 1000
+
+    def get(self, path, headers, params=None):
+        """GET {base_url}/apirest.php/{path} through the limiter and the shared session"""
+        waited = self.limiter.acquire()
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.get(
+                f'{self.base_url}/apirest.php/{path}',
+                headers=headers,
+                params=params,
+                timeout=self.timeout
+            )
+            failed = response.status_code >= 400
+            return response
+        finally:
+            self._record(self._endpoint(path), time.perf_counter() - start, waited, failed)
+
+    def set_progress(self, name, done, total=None):
+        """Progress of a running sync (e.g. items of an endpoint enriched so far)"""
+        with self._lock:
+            self._progress[name] = {'done': done, 'total': total, 'updated': time.time()}
+
+    def get_stats(self):
+        """Per-endpoint latency/error counters and sync progress"""
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._stats.items():
+                stats = dict(stats)
+                stats['avg_ms'] = stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0
+                endpoints[endpoint] = stats
+            progress = {name: dict(entry) for name, entry in self._progress.items()}
+        return {'endpoints': endpoints, 'progress': progress}
+
+
+# Wspólna sesja i limiter dla wszystkich zapytań do GLPI w procesie
+glpi_http = GLPIHttp()
@@ -1,22 +1,38 @@
 import requests
+from requests.adapters import HTTPAdapter
 import base64
+import hashlib
 import json
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime, timedelta, timezone
 import threading
 import time
-from config import GRAYLOG_URL, GRAYLOG_USERNAME, GRAYLOG_PASSWORD
-from ..core.database import log_system_event
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import (
+    GRAYLOG_URL, GRAYLOG_USERNAME, GRAYLOG_PASSWORD,
+    GRAYLOG_PAGE_SIZE, GRAYLOG_INGEST_DELAY, GRAYLOG_MAX_RESULT_WINDOW, GRAYLOG_WRITE_BATCH_SIZE,
+    GRAYLOG_FETCH_WORKERS, GRAYLOG_CACHE_MAX_BYTES, GRAYLOG_CACHE_TTL
+)
+from ..core.database import (
+    get_db_cursor, log_system_event, store_graylog_batch, get_detailed_messages, get_graylog_templates, named_lock
+)
+from ..core.cache import create_cache
+from ..utils.log_classifier import log_classifier
+from ..utils.log_templates import template_miner
+from .graylog_parser import parse_log_message, get_cache_stats as get_parser_stats
 
 # Dictionary for message translations
 MESSAGES = {
     'en': {
         'fetched_batch': "Fetched batch {}, total messages: {}",
+        'ingest_done': "Graylog ingest: {} new messages in {} pages, lag {}, write {:.0f} rows/s",
         'request_error': "Request error: {}",
         'error_fetching': "Error fetching logs: {}",
         'parsing_error': "Error parsing message: {}"
     },
     'pl': {
         'fetched_batch': "Pobrano partię {}, łączna liczba wiadomości: {}",
+        'ingest_done': "Graylog: {} nowych wiadomości w {} stronach, opóźnienie {}, zapis {:.0f} wierszy/s",
         'request_error': "Błąd zapytania: {}",
         'error_fetching': "Błąd podczas pobierania logów: {}",
         'parsing_error': "Błąd podczas przetwarzania wiadomości: {}"
@@ -31,112 +47,433 @@ def get_message(key, lang='pl', *args):
         return message.format(*args)
     return message
 
-def extract_nested_json(message_str: str) -> dict:
-    try:
-        dash_pos = message_str.find('-')
-        if dash_pos == -1:
-            return None
-            
-        # Extract process ID and find JSON
-        process_id = message_str[:dash_pos].strip()
-        json_start = message_str.find('{', dash_pos)
-        
-        if json_start != -1:
-            json_str = message_str[json_start:]
-            data = json.loads(json_str)
-            data['process_id'] = process_id
-            return data
-            
-        return None
-    except json.JSONDecodeError:
-        return None
+class GraylogBuffer:
+    """
+    Result cache of get_logs() per time range.
 
-def parse_log_message(raw_message) -> dict:
-    try:
-        # Parse outer JSON if needed
-        message_data = json.loads(raw_message) if isinstance(raw_message, str) else raw_message
-        inner_message = message_data.get('message', '')
-        nested_data = extract_nested_json(str(inner_message))
-        
-        if nested_data:            return {
-                'process_id': nested_data.get('process_id'),
-                'formssessionname': nested_data.get('formsSessionName'),
-                'formsformname': nested_data.get('formsFormName'),
-                'formsdbsessionid': nested_data.get('formsDbSessionId'),
-                'formsusername': nested_data.get('formsUsername'),
-                'callsite': nested_data.get('callSite'),
-                'thread': nested_data.get('thread'),
-                'type': nested_data.get('type', 'INFO'),
-                'message': nested_data.get('message', '').strip()
-            }
-        
-        return {'message': inner_message}
-    except (json.JSONDecodeError, AttributeError) as e:
-        from flask import session, g
-        lang = getattr(g, 'language', session.get('language', 'en'))
-        print(get_message('parsing_error', lang, str(e)))
-        return {'message': str(raw_message)}
+    Backed by a BoundedCache (byte budget, LRU, TTL), shared between
+    workers when CACHE_REDIS_URL is configured.
+    """
+    def __init__(self, max_bytes=GRAYLOG_CACHE_MAX_BYTES, ttl=GRAYLOG_CACHE_TTL):
+        self.cache = create_cache('graylog_logs', max_bytes, ttl)
 
-class GraylogBuffer:
-    def __init__(self):
-        self.buffer = {}
-        self.lock = threading.Lock()
-        self.MAX_BUFFER_AGE = 24 * 60 * 60  # 24 godziny w sekundach
-        self.last_refresh_time = None
-        self.latest_data = None
-        
-        # Uruchom wątek czyszczący stare dane
-        self.cleanup_thread = threading.Thread(target=self._cleanup_old_data, daemon=True)
-        self.cleanup_thread.start()
-    
     def add_logs(self, time_range, logs_data):
-        with self.lock:
-            self.buffer[time_range] = {
-                'data': logs_data,
-                'timestamp': datetime.now(),
-                'expires': datetime.now() + timedelta(hours=24)
-            }
-            self.last_refresh_time = time.time()
-            self.latest_data = logs_data
-    
+        key = f"logs:{time_range}"
+        self.cache.set(key, logs_data)
+        # 'latest' wskazuje klucz wyniku zamiast drugiej kopii danych
+        self.cache.set('latest', key)
+        self.cache.set('last_refresh', time.time())
+
     def get_logs(self, time_range):
-        with self.lock:
-            if time_range in self.buffer:
-                buffer_data = self.buffer[time_range]
-                if datetime.now() < buffer_data['expires']:
-                    return buffer_data['data']
-                else:
-                    del self.buffer[time_range]
-            return None
-    
+        return self.cache.get(f"logs:{time_range}")
+
     def get_last_refresh(self):
         """Return the timestamp of the last data refresh"""
-        with self.lock:
-            return self.last_refresh_time
-    
+        return self.cache.get('last_refresh')
+
     def get_latest_data(self):
-        """Return the most recently fetched data"""
-        with self.lock:
-            return self.latest_data
-    
-    def _cleanup_old_data(self):
-        while True:
-            time.sleep(300)  # Sprawdzaj co 5 minut
-            with self.lock:
-                current_time = datetime.now()
-                expired_ranges = [
-                    tr for tr, data in self.buffer.items() 
-                    if current_time >= data['expires']
-                ]
-                for tr in expired_ranges:
-                    del self.buffer[tr]
+        """Return the most recently fetched data (None when it has been evicted)"""
+        key = self.cache.get('latest')
+        return self.cache.get(key) if key is not None else None
+
+    def get_stats(self):
+        return self.cache.get_stats()
 
 # Utworzenie globalnego bufora
 graylog_buffer = GraylogBuffer()
 
-def get_logs(time_range_minutes: int = 5, force_refresh: bool = False, lang: str = 'pl') -> dict:
+def setup_graylog_ingest_table():
+    """Create graylog_ingest_state table if not exists"""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS graylog_ingest_state (
+                name VARCHAR(64) NOT NULL PRIMARY KEY,
+                last_timestamp VARCHAR(32),
+                last_message_ids TEXT,
+                updated_at DATETIME NOT NULL
+            )
+        """)
+
+def load_graylog_templates():
+    """Restore the stored templates into the template miner so template ids survive restarts"""
+    try:
+        loaded = template_miner.load(get_graylog_templates())
+        print(f"Loaded {loaded} Graylog message templates")
+    except Exception as e:
+        print(f"Error loading Graylog message templates: {e}")
+
+def _auth_headers():
+    credentials = f"{GRAYLOG_USERNAME}:{GRAYLOG_PASSWORD}"
+    return {
+        "Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}",
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+
+def parse_graylog_timestamp(timestamp):
+    """Parse a Graylog ISO-8601 timestamp into an aware UTC datetime (None if invalid)"""
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+
+def format_graylog_timestamp(dt):
+    """Format an aware datetime the way the Graylog search API expects it"""
+    dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+
+def message_fields(msg):
+    """Return the message fields of a search result entry (id and timestamp live there)"""
+    fields = msg.get("message")
+    return fields if isinstance(fields, dict) else msg
+
+def message_hash(message_id, timestamp, source, message):
     """
-    Fetch and process logs from Graylog with smart caching
+    16-byte identity of a message for graylog_messages.message_hash.
+
+    The Graylog message id (a UUID) when there is one, otherwise a blake2b
+    hash of timestamp, source and the raw message text.
+    """
+    if message_id:
+        try:
+            return uuid.UUID(str(message_id)).bytes
+        except ValueError:
+            return hashlib.blake2b(f"id\x1f{message_id}".encode(), digest_size=16).digest()
+    content = f"{timestamp}\x1f{source}\x1f{message}"
+    return hashlib.blake2b(content.encode('utf-8', 'replace'), digest_size=16).digest()
+
+def process_message(msg):
+    """Parse and classify a single search result entry"""
+    fields = message_fields(msg)
+    # Parse message content
+    parsed_data = parse_log_message(msg.get("message", {}))
+
+    # Format timestamp
+    timestamp = fields.get("timestamp") or msg.get("timestamp")
+    formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    dt = parse_graylog_timestamp(timestamp)
+    if dt:
+        formatted_time = dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+    # Determine severity and category
+    level = parsed_data.get('type', 'INFO').upper()
+    severity, category = log_classifier.classify(parsed_data.get('message', ''), level)
+    template_id, template, params = template_miner.add(parsed_data.get('message', ''))
+
+    details = {k: v for k, v in parsed_data.items() if k != 'message' and v is not None}
+    if params:
+        details['params'] = params
+
+    message_id = fields.get("_id") or msg.get("id")
+    return {
+        "message_id": message_id,
+        "message_hash": message_hash(message_id, timestamp or formatted_time, fields.get("source"),
+                                     fields.get("message")),
+        "timestamp": formatted_time,
+        "level": level,
+        "severity": severity,
+        "category": category,
+        "details": details,
+        "message": parsed_data.get('message', '').strip(),
+        "template_id": template_id,
+        "template": template,
+        "parsed": parsed_data
+    }
+
+def system_log_events(processed):
+    """system_logs mirror rows (source, severity, host_name, message) of processed messages"""
+    severity_mapping = {
+        "high": "critical",
+        "medium": "warning",
+        "low": "info"
+    }
+    return [(
+        'graylog',
+        severity_mapping.get(message['severity'], 'info'),
+        message['parsed'].get('formsdbsessionid', 'unknown'),
+        message['message']
+    ) for message in processed]
+
+class GraylogIngestor:
+    """
+    Incremental Graylog ingestion driven by a persisted high-water mark.
+
+    The mark is the timestamp of the newest ingested message plus the ids
+    of the messages with exactly that timestamp. Each run searches the
+    absolute range from the mark to now (minus a short indexing delay),
+    sorted by timestamp, and pages through it completely - when the offset
+    reaches Graylog's result window the search is re-anchored at the mark.
+    Messages at the boundary that were already ingested are skipped, so
+    nothing is downloaded or stored twice and bursts are not truncated.
+
+    Once the first page reports total_results, the remaining pages of the
+    window are fetched and parsed concurrently on the shared keep-alive
+    session; pages are stored and the mark advanced in offset order.
+    """
+
+    STATE_NAME = 'universal'
+    # Blokada MySQL (GET_LOCK) - jedno pobieranie naraz we wszystkich workerach
+    LOCK_NAME = 'graylog_ingest'
+
+    def __init__(self, page_size=GRAYLOG_PAGE_SIZE, delay=GRAYLOG_INGEST_DELAY,
+                 max_result_window=GRAYLOG_MAX_RESULT_WINDOW, write_batch_size=GRAYLOG_WRITE_BATCH_SIZE,
+                 workers=GRAYLOG_FETCH_WORKERS):
+        self.page_size = page_size
+        self.write_batch_size = write_batch_size
+        self.delay = delay
+        self.max_result_window = max_result_window
+        self.workers = max(1, workers)
+        self.session = requests.Session()
+        # Jedno połączenie keep-alive na wątek pobierający
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self._mark = None  # (timestamp ISO, set id wiadomości z tym timestampem)
+        self._table_ready = False
+        self._stats = {
+            'runs': 0,
+            'messages': 0,
+            'skipped_messages': 0,
+            'pages': 0,
+            'last_run': None,
+            'last_duration': None,
+            'last_messages': 0,
+            'last_lag_seconds': None,
+            'rows_written': 0,
+            'duplicates': 0,
+            'write_seconds': 0.0,
+            'last_rows_per_sec': None
+        }
+
+    def _ingest_lock(self):
+        """Hold the cross-process ingest lock; yields False when another worker is ingesting"""
+        return named_lock(self.LOCK_NAME)
+
+    def _load_mark(self):
+        if not self._table_ready:
+            setup_graylog_ingest_table()
+            self._table_ready = True
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT last_timestamp, last_message_ids
+                FROM graylog_ingest_state
+                WHERE name = %s
+            """, (self.STATE_NAME,))
+            row = cursor.fetchone()
+        if row and row['last_timestamp']:
+            return row['last_timestamp'], set(json.loads(row['last_message_ids'] or '[]'))
+        return None, set()
+
+    def _save_mark(self):
+        timestamp, ids = self._mark
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO graylog_ingest_state (name, last_timestamp, last_message_ids, updated_at)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                last_timestamp = VALUES(last_timestamp),
+                last_message_ids = VALUES(last_message_ids),
+                updated_at = VALUES(updated_at)
+            """, (self.STATE_NAME, timestamp, json.dumps(sorted(ids)), datetime.now()))
+
+    def _search(self, time_from, time_to, offset):
+        response = self.session.get(
+            f"{GRAYLOG_URL}/api/search/universal/absolute",
+            headers=_auth_headers(),
+            params={
+                "query": "*",
+                "from": time_from,
+                "to": time_to,
+                "limit": self.page_size,
+                "offset": offset,
+                "sort": "timestamp:asc"
+            },
+            verify=False,
+            timeout=60
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_page(self, time_from, time_to, offset, anchor):
+        """
+        Fetch and parse one page of the search.
+
+        Returns (total_results or None, number of messages on the page, new
+        messages as (datetime, timestamp, message id, processed message)).
+        Messages not newer than the anchor mark are skipped; a message that
+        cannot be processed is logged and returned with None, so the mark
+        still moves past it.
+        """
+        data = self._search(time_from, time_to, offset)
+        messages = data.get("messages", [])
+        anchor_dt, anchor_ids = anchor
+
+        page = []
+        for msg in messages:
+            fields = message_fields(msg)
+            message_id = fields.get("_id") or msg.get("id")
+            timestamp = fields.get("timestamp") or msg.get("timestamp")
+            dt = parse_graylog_timestamp(timestamp)
+            if dt is None:
+                continue
+            if anchor_dt is not None and (dt < anchor_dt or (dt == anchor_dt and message_id in anchor_ids)):
+                # Już zapisana (granica poprzedniego pobrania)
+                continue
+            try:
+                processed = process_message(msg)
+            except Exception as e:
+                # Jedna wadliwa wiadomość nie może zatrzymać pobierania od tego samego znacznika
+                print(f"Skipping Graylog message {message_id} ({timestamp}): {e}")
+                processed = None
+            page.append((dt, timestamp, message_id, processed))
+        return data.get("total_results"), len(messages), page
+
+    def _store_page(self, processed):
+        """Write a page of messages and their system_logs mirror in one transaction"""
+        result = store_graylog_batch(processed, system_log_events(processed), self.write_batch_size)
+        self._stats['rows_written'] += result['rows']
+        self._stats['duplicates'] += result.get('duplicates', 0)
+        self._stats['write_seconds'] += result['duration']
+        return result
+
+    def ingest(self, initial_minutes=5, lang='pl'):
+        """
+        Fetch and store every message newer than the high-water mark.
+
+        On the first run (no mark yet) the last initial_minutes are
+        ingested. Only one worker process ingests at a time and it starts
+        from the mark stored in the database, so workers do not fetch the
+        same range; a worker that finds the lock taken skips the run.
+        Returns the number of new messages.
+        """
+        with self.lock, self._ingest_lock() as acquired:
+            if not acquired:
+                print("Graylog ingest already running in another process, skipping")
+                return 0
+            # Znacznik czytany przy każdym pobraniu - mógł go przesunąć inny worker
+            self._mark = self._load_mark()
+
+            started = time.time()
+            now = datetime.now(timezone.utc)
+            mark_timestamp, mark_ids = self._mark
+            time_from = mark_timestamp or format_graylog_timestamp(now - timedelta(minutes=initial_minutes))
+            time_to = format_graylog_timestamp(now - timedelta(seconds=self.delay))
+            mark_dt = parse_graylog_timestamp(mark_timestamp) if mark_timestamp else None
+
+            run = {'pages': 0, 'messages': 0, 'skipped': 0, 'max_lag': None, 'rows': 0, 'write_seconds': 0.0}
+            # Pełne strony mieszczące się w oknie wyników Graylog
+            window_size = max(self.page_size, self.max_result_window // self.page_size * self.page_size)
+
+            def flush(page):
+                nonlocal mark_dt, mark_timestamp, mark_ids
+                processed = []
+                for dt, timestamp, message_id, message in page:
+                    if message is None:
+                        run['skipped'] += 1
+                    else:
+                        processed.append(message)
+                    if mark_dt is None or dt > mark_dt:
+                        mark_dt, mark_timestamp, mark_ids = dt, timestamp, {message_id}
+                    else:
+                        mark_ids.add(message_id)
+                    lag = (now - dt).total_seconds()
+                    run['max_lag'] = lag if run['max_lag'] is None else max(run['max_lag'], lag)
+
+                if processed:
+                    written = self._store_page(processed)
+                    run['rows'] += written['rows']
+                    run['write_seconds'] += written['duration']
+                    run['messages'] += len(processed)
+                if page:
+                    # Znacznik zapisywany po każdej stronie - przerwane pobieranie wznawia się od niej
+                    self._mark = (mark_timestamp, mark_ids)
+                    self._save_mark()
+
+                run['pages'] += 1
+                print(get_message('fetched_batch', lang, run['pages'], run['messages']))
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while True:
+                    # Strony jednego okna filtrujemy względem znacznika z początku okna
+                    anchor = (mark_dt, set(mark_ids))
+                    window_mark = mark_timestamp
+                    total, count, page = self._fetch_page(time_from, time_to, 0, anchor)
+                    flush(page)
+                    if count < self.page_size:
+                        break
+
+                    if total is not None:
+                        # Pozostałe strony okna równolegle, zapis w kolejności offsetów
+                        futures = {
+                            executor.submit(self._fetch_page, time_from, time_to, offset, anchor): offset
+                            for offset in range(self.page_size, min(total, window_size), self.page_size)
+                        }
+                        completed = {}
+                        next_offset = self.page_size
+                        for future in as_completed(futures):
+                            completed[futures[future]] = future.result()
+                            while next_offset in completed:
+                                flush(completed.pop(next_offset)[2])
+                                next_offset += self.page_size
+                        more = total > window_size
+                    else:
+                        # Brak total_results - strony kolejno aż do niepełnej
+                        more = True
+                        for offset in range(self.page_size, window_size, self.page_size):
+                            _, count, page = self._fetch_page(time_from, time_to, offset, anchor)
+                            flush(page)
+                            if count < self.page_size:
+                                more = False
+                                break
+
+                    if not more or mark_timestamp == window_mark:
+                        break
+                    # Limit okna wyników Graylog - kontynuujemy od znacznika
+                    time_from = mark_timestamp
+
+            pages, new_messages, max_lag = run['pages'], run['messages'], run['max_lag']
+            rows_written, write_seconds = run['rows'], run['write_seconds']
+
+            duration = time.time() - started
+            self._stats['runs'] += 1
+            self._stats['messages'] += new_messages
+            self._stats['skipped_messages'] += run['skipped']
+            self._stats['pages'] += pages
+            self._stats['last_run'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._stats['last_duration'] = round(duration, 3)
+            self._stats['last_messages'] = new_messages
+            self._stats['last_lag_seconds'] = round(max_lag, 3) if max_lag is not None else None
+            rows_per_sec = rows_written / write_seconds if write_seconds > 0 else 0.0
+            if rows_written:
+                self._stats['last_rows_per_sec'] = round(rows_per_sec, 1)
+            print(get_message('ingest_done', lang, new_messages, pages,
+                              f"{max_lag:.1f}s" if max_lag is not None else '-', rows_per_sec))
+            return new_messages
+
+    def get_stats(self):
+        """Ingest counters and the age of the high-water mark"""
+        with self.lock:
+            stats = dict(self._stats)
+            mark_timestamp = self._mark[0] if self._mark else None
+        mark_dt = parse_graylog_timestamp(mark_timestamp) if mark_timestamp else None
+        stats['high_water_mark'] = mark_timestamp
+        stats['mark_age_seconds'] = (
+            round((datetime.now(timezone.utc) - mark_dt).total_seconds(), 3) if mark_dt else None
+        )
+        stats['parser'] = get_parser_stats()
+        stats['templates'] = template_miner.get_stats()
+        return stats
+
+# Wspólny ingestor (jedna sesja HTTP na proces, znacznik w bazie)
+graylog_ingestor = GraylogIngestor()
+
+def get_logs(time_range_minutes: int = 5, force_refresh: bool = False, lang: str = 'pl', limit: int = 300) -> dict:
+    """
+    Ingest new Graylog messages and return the last time_range_minutes of logs.
+
+    Only messages newer than the ingest high-water mark are fetched from
+    Graylog; the returned window is read from graylog_messages.
     """
     # Sprawdź bufor tylko jeśli nie wymuszono odświeżenia
     if not force_refresh:
@@ -150,136 +487,58 @@ def get_logs(time_range_minutes: int = 5, force_refresh: bool = False, lang: str
     current_time = time.time()
     last_refresh = graylog_buffer.get_last_refresh()
     
-    # Jeśli nie minął minimalny interwał, zwróć dane z bufora
+    # Jeśli nie minął minimalny interwał, zwróć dane z bufora (o ile nie zostały usunięte z cache)
     if not force_refresh and last_refresh and (current_time - last_refresh) < MIN_REFRESH_INTERVAL:
-        return graylog_buffer.get_latest_data()
+        latest_data = graylog_buffer.get_latest_data()
+        if latest_data is not None:
+            return latest_data
 
-    credentials = f"{GRAYLOG_USERNAME}:{GRAYLOG_PASSWORD}"
-    headers = {
-        "Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    
     try:
-        all_messages = []
-        page = 0
-        page_size = 150
-        total_desired = 300  # Zmniejszamy limit z 2000 na 300
-        
-        while len(all_messages) < total_desired:
-            # Dodaj parametry paginacji do zapytania
-            response = requests.get(
-                f"{GRAYLOG_URL}/api/search/universal/relative",
-                headers=headers,
-                params={
-                    "query": "*",
-                    "range": time_range_minutes * 60,
-                    "limit": page_size,
-                    "offset": page * page_size
-                },
-                verify=False
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            messages = data.get("messages", [])
-            
-            if not messages:  # Jeśli nie ma więcej wiadomości, przerwij
-                break
-                
-            processed_batch = []
-            for msg in messages:
-                # Parse message content
-                parsed_data = parse_log_message(msg.get("message", {}))
-                
-                # Log to database
-                severity_mapping = {
-                    "high": "critical",
-                    "medium": "warning",
-                    "low": "info"
-                }
-                
-                log_system_event(
-                    source='graylog',
-                    severity=severity_mapping.get(parsed_data.get('severity', 'low'), 'info'),
-                    host_name=parsed_data.get('formsdbsessionid', 'unknown'),
-                    message=parsed_data.get('message', '')
-                )
-
-                # Format timestamp
-                timestamp = msg.get("timestamp")
-                formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                if timestamp:
-                    try:
-                        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                        formatted_time = dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                    except (ValueError, AttributeError):
-                        pass
-
-                # Determine severity and category
-                actual_message = parsed_data.get('message', '').lower()
-                level = parsed_data.get('type', 'INFO').upper()
-                
-                severity = ("high" if level == "ERROR" or "error" in actual_message else
-                           "medium" if level == "WARN" or "warning" in actual_message else
-                           "low")
-
-                category = ("System Error" if "error" in actual_message else
-                           "Security Alert" if any(k in actual_message for k in ["unauthorized", "forbidden", "denied"]) else
-                           "Performance Issue" if any(k in actual_message for k in ["timeout", "slow", "performance"]) else
-                           "Service Status" if any(k in actual_message for k in ["service", "started", "stopped"]) else
-                           "General Warning")
-
-                processed_batch.append({
-                    "timestamp": formatted_time,
-                    "level": level,
-                    "severity": severity,
-                    "category": category,
-                    "details": {k: v for k, v in parsed_data.items() if k != 'message' and v is noseverity_mappingt None},
-                    "message": parsed_data.get('message', '').strip()
-                })
-
-            all_messages.extend(processed_batch)
-            print(get_message('fetched_batch', lang, page + 1, len(all_messages)))
-            
-            page += 1
-            if len(messages) < page_size:  # Jeśli otrzymaliśmy mniej wiadomości niż rozmiar strony
-                break
-
-        # Sort messages and calculate stats
-        severity_order = {"high": 0, "medium": 1, "low": 2}
-        all_messages.sort(key=lambda x: (x["timestamp"], severity_order[x["severity"]]))
-        
-        stats = {
-            "error_count": sum(1 for msg in all_messages if msg["severity"] == "high"),
-            "warn_count": sum(1 for msg in all_messages if msg["severity"] == "medium"),
-            "info_count": sum(1 for msg in all_messages if msg["severity"] == "low"),
-        }
-
-        # Translations for time range
-        time_range_msg = {
-            'en': f"Last {time_range_minutes} minutes",
-            'pl': f"Ostatnie {time_range_minutes} minut"
-        }
-
-        result = {
-            "logs": all_messages,
-            "total_results": len(all_messages),
-            "time_range": time_range_msg.get(lang, time_range_msg['en']),
-            "query_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            "stats": stats,
-            "language": lang
-        }
-          # Store messages in database
-        from ..core.database import store_graylog_messages
-        store_graylog_messages(all_messages)
-        
-        graylog_buffer.add_logs(time_range_minutes, result)
-        return result
-
+        graylog_ingestor.ingest(initial_minutes=time_range_minutes, lang=lang)
     except requests.exceptions.RequestException as e:
         error_msg = get_message('request_error', lang, str(e))
         print(error_msg)
         log_system_event('graylog', 'error', 'system', get_message('error_fetching', lang, str(e)))
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+    # Znaczniki czasu Graylog są w UTC
+    end_time = datetime.now(timezone.utc).replace(tzinfo=None)
+    start_time = end_time - timedelta(minutes=time_range_minutes)
+    window = get_detailed_messages(start_time, end_time, limit=limit)
+
+    all_messages = [{
+        "timestamp": msg['timestamp'].strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+        "level": msg['level'],
+        "severity": msg['severity'],
+        "category": msg['category'],
+        "details": json.loads(msg['details']) if msg['details'] else {},
+        "message": msg['message']
+    } for msg in window['messages']]
+
+    # Sort messages and calculate stats
+    severity_order = {"high": 0, "medium": 1, "low": 2}
+    all_messages.sort(key=lambda x: (x["timestamp"], severity_order.get(x["severity"], 2)))
+    
+    stats = {
+        "error_count": sum(1 for msg in all_messages if msg["severity"] == "high"),
+        "warn_count": sum(1 for msg in all_messages if msg["severity"] == "medium"),
+        "info_count": sum(1 for msg in all_messages if msg["severity"] == "low"),
+    }
+
+    # Translations for time range
+    time_range_msg = {
+        'en': f"Last {time_range_minutes} minutes",
+        'pl': f"Ostatnie {time_range_minutes} minut"
+    }
+
+    result = {
+        "logs": all_messages,
+        "total_results": window['total_in_db'],
+        "time_range": time_range_msg.get(lang, time_range_msg['en']),
+        "query_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "stats": stats,
+        "language": lang
+    }
+    
+    graylog_buffer.add_logs(time_range_minutes, result)
+    return result
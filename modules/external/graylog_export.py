@@ -0,0 +1,192 @@
+"""
+Streaming Graylog export ingestion for long ranges.
+
+Offset paging gets slower with every page and stops at the server's result
+window, so long ranges (a 24-hour backfill of millions of messages) are
+read from Graylog's export search instead: the CSV response is consumed
+line by line as a generator, every row is parsed and classified like a
+search result and rows are written in batches. Memory use is bounded by
+one batch, whatever the size of the range.
+
+A saved export (CSV, or NDJSON with one message per line) can be ingested
+from a file the same way. Stored messages are deduplicated by their
+message hash, so a failed or repeated run can simply be started again.
+
+Usage:
+    python -m modules.external.graylog_export --from "2024-06-07 00:00" --to "2024-06-08 00:00"
+    python -m modules.external.graylog_export --file export.ndjson --format ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import requests
+import urllib3
+from config import GRAYLOG_URL, GRAYLOG_WRITE_BATCH_SIZE
+from ..core.database import store_graylog_batch
+from .graylog import (
+    _auth_headers, format_graylog_timestamp, load_graylog_templates, process_message, system_log_events
+)
+
+EXPORT_FIELDS = ['timestamp', 'source', 'message', '_id']
+
+# Pola wiadomości z Graylog bywają długie (stack trace w message)
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+def iter_csv_rows(lines):
+    """Yield export rows as dicts from an iterable of CSV lines"""
+    for row in csv.DictReader(lines):
+        yield row
+
+
+def iter_ndjson_rows(lines):
+    """Yield export rows as dicts from an iterable of NDJSON lines"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            print(f"Skipping invalid NDJSON line: {e}")
+            continue
+        # Wynik wyszukiwania ({"message": {...pola...}}) albo same pola
+        if isinstance(row.get('message'), dict):
+            row = row['message']
+        yield row
+
+
+ROW_READERS = {'csv': iter_csv_rows, 'ndjson': iter_ndjson_rows}
+
+
+def row_to_search_entry(row):
+    """Wrap an export row in the shape of a search result entry for process_message()"""
+    return {'message': {
+        '_id': row.get('_id') or row.get('id'),
+        'timestamp': row.get('timestamp'),
+        'source': row.get('source'),
+        'message': row.get('message', '')
+    }}
+
+
+class GraylogExportIngestor:
+    def __init__(self, batch_size=GRAYLOG_WRITE_BATCH_SIZE, chunk_hours=1):
+        self.batch_size = max(1, batch_size)
+        self.chunk = timedelta(hours=chunk_hours)
+        self.session = requests.Session()
+
+    def stream_export(self, start, end):
+        """Yield CSV lines of the export search for [start, end) (aware datetimes)"""
+        response = self.session.get(
+            f"{GRAYLOG_URL}/api/search/universal/absolute/export",
+            headers={**_auth_headers(), "Accept": "text/csv"},
+            params={
+                "query": "*",
+                "from": format_graylog_timestamp(start),
+                "to": format_graylog_timestamp(end),
+                "fields": ",".join(EXPORT_FIELDS)
+            },
+            stream=True,
+            verify=False,
+            timeout=(10, 300)
+        )
+        response.raise_for_status()
+        response.raw.decode_content = True
+        try:
+            # newline='' - pola w cudzysłowach mogą zawierać znaki nowej linii (stack trace)
+            yield from io.TextIOWrapper(response.raw, encoding='utf-8', errors='replace', newline='')
+        except urllib3.exceptions.HTTPError as e:
+            # Czytanie response.raw omija opakowanie błędów requests (zerwane połączenie, timeout odczytu)
+            raise requests.exceptions.ConnectionError(e) from e
+        finally:
+            response.close()
+
+    def ingest_rows(self, rows, summary):
+        """Parse, classify and store rows in batches; updates summary in place"""
+        batch = []
+        for row in rows:
+            summary['read'] += 1
+            if not row.get('message') and not row.get('timestamp'):
+                summary['skipped'] += 1
+                continue
+            batch.append(process_message(row_to_search_entry(row)))
+            if len(batch) >= self.batch_size:
+                self._write(batch, summary)
+                batch = []
+        if batch:
+            self._write(batch, summary)
+
+    def _write(self, batch, summary):
+        result = store_graylog_batch(batch, system_log_events(batch), self.batch_size)
+        summary['batches'] += 1
+        summary['stored'] += len(batch) - result.get('duplicates', 0)
+        summary['duplicates'] += result.get('duplicates', 0)
+        elapsed = time.time() - summary['started']
+        print(f"Graylog export: {summary['read']} rows read, {summary['stored']} stored, "
+              f"{summary['duplicates']} duplicates, {summary['read'] / elapsed if elapsed else 0:.0f} rows/s")
+
+    def _summary(self):
+        return {'read': 0, 'stored': 0, 'duplicates': 0, 'skipped': 0, 'batches': 0,
+                'errors': 0, 'started': time.time()}
+
+    def _finish(self, summary):
+        summary['duration'] = round(time.time() - summary.pop('started'), 2)
+        return summary
+
+    def run(self, start, end):
+        """
+        Stream the export search for [start, end) in chunks of chunk_hours.
+
+        A chunk that fails is reported and the run continues; running the
+        same range again fills it in without duplicating stored messages.
+        """
+        summary = self._summary()
+        current = start
+        while current < end:
+            chunk_end = min(current + self.chunk, end)
+            try:
+                self.ingest_rows(iter_csv_rows(self.stream_export(current, chunk_end)), summary)
+            except requests.exceptions.RequestException as e:
+                summary['errors'] += 1
+                print(f"Graylog export {current} - {chunk_end} failed: {e}")
+            current = chunk_end
+        return self._finish(summary)
+
+    def run_file(self, path, fmt='csv'):
+        """Ingest a saved export file line by line"""
+        summary = self._summary()
+        with open(path, encoding='utf-8', newline='') as f:
+            self.ingest_rows(ROW_READERS[fmt](f), summary)
+        return self._finish(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from', dest='start', help="Start (UTC), 'YYYY-MM-DD HH:MM'")
+    parser.add_argument('--to', dest='end', help="End (UTC), 'YYYY-MM-DD HH:MM' (default: now)")
+    parser.add_argument('--file', help="Ingest a saved export file instead of querying Graylog")
+    parser.add_argument('--format', choices=sorted(ROW_READERS), default='csv', help="Format of --file")
+    parser.add_argument('--batch-size', type=int, default=GRAYLOG_WRITE_BATCH_SIZE)
+    parser.add_argument('--chunk-hours', type=int, default=1)
+    args = parser.parse_args()
+
+    load_graylog_templates()
+    ingestor = GraylogExportIngestor(batch_size=args.batch_size, chunk_hours=args.chunk_hours)
+    if args.file:
+        summary = ingestor.run_file(args.file, args.format)
+    else:
+        if not args.start:
+            parser.error("--from is required when --file is not given")
+        start = datetime.strptime(args.start, '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc)
+        end = (datetime.strptime(args.end, '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc)
+               if args.end else datetime.now(timezone.utc))
+        summary = ingestor.run(start, end)
+    print(f"Graylog export finished: {summary}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Fast-path parser for Graylog message payloads.
+
+Forms/WebLogic messages arrive as 'PROCESS_ID - {json}' text inside the
+Graylog message fields, but many lines are plain text. The payload shape is
+detected with a few string scans before any decoder runs, so plain lines
+never go through a failing json.loads; only text that can be a complete
+JSON object is decoded, with orjson when it is installed.
+
+Parsed payloads are memoized in a bounded LRU cache keyed by the message
+text - heartbeats, session open/close lines and other repeated payloads are
+decoded once. Only texts up to PAYLOAD_CACHE_MAX_CHARS are cached: repeated
+payloads are short, while long ones (stack traces, large JSON documents)
+are nearly always unique, so the cache stays within about
+PAYLOAD_CACHE_SIZE * 2 * PAYLOAD_CACHE_MAX_CHARS characters. Callers get a
+copy, so the cached entry cannot be modified.
+"""
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Rozmiar cache sparsowanych payloadów (liczba różnych treści wiadomości)
+PAYLOAD_CACHE_SIZE = 8192
+# Dłuższe treści są parsowane bez cache - ogranicza pamięć (klucz i wynik zawierają tekst)
+PAYLOAD_CACHE_MAX_CHARS = 2048
+
+# Payload bez zagnieżdżonego JSON-a (tekst) i z JSON-em ('PID - {...}')
+SHAPE_TEXT = 'text'
+SHAPE_NESTED_JSON = 'nested_json'
+
+
+def _loads_orjson(text):
+    try:
+        return orjson.loads(text)
+    except ValueError:
+        # orjson odrzuca NaN i liczby > 64 bit, które akceptuje moduł json
+        return json.loads(text)
+
+
+loads = _loads_orjson if ORJSON_AVAILABLE else json.loads
+
+
+def detect_shape(text):
+    """
+    Return (shape, process_id, json_start) for a message text.
+
+    A nested payload needs a '-' separator, a '{' after it and a closing
+    '}' at the end - anything else cannot decode to a JSON object.
+    """
+    dash_pos = text.find('-')
+    if dash_pos == -1:
+        return SHAPE_TEXT, None, -1
+    json_start = text.find('{', dash_pos)
+    if json_start == -1 or not text.rstrip().endswith('}'):
+        return SHAPE_TEXT, None, -1
+    return SHAPE_NESTED_JSON, text[:dash_pos].strip(), json_start
+
+
+def extract_nested_json(message_str: str) -> dict:
+    """Decode the JSON part of a 'PROCESS_ID - {json}' text (None if there is none)"""
+    shape, process_id, json_start = detect_shape(message_str)
+    if shape != SHAPE_NESTED_JSON:
+        return None
+    try:
+        data = loads(message_str[json_start:])
+    except ValueError:
+        # Wygląda jak JSON, ale jest uszkodzony (np. ucięty przez Graylog)
+        return None
+    if not isinstance(data, dict):
+        return None
+    data['process_id'] = process_id
+    return data
+
+
+def _parse_text(text):
+    nested_data = extract_nested_json(text)
+    if nested_data:
+        message = nested_data.get('message')
+        if isinstance(message, (dict, list)):
+            # Zagnieżdżony obiekt zamiast tekstu - zostawiamy surową linię
+            return {'message': text}
+        return {
+            'process_id': nested_data.get('process_id'),
+            'formssessionname': nested_data.get('formsSessionName'),
+            'formsformname': nested_data.get('formsFormName'),
+            'formsdbsessionid': nested_data.get('formsDbSessionId'),
+            'formsusername': nested_data.get('formsUsername'),
+            'callsite': nested_data.get('callSite'),
+            'thread': nested_data.get('thread'),
+            'type': str(nested_data.get('type') or 'INFO'),
+            'message': ('' if message is None else str(message)).strip()
+        }
+    return {'message': text}
+
+
+_parse_text_cached = lru_cache(maxsize=PAYLOAD_CACHE_SIZE)(_parse_text)
+
+
+def parse_log_message(raw_message) -> dict:
+    """
+    Parse the message fields of a Graylog search result entry.
+
+    raw_message is the fields dict (or its JSON text); the returned dict
+    holds the nested Forms fields, or just 'message' for plain text lines.
+    """
+    if isinstance(raw_message, str):
+        if not raw_message.lstrip().startswith('{'):
+            return {'message': raw_message}
+        try:
+            raw_message = loads(raw_message)
+        except ValueError as e:
+            print(f"Error parsing message: {e}")
+            return {'message': str(raw_message)}
+
+    if not isinstance(raw_message, dict):
+        return {'message': str(raw_message)}
+
+    inner_message = raw_message.get('message', '')
+    if not isinstance(inner_message, str):
+        inner_message = str(inner_message)
+    if len(inner_message) > PAYLOAD_CACHE_MAX_CHARS:
+        return _parse_text(inner_message)
+    return dict(_parse_text_cached(inner_message))
+
+
+def get_cache_stats():
+    """Hit/miss counters of the payload cache"""
+    info = _parse_text_cached.cache_info()
+    return {
+        'backend': 'orjson' if ORJSON_AVAILABLE else 'json',
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'max_text_chars': PAYLOAD_CACHE_MAX_CHARS
+    }
@@ -1,263 +1,605 @@
 import requests
-from config import ZABBIX_URL, ZABBIX_TOKEN
+from requests.adapters import HTTPAdapter
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import (
+    ZABBIX_URL, ZABBIX_TOKEN, ZABBIX_INCREMENTAL_POLLING, ZABBIX_FULL_RESYNC_INTERVAL, ZABBIX_HISTORY_OVERLAP,
+    ZABBIX_SHARD_SIZE, ZABBIX_SHARD_BY, ZABBIX_POLL_WORKERS
+)
 from collections import defaultdict
 from datetime import datetime
-from ..core.database import log_system_event, archive_metrics, archive_host_status
+from ..core.database import log_system_event, archive_poll_results
+from .zabbix_state import alert_state_tracker
+from .zabbix_metrics import metric_registry
+from ..utils.metric_format import format_metrics
 
-def get_hosts():
-    headers = {
-        "Content-Type": "application/json"
+
+class ZabbixAPIError(Exception):
+    """Raised when the Zabbix API returns an HTTP or JSON-RPC error"""
+
+
+class ZabbixClient:
+    """
+    JSON-RPC client for Zabbix with a keep-alive connection pool.
+
+    All calls share one requests.Session, so the TCP/TLS handshake is paid
+    once per pooled connection instead of once per query. batch() sends
+    several methods in a single HTTP exchange. Per-method latency is
+    collected and available through get_stats().
+    """
+
+    def __init__(self, url=ZABBIX_URL, token=ZABBIX_TOKEN, pool_size=10, timeout=60):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.session.verify = False
+        self._ids = itertools.count(1)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _payload(self, method, params):
+        return {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "auth": self.token,
+            "id": next(self._ids)
+        }
+
+    def _record(self, name, elapsed, failed=False):
+        with self._stats_lock:
+            stats = self._stats.setdefault(name, {
+                'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0
+            })
+            elapsed_ms = elapsed * 1000
+            stats['calls'] += 1
+            stats['errors'] += 1 if failed else 0
+            stats['total_ms'] += elapsed_ms
+            stats['last_ms'] = elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def _post(self, payload, stats_name):
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            if response.status_code != 200:
+                raise ZabbixAPIError(f"HTTP {response.status_code} from Zabbix API")
+            data = response.json()
+            failed = False
+            return data
+        finally:
+            self._record(stats_name, time.perf_counter() - start, failed)
+
+    @staticmethod
+    def _unwrap(data):
+        if not isinstance(data, dict):
+            raise ZabbixAPIError("Unexpected response from Zabbix API")
+        if 'error' in data:
+            error = data['error']
+            raise ZabbixAPIError(f"{error.get('message', 'Error')}: {error.get('data', '')}")
+        if 'result' not in data:
+            raise ZabbixAPIError("No data received")
+        return data['result']
+
+    def call(self, method, params):
+        """Call a single API method and return its result"""
+        return self._unwrap(self._post(self._payload(method, params), method))
+
+    def batch(self, calls):
+        """
+        Send several (method, params) calls as one JSON-RPC batch request.
+
+        Results are returned in the order of calls. A failed call is
+        returned as a ZabbixAPIError instance instead of raising, so one
+        bad method does not discard the others.
+        """
+        payloads = [self._payload(method, params) for method, params in calls]
+        stats_name = 'batch[' + ','.join(method for method, _ in calls) + ']'
+        data = self._post(payloads, stats_name)
+
+        if isinstance(data, dict):
+            # Serwer odrzucił cały batch (np. błąd autoryzacji)
+            error = ZabbixAPIError(str(data.get('error', 'Invalid batch response')))
+            return [error for _ in calls]
+
+        by_id = {item.get('id'): item for item in data if isinstance(item, dict)}
+        results = []
+        for payload in payloads:
+            try:
+                results.append(self._unwrap(by_id.get(payload['id'])))
+            except ZabbixAPIError as e:
+                results.append(e)
+        return results
+
+    def get_stats(self):
+        """Return per-method latency statistics"""
+        with self._stats_lock:
+            return {
+                name: {
+                    **stats,
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 2) if stats['calls'] else 0.0,
+                    'total_ms': round(stats['total_ms'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'last_ms': round(stats['last_ms'], 2)
+                }
+                for name, stats in self._stats.items()
+            }
+
+
+# Wspólny klient (jedna pula połączeń na proces)
+zabbix_client = ZabbixClient()
+
+HOSTS_QUERY = {
+    "output": ["hostid", "name", "status"],
+    "selectInterfaces": ["ip", "type", "available"],
+    "selectHostGroups": ["name"],
+    "selectItems": ["itemid", "name", "key_", "lastvalue", "lastclock", "units", "value_type"],
+    "filter": {
+        "status": 0
+    },
+    "selectTriggers": ["triggerid", "description", "status", "state", "lastchange", "priority"],
+}
+
+# Poll przyrostowy: hosty bez itemów, wartości itemów z history.get
+HOSTS_STATE_QUERY = {key: value for key, value in HOSTS_QUERY.items() if key != "selectItems"}
+
+# Typy wartości itemów: 0 - float, 3 - unsigned (tylko te trafiają do metryk)
+NUMERIC_VALUE_TYPES = (0, 3)
+
+ALERTS_QUERY = {
+    "output": [
+        "triggerid", "description", "status", "state",
+        "lastchange", "priority", "value"
+    ],
+    "selectHosts": ["hostid", "name"],
+    "filter": {
+        "status": 0,  # Enabled triggers
+        "state": 1    # Problem state
+    },
+    "sortfield": ["lastchange"],
+    "sortorder": "DESC",
+    "limit": 100
+}
+
+
+def history_query(value_type, time_from, itemids):
+    """history.get parameters for values of the given items collected since time_from"""
+    return {
+        "output": ["itemid", "clock", "value"],
+        "history": value_type,
+        "itemids": itemids,
+        "time_from": time_from,
+        "sortfield": "clock",
+        "sortorder": "ASC"
+    }
+
+
+class ItemDeltaCache:
+    """
+    Last known item values per host, used for incremental polling.
+
+    A full poll loads every item with host.get(selectItems). Incremental
+    polls fetch hosts without items plus the history values collected since
+    the newest clock seen so far, and merge them into the cached items, so
+    the payload scales with the number of changed values instead of the
+    fleet size. Metrics are recomputed only for hosts with changed items.
+
+    History is queried only for items the metric registry classifies, from
+    the newest clock minus history_overlap seconds, so values that arrive a
+    little late (e.g. through a proxy) with an older clock are still picked
+    up; records are applied per item only when newer than that item's own
+    lastclock, so the overlap never re-applies a value. Values later than
+    the overlap are picked up by the periodic full resync.
+
+    New hosts force a full poll right away; new items and items that keep
+    no history are picked up by the periodic full resync.
+    """
+
+    def __init__(self, full_resync_interval=ZABBIX_FULL_RESYNC_INTERVAL, history_overlap=ZABBIX_HISTORY_OVERLAP):
+        self.full_resync_interval = full_resync_interval
+        self.history_overlap = history_overlap
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._items = {}        # hostid -> {itemid: item}
+            self._item_hosts = {}   # itemid -> hostid
+            self._tracked = {}      # value_type -> itemids itemów klasyfikowanych jako metryki
+            self._metrics = {}      # hostid -> metric_values z ostatniego przeliczenia
+            self._lastclock = 0
+            self._last_full = 0.0
+            self._stats = {
+                'full_polls': 0,
+                'incremental_polls': 0,
+                'last_mode': None,
+                'last_history_records': 0,
+                'last_changed_items': 0,
+                'last_changed_hosts': 0
+            }
+
+    def needs_full(self):
+        with self._lock:
+            return not self._items or time.time() - self._last_full >= self.full_resync_interval
+
+    def time_from(self):
+        return max(0, self._lastclock - self.history_overlap)
+
+    def tracked_itemids(self):
+        """{value_type: itemids} of numeric items that feed metrics"""
+        with self._lock:
+            return {value_type: list(itemids) for value_type, itemids in self._tracked.items()}
+
+    def load_full(self, hosts):
+        """Replace the cache with the items of a full host.get result"""
+        with self._lock:
+            self._items = {}
+            self._item_hosts = {}
+            self._tracked = defaultdict(list)
+            self._metrics = {}
+            lastclock = 0
+            for host in hosts:
+                items = {}
+                for item in host.get('items', []):
+                    if 'itemid' not in item:
+                        continue
+                    items[item['itemid']] = item
+                    self._item_hosts[item['itemid']] = host['hostid']
+                    lastclock = max(lastclock, int(item.get('lastclock') or 0))
+                    value_type = int(item.get('value_type', -1))
+                    # Tylko itemy liczbowe, z których powstają metryki - reszta nie trafia do history.get
+                    if value_type in NUMERIC_VALUE_TYPES and metric_registry.classify(item.get('key_', '')):
+                        self._tracked[value_type].append(item['itemid'])
+                self._items[host['hostid']] = items
+            self._lastclock = lastclock
+            self._last_full = time.time()
+            self._stats['full_polls'] += 1
+            self._stats['last_mode'] = 'full'
+            self._stats['last_history_records'] = 0
+            self._stats['last_changed_items'] = sum(len(items) for items in self._items.values())
+            self._stats['last_changed_hosts'] = len(self._items)
+
+    def merge(self, hosts, history):
+        """
+        Apply history.get records and attach cached items to hosts.
+
+        Hosts without changes get their previous metric_values, so
+        process_hosts() skips classifying their items. Returns False when
+        a host is not in the cache and a full poll is needed.
+        """
+        with self._lock:
+            if any(host['hostid'] not in self._items for host in hosts):
+                return False
+
+            changed_items = set()
+            changed_hosts = set()
+            record_count = 0
+            for records in history:
+                record_count += len(records)
+                for record in records:
+                    itemid = record['itemid']
+                    hostid = self._item_hosts.get(itemid)
+                    if hostid is None:
+                        # Item dodany po ostatniej pełnej synchronizacji
+                        continue
+                    clock = int(record['clock'])
+                    self._lastclock = max(self._lastclock, clock)
+                    item = self._items[hostid][itemid]
+                    lastclock = int(item.get('lastclock') or 0)
+                    # time_from jest włącznie - wartość z tej samej sekundy mogła już zostać zastosowana
+                    if clock < lastclock or (clock == lastclock and record['value'] == item.get('lastvalue')):
+                        continue
+                    # Nowy słownik zamiast modyfikacji - opublikowane snapshoty pozostają niezmienione
+                    self._items[hostid][itemid] = {**item, 'lastvalue': record['value'], 'lastclock': record['clock']}
+                    changed_items.add(itemid)
+                    changed_hosts.add(hostid)
+
+            for host in hosts:
+                hostid = host['hostid']
+                host['items'] = list(self._items[hostid].values())
+                if hostid not in changed_hosts and hostid in self._metrics:
+                    host['metric_values'] = self._metrics[hostid]
+
+            self._stats['incremental_polls'] += 1
+            self._stats['last_mode'] = 'incremental'
+            self._stats['last_history_records'] = record_count
+            self._stats['last_changed_items'] = len(changed_items)
+            self._stats['last_changed_hosts'] = len(changed_hosts)
+            return True
+
+    def remember_metrics(self, hosts):
+        with self._lock:
+            for host in hosts:
+                if 'metric_values' in host:
+                    self._metrics[host['hostid']] = host['metric_values']
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'hosts': len(self._items),
+                'items': len(self._item_hosts),
+                'tracked_items': sum(len(itemids) for itemids in self._tracked.values()),
+                'lastclock': self._lastclock,
+                'full_resync_interval': self.full_resync_interval
+            }
+
+
+# Wspólny cache itemów dla pollingu przyrostowego
+item_cache = ItemDeltaCache()
+
+
+def prepare_hosts(hosts):
+    """Compute availability, metrics and grouped alerts for host.get results"""
+    # Przetwarzamy dane dla każdego hosta
+    for host in hosts:
+        # Status dostępności
+        interface = next((i for i in host.get('interfaces', []) if i['type'] == '1'), None)
+        if interface:
+            host['availability'] = 'Available' if interface['available'] == '1' else 'Unavailable'
+        else:
+            host['availability'] = 'unknown'
+
+        # Surowe wartości liczbowe z jednostką - formatowanie dopiero przy wyświetlaniu.
+        # Klasyfikacja itemów przez rejestr reguł (osobne serie dla systemów plików i interfejsów).
+        # W pollu przyrostowym hosty bez zmian mają już metric_values z cache
+        metric_values = host.get('metric_values')
+        if metric_values is None:
+            metric_values = metric_registry.collect(host.get('items', []))
+
+        host['metric_values'] = metric_values
+        host['metrics'] = format_metrics(metric_values)
+
+        # Sprawdzanie triggerów (alertów)
+        active_triggers = [t for t in host.get('triggers', [])
+                        if t['status'] == '0' and t['state'] == '1']
+
+        # Grupowanie alertów
+        alert_groups = defaultdict(list)
+        for trigger in active_triggers:
+            alert_groups[trigger['description']].append(int(trigger['lastchange']))
+
+        # Formatowanie zgrupowanych alertów
+        host['alerts'] = [{
+            'description': desc,
+            'count': len(timestamps),
+            'last_occurrence': datetime.fromtimestamp(max(timestamps)).strftime('%Y-%m-%d %H:%M:%S')
+        } for desc, timestamps in alert_groups.items()]
+
+    return hosts
+
+def process_hosts(hosts, prepared=False):
+    """
+    Prepare host.get results and record the poll.
+
+    Problem state and archiving need the whole fleet, so they run once per
+    poll; sharded polls prepare each shard as it arrives and pass
+    prepared=True.
+    """
+    if not prepared:
+        prepare_hosts(hosts)
+
+    # Do system_logs trafiają tylko otwarcia i zamknięcia problemów
+    try:
+        alert_state_tracker.process_poll(hosts)
+    except Exception as e:
+        print(f"Error tracking Zabbix problem state: {e}")
+
+    # Archiwizuj cały poll jedną transakcją (hosty bez hostid/name są pomijane)
+    try:
+        archive_poll_results(hosts)
+    except Exception as e:
+        print(f"Error archiving Zabbix poll: {e}")
+        log_system_event('zabbix', 'error', 'system', f"Error archiving poll: {str(e)}")
+
+    return hosts
+
+def unknown_hosts_from(hosts):
+    """Pick hosts whose agent interface has unknown availability"""
+    unknown_hosts = []
+    for host in hosts:
+        interface = next((i for i in host.get('interfaces', []) if i['type'] == '1'), None)
+        if interface and interface['available'] == '2':  # '2' usually means unknown status
+            unknown_hosts.append({
+                'hostid': host['hostid'],
+                'name': host['name']
+            })
+    return unknown_hosts
+
+def format_alerts(triggers):
+    """Format trigger.get results for the alerts views"""
+    # Get priority level
+    priority_map = {
+        '0': 'not_classified',
+        '1': 'information',
+        '2': 'warning',
+        '3': 'average',
+        '4': 'high',
+        '5': 'disaster'
     }
-    
+
+    alerts = []
+    for trigger in triggers:
+        priority_level = priority_map.get(trigger.get('priority', '0'), 'not_classified')
+
+        # Format last change time
+        last_change = trigger.get('lastchange', '0')
+        if last_change != '0':
+            last_change_dt = datetime.fromtimestamp(int(last_change))
+            formatted_time = last_change_dt.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            formatted_time = 'Unknown'
+
+        # Get host information
+        host_name = 'Unknown Host'
+        if trigger.get('hosts') and len(trigger['hosts']) > 0:
+            host_name = trigger['hosts'][0]['name']
+
+        alerts.append({
+            'triggerid': trigger['triggerid'],
+            'description': trigger['description'],
+            'priority': priority_level,
+            'priority_num': trigger.get('priority', '0'),
+            'host_name': host_name,
+            'last_change': formatted_time,
+            'last_change_timestamp': last_change,
+            'status': trigger.get('status', '0'),
+            'state': trigger.get('state', '0'),
+            'value': trigger.get('value', '0')
+        })
+
+    return alerts
+
+def get_hosts():
     try:
         # Pobieramy hosty wraz z ich metrykami
-        response = requests.post(
-            ZABBIX_URL,
-            headers=headers,
-            json={
-                "jsonrpc": "2.0",
-                "method": "host.get",
-                "params": {
-                    "output": ["hostid", "name", "status"],
-                    "selectInterfaces": ["ip", "type", "available"],
-                    "selectItems": ["name", "key_", "lastvalue", "units"],
-                    "filter": {
-                        "status": 0
-                    },
-                    "selectTriggers": ["description", "status", "state", "lastchange"],
-                },
-                "auth": ZABBIX_TOKEN,
-                "id": 1
-            },
-            verify=False
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'result' in data:
-                # Przetwarzamy dane dla każdego hosta
-                for host in data['result']:
-                    metrics = {
-                        'cpu': 'Brak danych',
-                        'memory': 'Brak danych',
-                        'disk': 'Brak danych',
-                        'network': 'Brak danych',
-                        'ping': 'Brak danych',
-                        'uptime': 'Brak danych',
-                        'last_restart': 'Brak danych'
-                    }
-                    
-                    # Status dostępności
-                    interface = next((i for i in host.get('interfaces', []) if i['type'] == '1'), None)
-                    if interface:
-                        host['availability'] = 'Available' if interface['available'] == '1' else 'Unavailable'
-                    else:
-                        host['availability'] = 'unknown'
-                    
-                    # Przetwarzanie itemów
-                    for item in host.get('items', []):
-                        key = item.get('key_', '')
-                        value = item.get('lastvalue', '')
-                        
-                        if 'system.cpu.util' in key:
-                            metrics['cpu'] = f"{float(value):.2f}%"
-                        elif 'vm.memory.size[total]' in key:
-                            metrics['memory'] = f"{float(value)/1024/1024/1024:.2f} GB"
-                        elif 'vfs.fs.size' in key and 'total' in key:
-                            metrics['disk'] = f"{float(value)/1024/1024/1024:.2f} GB"
-                        elif 'net.if.in' in key or 'net.if.out' in key:
-                            metrics['network'] = f"{float(value)/1024/1024:.2f} MB/s"
-                        elif 'icmpping' in key:
-                            # Dodano obsługę polskiej wersji
-                            metrics['ping'] = 'OK' if value == '1' else 'Failed'
-                        elif 'system.uptime' in key:
-                            uptime_seconds = float(value)
-                            # Format liczby z przecinkiem zamiast kropki dla Polski i "dni" zamiast "days"
-                            uptime_days = uptime_seconds/86400
-                            metrics['uptime'] = f"{uptime_days:.1f}".replace('.', ',') + " dni"
-                    
-                    # Dodanie metryk do hosta
-                    host['metrics'] = metrics
-                    
-                    # Sprawdzanie triggerów (alertów)
-                    active_triggers = [t for t in host.get('triggers', []) 
-                                    if t['status'] == '0' and t['state'] == '1']
-                    
-                    # Grupowanie alertów
-                    alert_groups = defaultdict(list)
-                    for trigger in active_triggers:
-                        alert_groups[trigger['description']].append(int(trigger['lastchange']))
-                    
-                    # Formatowanie zgrupowanych alertów
-                    host['alerts'] = [{
-                        'description': desc,
-                        'count': len(timestamps),
-                        'last_occurrence': datetime.fromtimestamp(max(timestamps)).strftime('%Y-%m-%d %H:%M:%S')
-                    } for desc, timestamps in alert_groups.items()]
-                    
-                    # Log alerts to system_logs
-                    if 'alerts' in host:
-                        for alert in host['alerts']:
-                            severity = 'critical' if 'critical' in alert['description'].lower() else 'warning'
-                            log_system_event(
-                                source='zabbix',
-                                severity=severity,
-                                host_name=host['name'],
-                                message=alert['description']
-                            )
-                    
-                    # Log status changes
-                    if host.get('availability') == 'Unavailable':
-                        log_system_event(
-                            source='zabbix',
-                            severity='error',
-                            host_name=host['name'],
-                            message=f"Host became unavailable"
-                        )
-                    
-                    # Archiwizuj tylko jeśli mamy podstawowe dane
-                    if 'hostid' in host and 'name' in host:
-                        if 'metrics' in host:
-                            archive_metrics(host['hostid'], host['metrics'])
-                        archive_host_status(host)
-                    
-                return data
-            
-        return {"result": [], "error": "No data received"}
-        
+        hosts = zabbix_client.call("host.get", HOSTS_QUERY)
+        return {"result": process_hosts(hosts)}
+
+    except ZabbixAPIError as e:
+        print(f"Zabbix API error: {e}")
+        return {"result": [], "error": str(e)}
     except Exception as e:
         print(f"Request error: {e}")
         log_system_event('zabbix', 'error', 'system', f"Error fetching hosts: {str(e)}")
         return {"error": str(e)}
 
+def shard_queries():
+    """Split the full host.get into per-shard queries (by hostid ranges or host group)"""
+    if ZABBIX_SHARD_BY == 'group':
+        groups = zabbix_client.call("hostgroup.get", {"output": ["groupid"], "monitored_hosts": True})
+        return [{**HOSTS_QUERY, "groupids": [group['groupid']]} for group in groups]
+
+    hosts = zabbix_client.call("host.get", {"output": ["hostid"], "filter": {"status": 0}})
+    hostids = sorted((host['hostid'] for host in hosts), key=int)
+    return [{**HOSTS_QUERY, "hostids": hostids[i:i + ZABBIX_SHARD_SIZE]}
+            for i in range(0, len(hostids), ZABBIX_SHARD_SIZE)]
+
+def fetch_hosts_sharded(workers=ZABBIX_POLL_WORKERS):
+    """
+    Fetch hosts shard by shard through a worker pool, together with trigger.get.
+
+    Each shard is a separate, smaller JSON document that is parsed on its
+    worker thread and prepared as soon as it arrives. A failed shard fails
+    the whole poll - a partial fleet would close problems of missing hosts.
+    Returns (prepared hosts in shard order, triggers).
+    """
+    queries = shard_queries()
+    shards = [None] * len(queries)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        triggers_future = executor.submit(zabbix_client.call, "trigger.get", ALERTS_QUERY)
+        futures = {executor.submit(zabbix_client.call, "host.get", query): index
+                   for index, query in enumerate(queries)}
+        for future in as_completed(futures):
+            shards[futures[future]] = prepare_hosts(future.result())
+
+        try:
+            triggers = triggers_future.result()
+        except ZabbixAPIError as e:
+            triggers = e
+
+    # Host może należeć do kilku grup - zostawiamy pierwsze wystąpienie
+    hosts = []
+    seen = set()
+    for shard in shards:
+        for host in shard:
+            if host['hostid'] not in seen:
+                seen.add(host['hostid'])
+                hosts.append(host)
+    return hosts, triggers
+
+def get_dashboard_data(incremental=ZABBIX_INCREMENTAL_POLLING):
+    """
+    Fetch hosts and active alerts in a single JSON-RPC batch.
+
+    Unknown hosts are derived from the same host.get result, so the
+    dashboard needs one HTTP exchange with Zabbix per refresh. In
+    incremental mode only item values changed since the previous poll are
+    fetched (see ItemDeltaCache), with a periodic full resync. With
+    ZABBIX_SHARD_SIZE (or ZABBIX_SHARD_BY=group) full polls are split into
+    shards fetched in parallel (see fetch_hosts_sharded).
+    """
+    full = not incremental or item_cache.needs_full()
+    sharded = full and (ZABBIX_SHARD_SIZE > 0 or ZABBIX_SHARD_BY == 'group')
+    try:
+        if sharded:
+            hosts, triggers = fetch_hosts_sharded()
+            history = None
+        elif full:
+            hosts, triggers = zabbix_client.batch([
+                ("host.get", HOSTS_QUERY),
+                ("trigger.get", ALERTS_QUERY)
+            ])
+            history = None
+        else:
+            time_from = item_cache.time_from()
+            tracked = item_cache.tracked_itemids()
+            hosts, triggers, *history = zabbix_client.batch([
+                ("host.get", HOSTS_STATE_QUERY),
+                ("trigger.get", ALERTS_QUERY),
+                *[("history.get", history_query(value_type, time_from, tracked[value_type]))
+                  for value_type in NUMERIC_VALUE_TYPES if tracked.get(value_type)]
+            ])
+    except Exception as e:
+        print(f"Request error: {e}")
+        log_system_event('zabbix', 'error', 'system', f"Error fetching dashboard data: {str(e)}")
+        return {'hosts': {"error": str(e)}, 'unknown': [], 'alerts': []}
+
+    if isinstance(hosts, ZabbixAPIError):
+        print(f"Zabbix API error: {hosts}")
+        hosts_data = {"result": [], "error": str(hosts)}
+        unknown = []
+    else:
+        if history is None:
+            item_cache.load_full(hosts)
+        else:
+            failed = next((result for result in history if isinstance(result, ZabbixAPIError)), None)
+            if failed is not None or not item_cache.merge(hosts, history):
+                print(f"Incremental Zabbix poll not possible ({failed or 'new hosts'}), running full poll")
+                return get_dashboard_data(incremental=False)
+        hosts_data = {"result": process_hosts(hosts, prepared=sharded)}
+        item_cache.remember_metrics(hosts)
+        unknown = unknown_hosts_from(hosts)
+
+    if isinstance(triggers, ZabbixAPIError):
+        print(f"Error getting Zabbix alerts: {triggers}")
+        alerts = []
+    else:
+        alerts = format_alerts(triggers)
+
+    return {'hosts': hosts_data, 'unknown': unknown, 'alerts': alerts}
+
 def get_unknown_hosts():
     """Get list of hosts with unknown status"""
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
     try:
-        response = requests.post(
-            ZABBIX_URL,
-            headers=headers,
-            json={
-                "jsonrpc": "2.0",
-                "method": "host.get",
-                "params": {
-                    "output": ["hostid", "name", "status"],
-                    "selectInterfaces": ["ip", "type", "available"],
-                    "filter": {
-                        "status": 0
-                    }
-                },
-                "auth": ZABBIX_TOKEN,
-                "id": 1
-            },
-            verify=False
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'result' in data:
-                unknown_hosts = []
-                for host in data['result']:
-                    interface = next((i for i in host.get('interfaces', []) if i['type'] == '1'), None)
-                    if interface and interface['available'] == '2':  # '2' usually means unknown status
-                        unknown_hosts.append({
-                            'hostid': host['hostid'],
-                            'name': host['name']
-                        })
-                return unknown_hosts
-                
-        return []
-        
-    except requests.exceptions.RequestException as e:
+        hosts = zabbix_client.call("host.get", {
+            "output": ["hostid", "name", "status"],
+            "selectInterfaces": ["ip", "type", "available"],
+            "filter": {
+                "status": 0
+            }
+        })
+        return unknown_hosts_from(hosts)
+
+    except (requests.exceptions.RequestException, ZabbixAPIError) as e:
         print(f"Error getting unknown hosts: {e}")
         return []
 
 def get_zabbix_alerts():
     """Get active alerts/triggers from Zabbix"""
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
     try:
-        response = requests.post(
-            ZABBIX_URL,
-            headers=headers,
-            json={
-                "jsonrpc": "2.0",
-                "method": "trigger.get",
-                "params": {
-                    "output": [
-                        "triggerid", "description", "status", "state", 
-                        "lastchange", "priority", "value"
-                    ],
-                    "selectHosts": ["hostid", "name"],
-                    "filter": {
-                        "status": 0,  # Enabled triggers
-                        "state": 1    # Problem state
-                    },
-                    "sortfield": ["lastchange"],
-                    "sortorder": "DESC",
-                    "limit": 100
-                },
-                "auth": ZABBIX_TOKEN,
-                "id": 1
-            },
-            verify=False
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'result' in data:
-                alerts = []
-                for trigger in data['result']:
-                    # Get priority level
-                    priority_map = {
-                        '0': 'not_classified',
-                        '1': 'information',
-                        '2': 'warning',
-                        '3': 'average',
-                        '4': 'high',
-                        '5': 'disaster'
-                    }
-                    
-                    priority_level = priority_map.get(trigger.get('priority', '0'), 'not_classified')
-                    
-                    # Format last change time
-                    last_change = trigger.get('lastchange', '0')
-                    if last_change != '0':
-                        last_change_dt = datetime.fromtimestamp(int(last_change))
-                        formatted_time = last_change_dt.strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        formatted_time = 'Unknown'
-                    
-                    # Get host information
-                    host_name = 'Unknown Host'
-                    if trigger.get('hosts') and len(trigger['hosts']) > 0:
-                        host_name = trigger['hosts'][0]['name']
-                    
-                    alert = {
-                        'triggerid': trigger['triggerid'],
-                        'description': trigger['description'],
-                        'priority': priority_level,
-                        'priority_num': trigger.get('priority', '0'),
-                        'host_name': host_name,
-                        'last_change': formatted_time,
-                        'last_change_timestamp': last_change,
-                        'status': trigger.get('status', '0'),
-                        'state': trigger.get('state', '0'),
-                        'value': trigger.get('value', '0')
-                    }
-                    
-                    alerts.append(alert)
-                
-                return alerts
-            
-        return []
-        
+        return format_alerts(zabbix_client.call("trigger.get", ALERTS_QUERY))
+
     except Exception as e:
         print(f"Error getting Zabbix alerts: {e}")
         log_system_event('zabbix', 'error', 'system', f"Error fetching alerts: {str(e)}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,297 @@
+"""
+Backfill of performance_metrics from Zabbix history and trends.
+
+Fills holes left by poller downtime (or a fresh install) by importing
+history.get / trend.get data for a set of hosts and a time range. The
+range is split into per-host chunks that are fetched in parallel with a
+bounded number of requests in flight; rows are written in bulk by a single
+writer together with a checkpoint, so an interrupted run can be resumed
+and only the missing chunks are fetched again.
+
+Chunks lie on a fixed grid of chunk_hours (counted from 1970-01-01), so
+runs with a different --from or a later --to reuse the same checkpoints.
+Buckets that already have a row for the metric (from an earlier run or
+from the live poller) are not written again.
+
+Values are classified with the same metric registry as the live poller,
+so backfilled rows use the same metric types, units and aggregates.
+
+Usage:
+    python -m modules.external.zabbix_backfill --from "2024-05-01 00:00" --to "2024-05-08 00:00"
+    python -m modules.external.zabbix_backfill --hosts 10084,10105 --source trends --workers 8
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from config import ZABBIX_BACKFILL_WORKERS, ZABBIX_BACKFILL_CHUNK_HOURS
+from ..core.database import get_db_cursor
+from .zabbix import zabbix_client, ZabbixAPIError, NUMERIC_VALUE_TYPES
+from .zabbix_metrics import metric_registry
+
+# Rozdzielczość zapisu: ostatnia wartość itemu w kubełku (trendy są godzinowe)
+BUCKET_SECONDS = {'history': 60, 'trends': 3600}
+
+# Początek siatki chunków - granice nie zależą od zakresu podanego przy uruchomieniu
+GRID_EPOCH = datetime(1970, 1, 1)
+
+
+def setup_backfill_table():
+    """Create zabbix_backfill_checkpoint table if not exists"""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS zabbix_backfill_checkpoint (
+                host_id VARCHAR(64) NOT NULL,
+                source VARCHAR(16) NOT NULL,
+                chunk_start DATETIME NOT NULL,
+                chunk_end DATETIME NOT NULL,
+                row_count INT NOT NULL DEFAULT 0,
+                completed_at DATETIME NOT NULL,
+                PRIMARY KEY (host_id, source, chunk_start)
+            )
+        """)
+
+
+def bucket_start(timestamp, bucket_seconds):
+    """Start of the bucket a timestamp falls into (as written by build_rows)"""
+    clock = int(timestamp.timestamp())
+    return datetime.fromtimestamp(clock - clock % bucket_seconds)
+
+
+def split_range(start, end, chunk):
+    """Split [start, end) into chunks on the fixed grid; the first one starts at or before start"""
+    current = GRID_EPOCH + (start - GRID_EPOCH) // chunk * chunk
+    while current < end:
+        chunk_end = min(current + chunk, end)
+        yield current, chunk_end
+        current = chunk_end
+
+
+class ZabbixBackfill:
+    def __init__(self, client=zabbix_client, registry=metric_registry, workers=ZABBIX_BACKFILL_WORKERS,
+                 chunk_hours=ZABBIX_BACKFILL_CHUNK_HOURS, batch_size=1000):
+        self.client = client
+        self.registry = registry
+        self.workers = max(1, workers)
+        self.chunk = timedelta(hours=chunk_hours)
+        self.batch_size = batch_size
+
+    def load_items(self, host_ids=None):
+        """Return {hostid: [item, ...]} for numeric items the registry classifies"""
+        params = {
+            "output": ["itemid", "hostid", "key_", "units", "value_type"],
+            "filter": {"value_type": list(NUMERIC_VALUE_TYPES)},
+            "monitored": True
+        }
+        if host_ids:
+            params["hostids"] = list(host_ids)
+
+        items_by_host = {}
+        for item in self.client.call("item.get", params):
+            if self.registry.classify(item['key_']) is None:
+                continue
+            items_by_host.setdefault(item['hostid'], []).append(item)
+        return items_by_host
+
+    def completed_chunks(self, host_ids, source):
+        """Return {(host_id, chunk_start): chunk_end} of checkpointed chunks"""
+        if not host_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(host_ids))
+        with get_db_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT host_id, chunk_start, chunk_end
+                FROM zabbix_backfill_checkpoint
+                WHERE source = %s AND host_id IN ({placeholders})
+            """, (source, *host_ids))
+            return {(row['host_id'], row['chunk_start']): row['chunk_end'] for row in cursor.fetchall()}
+
+    def fetch_chunk(self, host_id, items, start, end, source):
+        """Fetch one host/time chunk and return (itemid, clock, value) records"""
+        time_from = int(start.timestamp())
+        # time_till jest włącznie - kolejny chunk zaczyna się od end
+        time_till = int(end.timestamp()) - 1
+
+        if source == 'trends':
+            calls = [("trend.get", {
+                "output": ["itemid", "clock", "value_avg"],
+                "itemids": [item['itemid'] for item in items],
+                "time_from": time_from,
+                "time_till": time_till
+            })]
+        else:
+            calls = []
+            for value_type in NUMERIC_VALUE_TYPES:
+                itemids = [item['itemid'] for item in items if str(item['value_type']) == str(value_type)]
+                if itemids:
+                    calls.append(("history.get", {
+                        "output": ["itemid", "clock", "value"],
+                        "history": value_type,
+                        "itemids": itemids,
+                        "time_from": time_from,
+                        "time_till": time_till,
+                        "sortfield": "clock",
+                        "sortorder": "ASC"
+                    }))
+
+        records = []
+        for result in self.client.batch(calls):
+            if isinstance(result, ZabbixAPIError):
+                raise result
+            for record in result:
+                value = record['value_avg'] if source == 'trends' else record['value']
+                records.append((record['itemid'], int(record['clock']), value))
+        return records
+
+    def build_rows(self, host_id, items, records, source):
+        """
+        Turn raw records into performance_metrics rows.
+
+        Records are grouped into buckets and each bucket is classified like
+        one poll, so aggregated families (disk, network, cpu from idle) are
+        derived the same way as by the live poller.
+        """
+        bucket_seconds = BUCKET_SECONDS[source]
+        items_by_id = {item['itemid']: item for item in items}
+        buckets = {}
+        for itemid, clock, value in records:
+            bucket = clock - clock % bucket_seconds
+            # Rekordy są posortowane po czasie - zostaje ostatnia wartość w kubełku
+            buckets.setdefault(bucket, {})[itemid] = value
+
+        details = json.dumps({'source': f'zabbix_{source}'})
+        rows = []
+        for bucket, values in sorted(buckets.items()):
+            bucket_items = [{
+                'key_': items_by_id[itemid]['key_'],
+                'lastvalue': value,
+                'units': items_by_id[itemid].get('units', '')
+            } for itemid, value in values.items() if itemid in items_by_id]
+            timestamp = datetime.fromtimestamp(bucket)
+            for metric_type, metric in self.registry.collect(bucket_items).items():
+                rows.append((host_id, metric_type, metric['value'], metric['value'],
+                             metric.get('unit'), timestamp, details))
+        return rows
+
+    def write_chunk(self, host_id, source, start, end, rows):
+        """
+        Insert a chunk's rows and its checkpoint in one transaction.
+
+        Rows whose metric already has a value in the same bucket are skipped.
+        Returns the number of inserted rows.
+        """
+        bucket_seconds = BUCKET_SECONDS[source]
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT metric_type, timestamp FROM performance_metrics
+                WHERE host_id = %s AND timestamp >= %s AND timestamp < %s
+            """, (host_id, start, end))
+            existing = {(row['metric_type'], bucket_start(row['timestamp'], bucket_seconds))
+                        for row in cursor.fetchall()}
+            new_rows = [row for row in rows if (row[1], row[5]) not in existing]
+            for i in range(0, len(new_rows), self.batch_size):
+                cursor.executemany("""
+                    INSERT INTO performance_metrics
+                    (host_id, metric_type, value, numeric_value, unit, timestamp, details)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, new_rows[i:i + self.batch_size])
+            cursor.execute("""
+                INSERT INTO zabbix_backfill_checkpoint
+                (host_id, source, chunk_start, chunk_end, row_count, completed_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                chunk_end = GREATEST(chunk_end, VALUES(chunk_end)),
+                row_count = VALUES(row_count),
+                completed_at = VALUES(completed_at)
+            """, (host_id, source, start, end, len(rows), datetime.now()))
+        return len(new_rows)
+
+    def run(self, start, end, host_ids=None, source='history'):
+        """
+        Backfill [start, end) for the given hosts (all monitored hosts if None).
+
+        Returns a summary with chunk, row and error counts.
+        """
+        if source not in BUCKET_SECONDS:
+            raise ValueError(f"Unknown backfill source: {source}")
+
+        setup_backfill_table()
+        items_by_host = self.load_items(host_ids)
+        completed = self.completed_chunks(list(items_by_host), source)
+
+        jobs = []
+        skipped = 0
+        for host_id, items in items_by_host.items():
+            for chunk_start, chunk_end in split_range(start, end, self.chunk):
+                done_until = completed.get((host_id, chunk_start))
+                if done_until is not None and done_until >= chunk_end:
+                    skipped += 1
+                    continue
+                jobs.append((host_id, items, chunk_start, chunk_end))
+
+        summary = {'hosts': len(items_by_host), 'chunks': 0, 'skipped': skipped, 'errors': 0, 'rows': 0,
+                   'existing_rows': 0}
+        print(f"Zabbix backfill ({source}): {len(jobs)} chunks for {len(items_by_host)} hosts, "
+              f"{skipped} already done, {self.workers} workers")
+        started = time.time()
+
+        # Najwyżej 2x workers chunków w locie - pamięć nie rośnie z długością zakresu
+        pending = {}
+        job_iter = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while len(pending) < self.workers * 2:
+                    job = next(job_iter, None)
+                    if job is None:
+                        break
+                    host_id, items, chunk_start, chunk_end = job
+                    future = executor.submit(self.fetch_chunk, host_id, items, chunk_start, chunk_end, source)
+                    pending[future] = job
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host_id, items, chunk_start, chunk_end = pending.pop(future)
+                    try:
+                        rows = self.build_rows(host_id, items, future.result(), source)
+                        # Zapis w jednym wątku - nie wyczerpujemy puli połączeń MySQL
+                        inserted = self.write_chunk(host_id, source, chunk_start, chunk_end, rows)
+                    except Exception as e:
+                        summary['errors'] += 1
+                        print(f"Backfill chunk {host_id} {chunk_start} - {chunk_end} failed: {e}")
+                        continue
+                    summary['chunks'] += 1
+                    summary['rows'] += inserted
+                    summary['existing_rows'] += len(rows) - inserted
+
+                elapsed = time.time() - started
+                print(f"Backfill progress: {summary['chunks'] + summary['errors']}/{len(jobs)} chunks, "
+                      f"{summary['rows']} rows, {summary['rows'] / elapsed if elapsed else 0:.0f} rows/s")
+
+        summary['duration'] = round(time.time() - started, 2)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from', dest='start', required=True, help="Start, 'YYYY-MM-DD HH:MM'")
+    parser.add_argument('--to', dest='end', help="End, 'YYYY-MM-DD HH:MM' (default: now)")
+    parser.add_argument('--hosts', help="Comma separated Zabbix host ids (default: all monitored hosts)")
+    parser.add_argument('--source', choices=sorted(BUCKET_SECONDS), default='history')
+    parser.add_argument('--workers', type=int, default=ZABBIX_BACKFILL_WORKERS)
+    parser.add_argument('--chunk-hours', type=int, default=ZABBIX_BACKFILL_CHUNK_HOURS)
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, '%Y-%m-%d %H:%M')
+    end = datetime.strptime(args.end, '%Y-%m-%d %H:%M') if args.end else datetime.now()
+    host_ids = [h.strip() for h in args.hosts.split(',') if h.strip()] if args.hosts else None
+
+    backfill = ZabbixBackfill(workers=args.workers, chunk_hours=args.chunk_hours)
+    summary = backfill.run(start, end, host_ids=host_ids, source=args.source)
+    print(f"Zabbix backfill finished: {summary}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Table-driven classifier for Zabbix item keys.
+
+Each rule maps an item key (by key name and optional parameter values, or
+by a regular expression) to a metric family. Rules are compiled once into
+a registry; classifying a key is a dict lookup and the result is memoized,
+so keys repeated across the fleet are classified only once. Rules with an
+instance parameter (filesystem, interface) keep one series per instance
+instead of collapsing them into a single value.
+
+The default rules can be replaced without code changes by pointing
+ZABBIX_METRIC_RULES at a JSON file with a list of rules in the same format.
+"""
+import json
+import re
+from collections import defaultdict
+from functools import lru_cache
+from config import ZABBIX_METRIC_RULES
+
+# key     - nazwa klucza itemu (bez parametrów)
+# pattern - alternatywnie wyrażenie regularne dopasowywane do całego klucza
+# match   - wymagane wartości parametrów {indeks: wartość}, brakujący parametr = ''
+# instance - indeks parametru wyznaczającego serię (system plików, interfejs)
+# aggregate - jak zsumować serie do wartości rodziny ('sum' lub 'max')
+DEFAULT_METRIC_RULES = [
+    {'family': 'cpu', 'key': 'system.cpu.util', 'match': {'1': ''}, 'unit': '%'},
+    {'family': 'cpu_idle', 'key': 'system.cpu.util', 'match': {'1': 'idle'}, 'unit': '%'},
+    {'family': 'memory', 'key': 'vm.memory.size', 'match': {'0': 'total'}, 'unit': 'B'},
+    {'family': 'memory_available', 'key': 'vm.memory.size', 'match': {'0': 'available'}, 'unit': 'B'},
+    {'family': 'disk', 'key': 'vfs.fs.size', 'match': {'1': 'total'}, 'instance': 0, 'unit': 'B', 'aggregate': 'sum'},
+    {'family': 'disk', 'key': 'vfs.fs.dependent.size', 'match': {'1': 'total'}, 'instance': 0, 'unit': 'B', 'aggregate': 'sum'},
+    {'family': 'disk_used', 'key': 'vfs.fs.size', 'match': {'1': 'used'}, 'instance': 0, 'unit': 'B', 'aggregate': 'sum'},
+    {'family': 'disk_used', 'key': 'vfs.fs.dependent.size', 'match': {'1': 'used'}, 'instance': 0, 'unit': 'B', 'aggregate': 'sum'},
+    # Tylko przepustowość (mode pusty lub bytes) - errors/dropped/packets to osobne liczniki
+    {'family': 'network_in', 'key': 'net.if.in', 'match': {'1': ''}, 'instance': 0, 'unit': 'bps', 'aggregate': 'sum'},
+    {'family': 'network_in', 'key': 'net.if.in', 'match': {'1': 'bytes'}, 'instance': 0, 'unit': 'bps', 'aggregate': 'sum'},
+    {'family': 'network_out', 'key': 'net.if.out', 'match': {'1': ''}, 'instance': 0, 'unit': 'bps', 'aggregate': 'sum'},
+    {'family': 'network_out', 'key': 'net.if.out', 'match': {'1': 'bytes'}, 'instance': 0, 'unit': 'bps', 'aggregate': 'sum'},
+    {'family': 'ping', 'key': 'icmpping', 'unit': ''},
+    {'family': 'ping_loss', 'key': 'icmppingloss', 'unit': '%'},
+    {'family': 'ping_latency', 'key': 'icmppingsec', 'unit': 's'},
+    {'family': 'uptime', 'key': 'system.uptime', 'unit': 's'},
+    {'family': 'uptime', 'pattern': r'^(system\.hw\.uptime|system\.net\.uptime)\b', 'unit': 's'},
+]
+
+
+def parse_item_key(key):
+    """
+    Split a Zabbix item key into its name and parameter list.
+
+    'vfs.fs.size["C:",total]' -> ('vfs.fs.size', ['C:', 'total'])
+    """
+    bracket = key.find('[')
+    if bracket == -1 or not key.endswith(']'):
+        return key, []
+
+    name = key[:bracket]
+    params = []
+    current = []
+    quoted = False
+    depth = 0
+    for char in key[bracket + 1:-1]:
+        if quoted:
+            if char == '"':
+                quoted = False
+            else:
+                current.append(char)
+        elif char == '"':
+            quoted = True
+        elif char == '[':
+            depth += 1
+            current.append(char)
+        elif char == ']':
+            depth -= 1
+            current.append(char)
+        elif char == ',' and depth == 0:
+            params.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    params.append(''.join(current).strip())
+    return name, params
+
+
+class MetricKeyRegistry:
+    def __init__(self, rules):
+        self.rules = []
+        self._by_key = defaultdict(list)
+        pattern_parts = []
+
+        for index, rule in enumerate(rules):
+            compiled = {
+                'family': rule['family'],
+                'unit': rule.get('unit', ''),
+                'instance': rule.get('instance'),
+                'aggregate': rule.get('aggregate'),
+                'match': {int(position): value for position, value in rule.get('match', {}).items()}
+            }
+            self.rules.append(compiled)
+            if 'key' in rule:
+                self._by_key[rule['key']].append(compiled)
+            elif 'pattern' in rule:
+                pattern_parts.append(f"(?P<r{index}>{rule['pattern']})")
+
+        # Wszystkie reguły regex w jednym wyrażeniu - jedno przejście zamiast pętli po regułach
+        self._pattern = re.compile('|'.join(pattern_parts)) if pattern_parts else None
+        self.classify = lru_cache(maxsize=65536)(self._classify)
+
+    def _classify(self, key):
+        """
+        Return (family, series, unit, aggregate) for an item key, or None.
+
+        series is 'family[instance]' for instance rules and the family
+        otherwise; aggregate is None for series that are not aggregated.
+        """
+        name, params = parse_item_key(key)
+
+        for rule in self._by_key.get(name, ()):
+            if all((params[position] if position < len(params) else '') == value
+                   for position, value in rule['match'].items()):
+                instance = None
+                if rule['instance'] is not None and rule['instance'] < len(params):
+                    instance = params[rule['instance']] or None
+                if instance is None:
+                    return rule['family'], rule['family'], rule['unit'], None
+                return rule['family'], f"{rule['family']}[{instance}]", rule['unit'], rule['aggregate']
+
+        if self._pattern is not None:
+            match = self._pattern.match(key)
+            if match:
+                rule = self.rules[int(match.lastgroup[1:])]
+                return rule['family'], rule['family'], rule['unit'], None
+        return None
+
+    def collect(self, items):
+        """
+        Build {metric: {'value': float, 'unit': str}} for a host's items.
+
+        Instance rules produce one 'family[instance]' series per filesystem or
+        interface plus a family value aggregated over the series.
+        """
+        classify = self.classify
+        metric_values = {}
+        instances = None
+
+        for item in items:
+            classified = classify(item.get('key_', ''))
+            if classified is None:
+                continue
+            family, series, default_unit, aggregate = classified
+
+            try:
+                value = float(item.get('lastvalue', ''))
+            except (TypeError, ValueError):
+                # Item bez wartości (np. nieobsługiwany) - pomijamy
+                continue
+
+            unit = item.get('units') or default_unit
+            metric_values[series] = {'value': value, 'unit': unit}
+            if aggregate:
+                if instances is None:
+                    instances = defaultdict(list)
+                instances[(family, aggregate)].append((value, unit))
+
+        if instances:
+            for (family, aggregate), values in instances.items():
+                combine = sum if aggregate == 'sum' else max
+                metric_values[family] = {'value': combine(v for v, _ in values), 'unit': values[0][1]}
+
+        # Wartości pochodne wyświetlane na dashboardzie
+        if 'network_in' in metric_values or 'network_out' in metric_values:
+            directions = [metric_values[f] for f in ('network_in', 'network_out') if f in metric_values]
+            metric_values['network'] = {'value': sum(m['value'] for m in directions), 'unit': directions[0]['unit']}
+        if 'cpu' not in metric_values and 'cpu_idle' in metric_values:
+            metric_values['cpu'] = {'value': 100.0 - metric_values['cpu_idle']['value'], 'unit': '%'}
+
+        return metric_values
+
+
+def load_metric_rules(path=ZABBIX_METRIC_RULES):
+    """Load classifier rules from a JSON file, falling back to the defaults"""
+    if not path:
+        return DEFAULT_METRIC_RULES
+    try:
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+        print(f"Loaded {len(rules)} Zabbix metric rules from {path}")
+        return rules
+    except (OSError, ValueError) as e:
+        print(f"Error loading Zabbix metric rules from {path}: {e}, using defaults")
+        return DEFAULT_METRIC_RULES
+
+
+# Globalny rejestr reguł (kompilowany raz przy imporcie)
+metric_registry = MetricKeyRegistry(load_metric_rules())
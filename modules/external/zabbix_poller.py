@@ -0,0 +1,105 @@
+"""
+Background poller for Zabbix host data.
+
+The poller refreshes host state on a fixed cadence in a daemon thread and
+publishes the result as a snapshot. Request handlers only read the latest
+snapshot, so dashboard latency does not depend on how slow Zabbix is.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from config import ZABBIX_POLL_INTERVAL, ZABBIX_POLLER_ENABLED
+from .zabbix import get_dashboard_data
+
+# Snapshot jest publikowany jako całość i nigdy nie jest modyfikowany po publikacji
+ZabbixSnapshot = namedtuple('ZabbixSnapshot', ['data', 'unknown_hosts', 'alerts', 'fetched_at', 'duration', 'error'])
+
+
+class ZabbixPoller:
+    def __init__(self, interval=ZABBIX_POLL_INTERVAL, enabled=ZABBIX_POLLER_ENABLED):
+        self.interval = interval
+        self.enabled = enabled
+        self._snapshot = None
+        self._poll_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def ensure_started(self):
+        """Start the polling thread once per process"""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='zabbix-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def reset(self):
+        """Drop the published snapshot so the next reader polls again"""
+        with self._poll_lock:
+            self._snapshot = None
+
+    def get_snapshot(self):
+        """Return the latest published snapshot (or None before the first poll)"""
+        return self._snapshot
+
+    def is_fresh(self, max_age):
+        snapshot = self._snapshot
+        return snapshot is not None and (time.time() - snapshot.fetched_at) < max_age
+
+    def refresh_now(self, max_age=None):
+        """
+        Poll Zabbix synchronously and publish a new snapshot.
+
+        With max_age set, a snapshot that is still fresh is returned without
+        polling - this lets concurrent callers share a single round trip.
+        """
+        with self._poll_lock:
+            if max_age is not None and self.is_fresh(max_age):
+                return self._snapshot
+            return self._poll_once()
+
+    def _poll_once(self):
+        start = time.time()
+        # Hosty i alerty w jednym batchu JSON-RPC
+        dashboard = get_dashboard_data()
+        data = dashboard['hosts']
+        duration = time.time() - start
+
+        if isinstance(data, dict) and 'error' in data and self._snapshot is not None:
+            # Zachowaj ostatni poprawny snapshot, zapisz tylko błąd
+            previous = self._snapshot
+            self._snapshot = previous._replace(error=data['error'])
+            print(f"Zabbix poll failed after {duration:.2f}s, serving snapshot from "
+                  f"{datetime.fromtimestamp(previous.fetched_at).strftime('%Y-%m-%d %H:%M:%S')}")
+            return self._snapshot
+
+        self._snapshot = ZabbixSnapshot(
+            data=data,
+            unknown_hosts=dashboard['unknown'],
+            alerts=dashboard['alerts'],
+            fetched_at=time.time(),
+            duration=duration,
+            error=data.get('error') if isinstance(data, dict) else None
+        )
+        print(f"Zabbix poll completed in {duration:.2f}s")
+        return self._snapshot
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Połowa interwału - pomijamy cykl, jeśli żądanie HTTP właśnie zasiliło snapshot
+                self.refresh_now(max_age=self.interval / 2)
+            except Exception as e:
+                print(f"Error in Zabbix poller: {e}")
+            self._stop_event.wait(self.interval)
+
+
+# Globalna instancja pollera (jedna na proces)
+zabbix_poller = ZabbixPoller()
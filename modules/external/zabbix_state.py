@@ -0,0 +1,188 @@
+"""
+State-change engine for Zabbix problems.
+
+Open problems are tracked per (host, trigger) in the zabbix_problem_state
+table. Each poll is compared with the stored state and system_logs receives
+an event only when a problem opens or closes, instead of the same problem
+being logged again on every poll. The table is the only copy of the state,
+so every gunicorn worker sees the same open problems.
+"""
+import threading
+from datetime import datetime
+from ..core.database import get_db_cursor, log_system_events
+
+# Klucz pseudo-triggera dla niedostępności hosta
+HOST_UNAVAILABLE_KEY = 'host.unavailable'
+
+
+def setup_zabbix_state_table():
+    """Create zabbix_problem_state table if not exists"""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS zabbix_problem_state (
+                host_id VARCHAR(64) NOT NULL,
+                trigger_key VARCHAR(255) NOT NULL,
+                host_name VARCHAR(255),
+                description TEXT,
+                severity VARCHAR(16) NOT NULL DEFAULT 'warning',
+                opened_at DATETIME NOT NULL,
+                PRIMARY KEY (host_id, trigger_key)
+            )
+        """)
+
+
+def format_duration(seconds):
+    """Format a duration in seconds as e.g. '2d 3h 4m'"""
+    seconds = max(int(seconds), 0)
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+
+def _trigger_severity(trigger):
+    """Map a Zabbix trigger to a system_logs severity"""
+    if int(trigger.get('priority', 0) or 0) >= 4 or 'critical' in trigger.get('description', '').lower():
+        return 'critical'
+    return 'warning'
+
+
+def current_problems(hosts):
+    """Build {(host_id, trigger_key): problem} for the problems present in one poll"""
+    problems = {}
+    now = datetime.now()
+
+    for host in hosts:
+        if 'hostid' not in host:
+            continue
+        host_id = str(host['hostid'])
+        host_name = host.get('name', 'unknown')
+
+        for trigger in host.get('triggers', []):
+            if trigger.get('status') != '0' or trigger.get('state') != '1':
+                continue
+            trigger_key = str(trigger.get('triggerid') or trigger.get('description', ''))[:255]
+            last_change = int(trigger.get('lastchange', 0) or 0)
+            problems[(host_id, trigger_key)] = {
+                'host_name': host_name,
+                'description': trigger.get('description', ''),
+                'severity': _trigger_severity(trigger),
+                'opened_at': datetime.fromtimestamp(last_change) if last_change else now
+            }
+
+        if host.get('availability') == 'Unavailable':
+            problems[(host_id, HOST_UNAVAILABLE_KEY)] = {
+                'host_name': host_name,
+                'description': 'Host became unavailable',
+                'severity': 'error',
+                'opened_at': now
+            }
+
+    return problems
+
+
+class AlertStateTracker:
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_table(self):
+        if not self._ready:
+            setup_zabbix_state_table()
+            self._ready = True
+
+    def process_poll(self, hosts):
+        """
+        Compare a poll with the stored state and persist only the transitions.
+
+        The state is read and changed in one transaction and an event is
+        logged only for the rows this call actually inserted or deleted, so
+        workers polling at the same time do not log the same transition
+        twice. Returns a dict with the opened and closed problem keys.
+        """
+        current = current_problems(hosts)
+        with self._lock:
+            self._ensure_table()
+            with get_db_cursor() as cursor:
+                cursor.execute("""
+                    SELECT host_id, trigger_key, host_name, description, severity, opened_at
+                    FROM zabbix_problem_state
+                    FOR UPDATE
+                """)
+                known = {(row['host_id'], row['trigger_key']): row for row in cursor.fetchall()}
+
+                now = datetime.now()
+                events = []
+                closed = []
+                for key, problem in known.items():
+                    if key in current:
+                        continue
+                    cursor.execute("""
+                        DELETE FROM zabbix_problem_state
+                        WHERE host_id = %s AND trigger_key = %s
+                    """, key)
+                    if cursor.rowcount != 1:
+                        continue
+                    closed.append(key)
+                    duration = format_duration((now - problem['opened_at']).total_seconds())
+                    message = ("Host became available again" if key[1] == HOST_UNAVAILABLE_KEY
+                               else f"Resolved: {problem['description']}")
+                    events.append(('zabbix', 'info', problem['host_name'], f"{message} (open for {duration})"))
+
+                opened = []
+                for key, problem in current.items():
+                    if key in known:
+                        continue
+                    cursor.execute("""
+                        INSERT IGNORE INTO zabbix_problem_state
+                        (host_id, trigger_key, host_name, description, severity, opened_at)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, (key[0], key[1], problem['host_name'][:255], problem['description'],
+                          problem['severity'], problem['opened_at']))
+                    if cursor.rowcount != 1:
+                        continue
+                    opened.append(key)
+                    events.append(('zabbix', problem['severity'], problem['host_name'], problem['description']))
+
+                # Zmiany stanu i wpisy system_logs w jednej transakcji
+                log_system_events(events, cursor)
+
+        if opened or closed:
+            print(f"Zabbix problem state: {len(opened)} opened, {len(closed)} closed, "
+                  f"{len(known) + len(opened) - len(closed)} open")
+        return {'opened': opened, 'closed': closed}
+
+    def get_open_problems(self):
+        """Return open problems with their current duration, longest first"""
+        with self._lock:
+            self._ensure_table()
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT host_id, trigger_key, host_name, description, severity, opened_at
+                FROM zabbix_problem_state
+            """)
+            rows = cursor.fetchall()
+        now = datetime.now()
+        problems = [
+            {
+                'host_id': row['host_id'],
+                'trigger_key': row['trigger_key'],
+                'host_name': row['host_name'],
+                'description': row['description'],
+                'severity': row['severity'],
+                'opened_at': row['opened_at'].strftime('%Y-%m-%d %H:%M:%S'),
+                'duration_seconds': int((now - row['opened_at']).total_seconds()),
+                'duration': format_duration((now - row['opened_at']).total_seconds())
+            }
+            for row in rows
+        ]
+        problems.sort(key=lambda p: p['duration_seconds'], reverse=True)
+        return problems
+
+
+# Globalny tracker stanu problemów (stan wspólny dla procesów w bazie)
+alert_state_tracker = AlertStateTracker()
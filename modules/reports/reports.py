@@ -30,6 +30,8 @@ except ImportError:
         print("No PDF generation backend available")
 
 from ..core.database import get_db_cursor
+from .sla import get_sla_report
+from ..utils.log_classifier import log_classifier
 
 # Directory for storing generated reports
 REPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'reports')
@@ -51,7 +53,8 @@ class ReportGenerator:
     """Class for generating various types of reports."""
     
     def __init__(self, report_type, output_format, date_range, fields=None, 
-                 start_date=None, end_date=None, record_limit=500, preview=False, language='en'):
+                 start_date=None, end_date=None, record_limit=500, preview=False, language='en',
+                 reclassify=False):
         """Initialize report generator with parameters."""
         self.report_type = report_type
         self.output_format = output_format
@@ -62,6 +65,7 @@ class ReportGenerator:
         self.record_limit = int(record_limit) if record_limit != 'all' else None
         self.preview = preview
         self.language = language  # Add language parameter
+        self.reclassify = reclassify  # Recompute message severity/category with current rules
         self._process_date_range()
         
         # Debug information
@@ -82,7 +86,8 @@ class ReportGenerator:
                 'messages': 'Messages Report',
                 'errors': 'Errors Report',
                 'performance': 'Performance Report',
-                'summary': 'Summary Report'
+                'summary': 'Summary Report',
+                'sla': 'Availability (SLA) Report'
             },
             'metadata_labels': {
                 'report_type': 'Report Type',
@@ -125,7 +130,13 @@ class ReportGenerator:
                 # Summary report
                 'category': 'Category',
                 'metric': 'Metric',
-                'period': 'Period'
+                'period': 'Period',
+                # SLA report
+                'name': 'Name',
+                'availability': 'Availability (%)',
+                'downtime_hours': 'Downtime (h)',
+                'unknown_hours': 'No data (h)',
+                'transitions': 'Status changes'
             }
         },
         'pl': {
@@ -133,7 +144,8 @@ class ReportGenerator:
                 'messages': 'Raport wiadomości',
                 'errors': 'Raport błędów',
                 'performance': 'Raport wydajności',
-                'summary': 'Raport podsumowujący'
+                'summary': 'Raport podsumowujący',
+                'sla': 'Raport dostępności (SLA)'
             },
             'metadata_labels': {
                 'report_type': 'Typ raportu',
@@ -175,7 +187,13 @@ class ReportGenerator:
                 # Summary report
                 'category': 'Kategoria',
                 'metric': 'Metryka',
-                'period': 'Okres'
+                'period': 'Okres',
+                # SLA report
+                'name': 'Nazwa',
+                'availability': 'Dostępność (%)',
+                'downtime_hours': 'Niedostępność (h)',
+                'unknown_hours': 'Brak danych (h)',
+                'transitions': 'Zmiany statusu'
             },            'data_values': {
                 # Level translations
                 'INFO': 'INFORMACJA',
@@ -223,7 +241,10 @@ class ReportGenerator:
                 'online': 'online',
                 'offline': 'offline',
                 'maintenance': 'konserwacja',
-                'total': 'razem'
+                'total': 'razem',
+                # SLA report category translations
+                'group': 'grupa',
+                'host': 'host'
             }
         }
     }
@@ -410,12 +431,20 @@ class ReportGenerator:
                 cursor.execute(sql, params)
                 results = cursor.fetchall()
                 print(f"Retrieved {len(results)} message records")
+                if self.reclassify:
+                    self._reclassify_messages(results)
                 return results
             except Exception as e:
                 print(f"Error getting messages data: {str(e)}")
                 traceback.print_exc()
                 return []
     
+    def _reclassify_messages(self, messages):
+        """Recompute severity and category with the current classifier rules."""
+        for row in messages:
+            row['severity'], row['category'] = log_classifier.classify(row.get('message') or '', row.get('level'))
+        return messages
+
     def _get_errors_data(self):
         """Get error log data from system_errors table."""
         with get_db_cursor() as cursor:
@@ -499,7 +528,8 @@ class ReportGenerator:
                         m.host_id,
                         h.hostname as host_name,
                         m.metric_type,
-                        m.value
+                        COALESCE(m.numeric_value, m.value) as value,
+                        m.unit
                     FROM performance_metrics m
                     LEFT JOIN hosts h ON m.host_id = h.id
                     WHERE m.timestamp BETWEEN %s AND %s
@@ -594,6 +624,40 @@ class ReportGenerator:
                 
         return test_data
     
+    def _get_sla_data(self):
+        """Get host group and host availability computed from status transitions."""
+        try:
+            sla = get_sla_report(self.start_date, self.end_date)
+            
+            sla_data = []
+            # Grupy hostów na początku, potem hosty od najniższej dostępności
+            for group in sla['groups']:
+                sla_data.append({
+                    'category': 'group',
+                    'name': group['group'],
+                    'availability': group['availability'],
+                    'downtime_hours': round(group['unavailable_seconds'] / 3600, 2),
+                    'unknown_hours': round(group['unknown_seconds'] / 3600, 2),
+                    'transitions': group['transitions']
+                })
+            for host in sla['hosts']:
+                sla_data.append({
+                    'category': 'host',
+                    'name': host['host_name'],
+                    'availability': host['availability'],
+                    'downtime_hours': round(host['unavailable_seconds'] / 3600, 2),
+                    'unknown_hours': round(host['unknown_seconds'] / 3600, 2),
+                    'transitions': host['transitions']
+                })
+            
+            if self.record_limit:
+                sla_data = sla_data[:self.record_limit]
+            return sla_data
+        except Exception as e:
+            print(f"Error getting SLA data: {str(e)}")
+            traceback.print_exc()
+            return []
+    
     def _get_summary_data(self):
         """Get summary report data combining various metrics."""
         try:
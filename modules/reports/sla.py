@@ -0,0 +1,174 @@
+"""
+Availability SLA computed from host status transitions.
+
+host_status_history holds one row per status change, so the time a host
+spent in each state over a range is the sum of the intervals between
+consecutive transitions - the cost depends on the number of changes in the
+range, not on the number of polls. The status in effect at the start of
+the range is the last transition before it.
+
+Availability is the available time divided by the time with a known
+status; periods without data ('unknown') are reported separately.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+from ..core.database import get_db_cursor
+
+KNOWN_STATUSES = ('available', 'unavailable')
+
+
+def _empty_totals():
+    return {'available': 0.0, 'unavailable': 0.0, 'unknown': 0.0}
+
+
+def _add_time(totals, status, seconds):
+    totals[status if status in KNOWN_STATUSES else 'unknown'] += max(seconds, 0.0)
+
+
+def _summarize(totals, transitions):
+    known = totals['available'] + totals['unavailable']
+    return {
+        'availability': round(totals['available'] / known * 100, 3) if known else None,
+        'available_seconds': int(totals['available']),
+        'unavailable_seconds': int(totals['unavailable']),
+        'unknown_seconds': int(totals['unknown']),
+        'transitions': transitions
+    }
+
+
+def time_in_states(transitions, start, end, initial_status=None):
+    """
+    Sum the seconds spent in each status over [start, end).
+
+    transitions is a time-ordered list of (timestamp, status) inside the
+    range, initial_status the status in effect at start (None if unknown).
+    Returns (totals, number of actual status changes).
+    """
+    totals = _empty_totals()
+    status = initial_status
+    since = start
+    changes = 0
+
+    for timestamp, new_status in transitions:
+        if new_status == status:
+            # Starsze dane zawierają wiersz z każdego pollu - to nie jest zmiana
+            continue
+        timestamp = min(max(timestamp, start), end)
+        _add_time(totals, status, (timestamp - since).total_seconds())
+        status = new_status
+        since = timestamp
+        changes += 1
+
+    _add_time(totals, status, (end - since).total_seconds())
+    return totals, changes
+
+
+def compute_availability(transitions, start, end, initial_status=None):
+    """Availability summary for one host (see time_in_states)"""
+    totals, changes = time_in_states(transitions, start, end, initial_status)
+    return _summarize(totals, changes)
+
+
+def get_host_sla(host_id: str, start: datetime, end: datetime) -> dict:
+    """Availability of a single host over [start, end)"""
+    end = min(end, datetime.now())
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            SELECT status, timestamp
+            FROM host_status_history
+            WHERE host_id = %s AND timestamp < %s
+            ORDER BY timestamp DESC
+            LIMIT 1
+        """, (host_id, start))
+        previous = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT status, timestamp
+            FROM host_status_history
+            WHERE host_id = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        """, (host_id, start, end))
+        transitions = [(row['timestamp'], row['status']) for row in cursor.fetchall()]
+
+    return compute_availability(transitions, start, end, previous['status'] if previous else None)
+
+
+def get_sla_report(start: datetime, end: datetime, group: str = None) -> dict:
+    """
+    Per-host and per-group availability over [start, end).
+
+    Group availability is computed from the summed time of its hosts, so
+    every host weighs the same regardless of how often it changed status.
+    """
+    end = min(end, datetime.now())
+    with get_db_cursor() as cursor:
+        # Hosty usunięte z Zabbixa przed początkiem zakresu nie należą do raportu
+        cursor.execute("""
+            SELECT host_id, host_name, host_groups
+            FROM host_status_current
+            WHERE removed_at IS NULL OR removed_at > %s
+        """, (start,))
+        hosts = cursor.fetchall()
+
+        # Status obowiązujący na początku zakresu - ostatnie przejście przed start
+        cursor.execute("""
+            SELECT h.host_id, h.status
+            FROM host_status_history h
+            JOIN (
+                SELECT host_id, MAX(timestamp) AS last_change
+                FROM host_status_history
+                WHERE timestamp < %s
+                GROUP BY host_id
+            ) previous ON previous.host_id = h.host_id AND previous.last_change = h.timestamp
+        """, (start,))
+        initial = {row['host_id']: row['status'] for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT host_id, status, timestamp
+            FROM host_status_history
+            WHERE timestamp >= %s AND timestamp < %s
+            ORDER BY host_id, timestamp
+        """, (start, end))
+        transitions = defaultdict(list)
+        for row in cursor.fetchall():
+            transitions[row['host_id']].append((row['timestamp'], row['status']))
+
+    host_rows = []
+    group_totals = defaultdict(_empty_totals)
+    group_changes = defaultdict(int)
+    group_hosts = defaultdict(int)
+
+    for host in hosts:
+        groups = json.loads(host['host_groups']) if host.get('host_groups') else []
+        if group and group not in groups:
+            continue
+        totals, changes = time_in_states(transitions.get(host['host_id'], []), start, end,
+                                         initial.get(host['host_id']))
+        host_rows.append({
+            'host_id': host['host_id'],
+            'host_name': host['host_name'],
+            'groups': groups,
+            **_summarize(totals, changes)
+        })
+        for name in groups:
+            if group and name != group:
+                continue
+            for status, seconds in totals.items():
+                group_totals[name][status] += seconds
+            group_changes[name] += changes
+            group_hosts[name] += 1
+
+    group_rows = [{
+        'group': name,
+        'hosts': group_hosts[name],
+        **_summarize(totals, group_changes[name])
+    } for name, totals in sorted(group_totals.items())]
+
+    host_rows.sort(key=lambda row: (row['availability'] is None, row['availability'] or 0, row['host_name'] or ''))
+    return {
+        'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+        'hosts': host_rows,
+        'groups': group_rows
+    }
@@ -0,0 +1,133 @@
+"""
+Rule-driven severity/category classifier for log messages.
+
+Severity and category rules are ordered lists of keywords (substrings of
+the lowercased message) and, for severity, log levels. All keywords of
+both rule sets are compiled into one regular expression, so a message is
+scanned once and the first matching rule wins - the same result as the
+original chain of `in` tests, at the cost of a single pass. Only when a
+match could hide an overlapping keyword is the message scanned again
+position by position.
+
+The default rules can be replaced without code changes by pointing
+LOG_CLASSIFIER_RULES at a JSON file with the same structure.
+"""
+import json
+import re
+from config import LOG_CLASSIFIER_RULES
+
+# Reguły sprawdzane w kolejności - wygrywa pierwsza pasująca (jak dawny łańcuch if/elif)
+# levels   - poziomy logu (type z payloadu) wymuszające daną ważność
+# keywords - fragmenty wiadomości (małe litery)
+DEFAULT_LOG_RULES = {
+    'severity': [
+        {'value': 'high', 'levels': ['ERROR'], 'keywords': ['error']},
+        {'value': 'medium', 'levels': ['WARN'], 'keywords': ['warning']},
+    ],
+    'default_severity': 'low',
+    'category': [
+        {'value': 'System Error', 'keywords': ['error']},
+        {'value': 'Security Alert', 'keywords': ['unauthorized', 'forbidden', 'denied']},
+        {'value': 'Performance Issue', 'keywords': ['timeout', 'slow', 'performance']},
+        {'value': 'Service Status', 'keywords': ['service', 'started', 'stopped']},
+    ],
+    'default_category': 'General Warning'
+}
+
+
+class LogClassifier:
+    def __init__(self, rules):
+        severity_rules = rules.get('severity', [])
+        category_rules = rules.get('category', [])
+        self.severities = [rule['value'] for rule in severity_rules]
+        self.categories = [rule['value'] for rule in category_rules]
+        self.default_severity = rules.get('default_severity', 'low')
+        self.default_category = rules.get('default_category', 'General Warning')
+
+        # Maski bitowe: bit i = reguła i spełniona przez dany poziom / słowo kluczowe
+        self._level_masks = self._rule_masks(severity_rules, 'levels', str.upper)
+        severity_masks = self._rule_masks(severity_rules, 'keywords', str.lower)
+        category_masks = self._rule_masks(category_rules, 'keywords', str.lower)
+
+        keywords = sorted(set(severity_masks) | set(category_masks), key=len, reverse=True)
+        self._masks = {}
+        for keyword in keywords:
+            # Dopasowanie dłuższego słowa oznacza też obecność słów w nim zawartych
+            contained = [other for other in keywords if other in keyword]
+            self._masks[keyword] = (
+                self._combine(severity_masks, contained),
+                self._combine(category_masks, contained)
+            )
+
+        alternation = '|'.join(re.escape(keyword) for keyword in keywords)
+        self._pattern = re.compile(alternation) if keywords else None
+        # Lookahead sprawdza każdą pozycję - używany tylko gdy trafienie mogło zasłonić inne słowo
+        self._overlap_pattern = re.compile(f'(?=({alternation}))') if keywords else None
+        self._overlapping = frozenset(self._overlapping_keywords(keywords))
+
+    @staticmethod
+    def _rule_masks(rules, field, normalize):
+        masks = {}
+        for index, rule in enumerate(rules):
+            for value in rule.get(field, ()):
+                value = normalize(value)
+                masks[value] = masks.get(value, 0) | (1 << index)
+        return masks
+
+    @staticmethod
+    def _combine(masks, keywords):
+        combined = 0
+        for keyword in keywords:
+            combined |= masks.get(keyword, 0)
+        return combined
+
+    @staticmethod
+    def _overlapping_keywords(keywords):
+        """Keywords whose suffix is another keyword's prefix (a non-overlapping scan could hide it)"""
+        for a in keywords:
+            for b in keywords:
+                if a is b or b in a or a in b:
+                    continue
+                if any(a.endswith(b[:size]) for size in range(1, min(len(a), len(b)))):
+                    yield a
+                    break
+
+    def classify(self, message, level='INFO'):
+        """Return (severity, category) for a message and its log level"""
+        severity_mask = self._level_masks.get((level or '').upper(), 0)
+        category_mask = 0
+        if message and self._pattern is not None:
+            text = message.lower()
+            found = self._pattern.findall(text)
+            if found and not self._overlapping.isdisjoint(found):
+                found = self._overlap_pattern.findall(text)
+            masks = self._masks
+            for keyword in found:
+                severity, category = masks[keyword]
+                severity_mask |= severity
+                category_mask |= category
+
+        # Najniższy ustawiony bit = pierwsza pasująca reguła
+        severity = (self.severities[(severity_mask & -severity_mask).bit_length() - 1]
+                    if severity_mask else self.default_severity)
+        category = (self.categories[(category_mask & -category_mask).bit_length() - 1]
+                    if category_mask else self.default_category)
+        return severity, category
+
+
+def load_log_rules(path=LOG_CLASSIFIER_RULES):
+    """Load classifier rules from a JSON file, falling back to the defaults"""
+    if not path:
+        return DEFAULT_LOG_RULES
+    try:
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+        print(f"Loaded log classifier rules from {path}")
+        return rules
+    except (OSError, ValueError) as e:
+        print(f"Error loading log classifier rules from {path}: {e}, using defaults")
+        return DEFAULT_LOG_RULES
+
+
+# Globalny klasyfikator (kompilowany raz przy imporcie)
+log_classifier = LogClassifier(load_log_rules())
@@ -0,0 +1,137 @@
+"""
+Online log template mining (Drain-style).
+
+Messages are split into whitespace tokens and tokens that carry variable
+data (anything with a digit, hex values) are masked as '<*>'. Templates
+are grouped by token count and the first tokens, so a message is compared
+only with the few templates of its group: it joins the most similar one
+when at least LOG_TEMPLATE_SIMILARITY of the positions match, and the
+positions that differ become '<*>'. The tokens under '<*>' are the
+message parameters.
+
+A template keeps the id computed from its first masked form, so the id
+stays the same while the template generalizes and across restarts (the
+same first message hashes to the same id; persisted templates can be
+loaded back with load()). Beyond LOG_TEMPLATE_MAX_TEMPLATES new templates
+are no longer remembered - messages still get an id of their masked form.
+"""
+import hashlib
+import re
+import threading
+from config import LOG_TEMPLATE_SIMILARITY, LOG_TEMPLATE_MAX_TEMPLATES
+
+PARAM = '<*>'
+
+# Liczba początkowych tokenów wyznaczających grupę szablonów (poza liczbą tokenów)
+PREFIX_DEPTH = 2
+
+_HEX = re.compile(r'^(0x)?[0-9a-f]{8,}$', re.IGNORECASE)
+
+
+def _is_variable(token):
+    return any(ch.isdigit() for ch in token) or bool(_HEX.match(token))
+
+
+def template_id_of(tokens):
+    """Stable 63-bit id of a token sequence (fits a signed BIGINT)"""
+    digest = hashlib.blake2b(' '.join(tokens).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+
+class LogTemplate:
+    __slots__ = ('template_id', 'tokens', 'count')
+
+    def __init__(self, template_id, tokens):
+        self.template_id = template_id
+        self.tokens = tokens
+        self.count = 0
+
+
+class TemplateMiner:
+    def __init__(self, similarity=LOG_TEMPLATE_SIMILARITY, max_templates=LOG_TEMPLATE_MAX_TEMPLATES):
+        self.similarity = similarity
+        self.max_templates = max_templates
+        self._groups = {}  # (liczba tokenów, *prefiks) -> [LogTemplate]
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'messages': 0, 'created': 0, 'unlearned': 0}
+
+    @staticmethod
+    def _group_key(tokens):
+        return (len(tokens), *(PARAM if _is_variable(t) else t for t in tokens[:PREFIX_DEPTH]))
+
+    @staticmethod
+    def _score(template_tokens, tokens):
+        """Share of positions equal to the template (masked tokens match a '<*>' position)"""
+        equal = sum(1 for a, b in zip(template_tokens, tokens) if a == b)
+        return equal / len(tokens)
+
+    def _best_match(self, group, tokens):
+        best, best_score = None, -1.0
+        for candidate in group:
+            score = self._score(candidate.tokens, tokens)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is not None and best_score >= self.similarity:
+            return best
+        return None
+
+    def add(self, message):
+        """
+        Assign a message to a template.
+
+        Returns (template_id, template, params), or (None, None, []) for an
+        empty message.
+        """
+        tokens = (message or '').split()
+        if not tokens:
+            return None, None, []
+        masked = [PARAM if _is_variable(t) else t for t in tokens]
+        key = self._group_key(tokens)
+
+        with self._lock:
+            self._stats['messages'] += 1
+            group = self._groups.get(key)
+            match = self._best_match(group, masked) if group else None
+            if match is None:
+                match = LogTemplate(template_id_of(masked), masked)
+                if self._size < self.max_templates:
+                    self._groups.setdefault(key, []).append(match)
+                    self._size += 1
+                    self._stats['created'] += 1
+                else:
+                    self._stats['unlearned'] += 1
+            elif match.tokens != masked:
+                # Pozycje różniące się od szablonu stają się parametrami
+                match.tokens = [a if a == b else PARAM for a, b in zip(match.tokens, masked)]
+            match.count += 1
+            template_tokens = match.tokens
+
+        params = [token for token, part in zip(tokens, template_tokens) if part == PARAM]
+        return match.template_id, ' '.join(template_tokens), params
+
+    def load(self, templates):
+        """Restore templates from (template_id, template) pairs, e.g. the graylog_templates table"""
+        loaded = 0
+        with self._lock:
+            known = {t.template_id for group in self._groups.values() for t in group}
+            for template_id, template in templates:
+                tokens = (template or '').split()
+                if not tokens or template_id in known or self._size >= self.max_templates:
+                    continue
+                self._groups.setdefault(self._group_key(tokens), []).append(LogTemplate(template_id, tokens))
+                known.add(template_id)
+                self._size += 1
+                loaded += 1
+        return loaded
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['templates'] = self._size
+            stats['max_templates'] = self.max_templates
+        return stats
+
+
+# Globalny miner szablonów używany przy pobieraniu wiadomości
+template_miner = TemplateMiner()
@@ -0,0 +1,54 @@
+"""
+Display formatting for numeric host metrics.
+
+Metrics are collected and stored as raw floats with a unit; these helpers
+turn them into the strings shown on the dashboard only when rendering.
+"""
+
+NO_DATA = 'Brak danych'
+
+# Kolejność metryk wyświetlanych na dashboardzie
+DISPLAY_METRICS = ['cpu', 'memory', 'disk', 'network', 'ping', 'uptime', 'last_restart']
+
+
+def format_metric(metric_type, value, unit=''):
+    """Format a single numeric metric for display"""
+    if value is None:
+        return NO_DATA
+
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+    # Serie per instancja ('disk[/]', 'network_in[eth0]') formatujemy jak ich rodzinę
+    family = metric_type.split('[', 1)[0]
+
+    if family in ('cpu', 'cpu_idle', 'ping_loss'):
+        return f"{value:.2f}%"
+    if family in ('memory', 'memory_available', 'disk', 'disk_used'):
+        return f"{value/1024/1024/1024:.2f} GB"
+    if family in ('network', 'network_in', 'network_out'):
+        return f"{value/1024/1024:.2f} MB/s"
+    if family == 'ping':
+        return 'OK' if value == 1 else 'Failed'
+    if family == 'ping_latency':
+        return f"{value*1000:.1f} ms"
+    if family == 'uptime':
+        # Format liczby z przecinkiem zamiast kropki dla Polski i "dni" zamiast "days"
+        return f"{value/86400:.1f}".replace('.', ',') + " dni"
+    return f"{value:g} {unit}".strip()
+
+
+def format_metrics(metric_values):
+    """
+    Format the dashboard metrics of a {metric_type: {'value': float, 'unit': str}} dict.
+
+    Every dashboard metric is present in the result, missing ones as
+    'Brak danych'. Per-instance series are left to format_metric().
+    """
+    formatted = {}
+    for metric_type in DISPLAY_METRICS:
+        metric = metric_values.get(metric_type)
+        formatted[metric_type] = format_metric(metric_type, metric['value'], metric.get('unit', '')) if metric else NO_DATA
+    return formatted
@@ -31,6 +31,13 @@ def client():
             from app import cache
             cache.clear()
             
+            # Each test polls Zabbix through its own mocks, without the background thread
+            from app import zabbix_poller
+            zabbix_poller.enabled = False
+            zabbix_poller.reset()
+            from modules.external.zabbix import item_cache
+            item_cache.reset()
+            
             # Mock authentication for tests
             with client.session_transaction() as sess:
                 sess['logged_in'] = True
@@ -23,6 +23,15 @@ from unittest.mock import patch, MagicMock
 from flask import session
 import requests
 
+
+def glpi_response(status_code, payload):
+    """Mocked GLPI API response with the given status and JSON payload"""
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = payload
+    return response
+
+
 class TestGLPIDataAPI:
     """Test cases for /api/glpi/data endpoint"""
     
@@ -361,4 +370,314 @@ class TestGLPIClientIntegration:
             # Test category counts match data
             assert data['category_counts']['workstations'] == len(workstations)
             assert data['category_counts']['terminals'] == len(terminals)
-            assert data['category_counts']['servers'] == len(servers)
\ No newline at end of file
+            assert data['category_counts']['servers'] == len(servers)
+
+class TestGLPIDropdownResolver:
+    """Test cases for the shared GLPI dropdown name resolver"""
+    
+    def test_dropdown_tables_are_prefetched_once_and_served_from_memory(self):
+        """Test that lookups after a prefetch need no further requests"""
+        from modules.external.glpi_dropdowns import GLPIDropdownResolver
+        from modules.external.glpi_http import glpi_http
+        
+        resolver = GLPIDropdownResolver(ttl=900, page_size=2)
+        pages = {
+            'Location': [[{'id': 1, 'name': 'HQ'}, {'id': 2, 'name': 'Branch'}], [{'id': 3, 'name': 'DC'}]],
+            'User': [[{'id': 7, 'name': 'jdoe', 'firstname': 'John', 'realname': 'Doe'}]]
+        }
+        
+        def get(url, params=None, **kwargs):
+            itemtype = url.rsplit('/', 1)[-1]
+            start = int(params['range'].split('-')[0])
+            return glpi_response(206, pages[itemtype][start // 2])
+        
+        with patch.object(glpi_http.session, 'get', side_effect=get) as mock_get:
+            resolver.prefetch(['Location', 'User', 'Location'], {})
+            resolver.prefetch(['Location'], {})
+            names = [resolver.resolve('Location', location_id, {}, 'Unknown Location')
+                     for location_id in (1, 3, '2', 1, 0)]
+            user = resolver.resolve('User', 7, {}, 'Unknown User')
+        
+        assert mock_get.call_count == 3
+        assert names == ['HQ', 'DC', 'Branch', 'HQ', 'Unknown Location']
+        assert user == 'John Doe'
+        assert resolver.get_stats()['hits'] == 5
+    
+    def test_unknown_ids_are_fetched_once_and_invalidation_reloads(self):
+        """Test the single-item fallback and explicit invalidation"""
+        from modules.external.glpi_dropdowns import GLPIDropdownResolver
+        from modules.external.glpi_http import glpi_http
+        
+        resolver = GLPIDropdownResolver(ttl=900)
+        with patch.object(glpi_http.session, 'get') as mock_get:
+            mock_get.side_effect = [glpi_response(200, [{'id': 1, 'name': 'HQ'}]),
+                                    glpi_response(404, {}),
+                                    glpi_response(200, [{'id': 1, 'name': 'Headquarters'}])]
+            resolver.prefetch(['Location'], {})
+            assert resolver.resolve('Location', 9, {}, 'Unknown Location') == 'Unknown Location'
+            assert resolver.resolve('Location', 9, {}, 'Unknown Location') == 'Unknown Location'
+            resolver.invalidate('Location')
+            resolver.prefetch(['Location'], {})
+            assert resolver.resolve('Location', 1, {}, 'Unknown Location') == 'Headquarters'
+        
+        assert mock_get.call_count == 3
+
+
+class TestGLPISinglePassSync:
+    """Test cases for the search/expand_dropdowns based sync"""
+    
+    def test_computers_arrive_complete_from_paged_search(self):
+        """Test that computers are read page by page from search/ without per-device requests"""
+        from modules.external.glpi import GLPIClient
+        from modules.external.glpi_http import glpi_http
+        
+        pages = [
+            {'totalcount': 3, 'count': 2, 'data': [
+                {'2': 11, '1': 'KS-001', '3': 'HQ > Floor 1', '40': 'OptiPlex 7090', '45': 'Windows 11',
+                 '70': 'jdoe', '126': 'fe80::1$#$10.0.0.11', '21': 'aa:bb:cc:dd:ee:01'},
+                {'2': 12, '1': 'SRV-DB', '3': '', '40': None, '126': None}
+            ]},
+            {'totalcount': 3, 'count': 1, 'data': [{'2': 13, '1': 'KT-100', '126': ['10.0.0.13']}]}
+        ]
+        
+        with patch.object(glpi_http.session, 'get',
+                   side_effect=[glpi_response(206, pages[0]), glpi_response(200, pages[1])]) as mock_get:
+            computers = GLPIClient().get_items_single_pass('Computer', {})
+        
+        assert mock_get.call_count == 2
+        url = mock_get.call_args_list[0][0][0]
+        params = dict(mock_get.call_args_list[1][1]['params'])
+        assert url.endswith('/apirest.php/search/Computer')
+        assert params['range'] == '2-1001'
+        assert params['forcedisplay[0]'] == 2
+        
+        first = computers[0]
+        assert (first['ID'], first['location_name'], first['model_name'], first['os_name']) == \
+            (11, 'HQ > Floor 1', 'OptiPlex 7090', 'Windows 11')
+        assert first['owner_name'] == 'jdoe'
+        assert first['ip_address'] == '10.0.0.11'
+        assert first['mac'] == 'aa:bb:cc:dd:ee:01'
+        assert computers[1]['location_name'] is None
+        assert computers[1]['ip_address'] == ''
+        assert computers[2]['ip_address'] == '10.0.0.13'
+    
+    def test_other_itemtypes_use_expanded_dropdowns(self):
+        """Test that non-computer items get names from expand_dropdowns"""
+        from modules.external.glpi import GLPIClient
+        from modules.external.glpi_http import glpi_http
+        
+        items = [{'id': 5, 'name': 'PRN-01', 'locations_id': 'HQ', 'manufacturers_id': 'HP', 'users_id': '&nbsp;'}]
+        with patch.object(glpi_http.session, 'get', return_value=glpi_response(200, items)) as mock_get:
+            printers = GLPIClient().get_items_single_pass('Printer', {})
+        
+        assert mock_get.call_args[1]['params']['expand_dropdowns'] == 'true'
+        assert printers[0]['location_name'] == 'HQ'
+        assert printers[0]['manufacturer_name'] == 'HP'
+        assert 'owner_name' not in printers[0]
+
+
+class TestGLPISyncCache:
+    """Test cases for the server-side GLPI sync cache"""
+    
+    def test_items_are_shared_across_clients_without_the_session(self):
+        """Test that a second client reuses fresh items and stale items are refetched"""
+        from modules.core.cache import BoundedCache
+        from modules.external import glpi
+        
+        sync_cache = BoundedCache('glpi_sync_test', 1024 * 1024, 3600)
+        fetch = MagicMock(side_effect=[[{'id': 1, 'name': 'PRN-01'}], [{'id': 1, 'name': 'PRN-02'}]])
+        
+        with patch.object(glpi, 'sync_cache', sync_cache), \
+             patch.object(glpi.GLPIClient, 'get_items_single_pass', fetch), \
+             patch.object(glpi, 'GLPI_SYNC_MODE', 'search'):
+            first = glpi.GLPIClient().get_all_items('Printer', {})
+            second = glpi.GLPIClient().get_all_items('Printer', {})
+            with patch.object(glpi, 'GLPI_SYNC_CACHE_TTL', -1):
+                refreshed = glpi.GLPIClient().get_all_items('Printer', {})
+        
+        assert first == second == [{'id': 1, 'name': 'PRN-01'}]
+        assert refreshed == [{'id': 1, 'name': 'PRN-02'}]
+        assert fetch.call_count == 2
+    
+    def test_stale_items_are_returned_when_the_api_fails(self):
+        """Test that an API error falls back to the last cached items"""
+        from modules.core.cache import BoundedCache
+        from modules.external import glpi
+        
+        sync_cache = BoundedCache('glpi_sync_test', 1024 * 1024, 3600)
+        sync_cache.set('items:Monitor', {'items': [{'id': 3}], 'fetched_at': 0})
+        
+        with patch.object(glpi, 'sync_cache', sync_cache), \
+             patch.object(glpi.GLPIClient, 'get_items_single_pass', side_effect=requests.exceptions.Timeout()), \
+             patch.object(glpi, 'GLPI_SYNC_MODE', 'search'):
+            items = glpi.GLPIClient().get_all_items('Monitor', {})
+        
+        assert items == [{'id': 3}]
+
+
+class TestGLPIConcurrentEnrichment:
+    """Test cases for the GLPI worker pool, rate limiter and request stats"""
+    
+    def test_token_bucket_paces_requests_after_the_burst(self):
+        """Test that tokens beyond the burst are handed out at the configured rate"""
+        from modules.external.glpi_http import TokenBucket
+        
+        bucket = TokenBucket(rate=100, capacity=5)
+        waited = [bucket.acquire() for _ in range(10)]
+        
+        assert waited[:5] == [0.0] * 5
+        assert 0.03 <= sum(waited) <= 0.5
+        assert TokenBucket(rate=0, capacity=1).acquire() == 0.0
+    
+    def test_page_items_are_enriched_concurrently_and_timed_per_endpoint(self):
+        """Test that every item of a page is enriched on the worker pool and requests are counted"""
+        import threading
+        from modules.external.glpi import GLPIClient
+        from modules.external.glpi_http import GLPIHttp
+        
+        http = GLPIHttp(base_url='https://glpi.test', rate=0, burst=1, pool_size=4)
+        page = glpi_response(200, [{'id': i, 'name': f'PRN-{i}'} for i in range(6)])
+        threads = set()
+        
+        def enrich(endpoint, item, headers):
+            threads.add(threading.get_ident())
+            item['enriched'] = True
+            return item
+        
+        client = GLPIClient()
+        client.http = http
+        client.workers = 4
+        with patch.object(http.session, 'get', return_value=page), \
+             patch('modules.external.glpi.dropdown_resolver'), \
+             patch.object(client, 'enrich_item', side_effect=enrich):
+            items = client.get_items_enriched('Printer', {})
+        
+        assert [item['enriched'] for item in items] == [True] * 6
+        assert threading.get_ident() not in threads
+        stats = http.get_stats()
+        assert stats['endpoints']['Printer']['calls'] == 1
+        assert stats['progress']['enrich:Printer']['done'] == 6
+
+
+class TestGLPIDeltaSync:
+    """Test cases for the incremental (date_mod based) GLPI sync"""
+    
+    @staticmethod
+    def _refresh(state, changed, trashed, full=False):
+        from modules.external import glpi
+        
+        def answer(results):
+            def fetch(itemtype, headers, since=None, strict=False):
+                result = results.get(itemtype, [])
+                if isinstance(result, Exception):
+                    raise result
+                return result
+            return fetch
+        
+        client = glpi.GLPIClient()
+        with patch.object(glpi, 'load_glpi_sync_state', return_value=state), \
+             patch.object(glpi, 'save_glpi_sync_state') as save_state, \
+             patch.object(glpi, 'mark_assets_deleted', return_value=len(trashed)) as mark_deleted, \
+             patch.object(glpi, 'get_db_cursor'), \
+             patch.object(client, 'get_items_single_pass', side_effect=answer(changed)) as fetch, \
+             patch.object(client, 'get_deleted_items', side_effect=answer(trashed)), \
+             patch.object(client, 'archive_refreshed_items') as archive, \
+             patch.object(client, 'get_devices_from_db', return_value={'total_count': 0}):
+            client.refresh_delta_from_api({}, full=full)
+        return fetch, archive, mark_deleted, save_state
+    
+    def test_expanded_delta_stops_at_first_unchanged_item(self):
+        """Test that items sorted by date_mod are read only until the first one older than since"""
+        from modules.external.glpi import GLPIClient
+        from modules.external.glpi_http import glpi_http
+        
+        page = glpi_response(206, [
+            {'id': 7, 'name': 'PRN-07', 'date_mod': '2024-06-07 10:05:00'},
+            {'id': 3, 'name': 'PRN-03', 'date_mod': '2024-06-07 09:00:00'}
+        ])
+        with patch.object(glpi_http.session, 'get', return_value=page) as mock_get:
+            printers = GLPIClient().get_items_expanded('Printer', {}, limit=2, since='2024-06-07 10:00:00')
+        
+        assert mock_get.call_count == 1
+        params = mock_get.call_args[1]['params']
+        assert (params['sort'], params['order']) == ('date_mod', 'DESC')
+        assert [printer['name'] for printer in printers] == ['PRN-07']
+    
+    def test_trashed_items_are_searched_with_is_deleted(self):
+        """Test that the trash is read through search/ with the date_mod criterion"""
+        from modules.external.glpi import GLPIClient
+        from modules.external.glpi_http import glpi_http
+        
+        page = glpi_response(200, {'totalcount': 1, 'data': [{'2': 9, '1': 'KS-009', '19': '2024-06-07 10:01:00'}]})
+        with patch.object(glpi_http.session, 'get', return_value=page) as mock_get:
+            trashed = GLPIClient().get_deleted_items('Computer', {}, since='2024-06-07 10:00:00')
+        
+        params = dict(mock_get.call_args[1]['params'])
+        assert params['is_deleted'] == 1
+        assert (params['criteria[0][field]'], params['criteria[0][searchtype]'], params['criteria[0][value]']) == \
+            (19, 'morethan', '2024-06-07 10:00:00')
+        assert (trashed[0]['ID'], trashed[0]['name']) == (9, 'KS-009')
+    
+    def test_delta_refresh_archives_changes_and_marks_trashed_assets(self):
+        """Test that only changed items are archived, trashed ones deleted and the mark advanced"""
+        from datetime import datetime
+        
+        last_full_sync = datetime.now()
+        state = {itemtype: {'last_date_mod': '2024-06-07 10:00:00', 'last_full_sync': last_full_sync}
+                 for itemtype in ('Computer', 'NetworkEquipment', 'Printer')}
+        changed = {'Computer': [{'name': 'KS-001', 'date_mod': '2024-06-07 10:30:00'}]}
+        trashed = {'Printer': [{'name': 'PRN-09', 'date_mod': '2024-06-07 10:20:00'}]}
+        
+        fetch, archive, mark_deleted, save_state = self._refresh(state, changed, trashed)
+        
+        assert {call[1]['since'] for call in fetch.call_args_list} == {'2024-06-07 09:59:00'}
+        archive.assert_called_once_with(changed['Computer'], [], [])
+        mark_deleted.assert_called_once_with(['PRN-09'])
+        saved = {call[0][0]: call[0][1:] for call in save_state.call_args_list}
+        assert saved['Computer'] == ('2024-06-07 10:30:00', last_full_sync)
+        assert saved['Printer'] == ('2024-06-07 10:20:00', last_full_sync)
+        assert saved['NetworkEquipment'] == ('2024-06-07 10:00:00', last_full_sync)
+    
+    def test_missing_or_old_state_falls_back_to_full_sync(self):
+        """Test that itemtypes without a mark or past the full sync interval are fetched in full"""
+        from datetime import datetime, timedelta
+        
+        state = {'Printer': {'last_date_mod': '2024-06-07 10:00:00',
+                             'last_full_sync': datetime.now() - timedelta(days=2)}}
+        changed = {'Computer': [{'name': 'KS-001', 'date_mod': '2024-06-01 08:00:00'}]}
+        
+        fetch, _, _, save_state = self._refresh(state, changed, {})
+        
+        assert {call[1]['since'] for call in fetch.call_args_list} == {None}
+        saved = {call[0][0]: call[0][1:] for call in save_state.call_args_list}
+        assert saved['Computer'][0] == '2024-06-01 08:00:00'
+        assert saved['NetworkEquipment'][0] is None
+        assert all(last_full_sync is not None for _, last_full_sync in saved.values())
+    
+    def test_failed_fetch_keeps_the_previous_mark(self):
+        """Test that an itemtype whose fetch fails is not archived and its mark is not saved"""
+        from datetime import datetime
+        
+        state = {itemtype: {'last_date_mod': '2024-06-07 10:00:00', 'last_full_sync': datetime.now()}
+                 for itemtype in ('Computer', 'NetworkEquipment', 'Printer')}
+        changed = {'Computer': [{'name': 'KS-001', 'date_mod': '2024-06-07 10:30:00'}],
+                   'Printer': requests.exceptions.RequestException('Printer failed with HTTP 500')}
+        
+        _, archive, _, save_state = self._refresh(state, changed, {})
+        
+        archive.assert_called_once_with(changed['Computer'], [], [])
+        assert sorted(call[0][0] for call in save_state.call_args_list) == ['Computer', 'NetworkEquipment']
+    
+    def test_strict_expanded_fetch_raises_on_http_errors(self):
+        """Test that a failed page raises in strict mode, while a range past the end ends the list"""
+        from modules.external.glpi import GLPIClient
+        from modules.external.glpi_http import glpi_http
+        
+        full_page = glpi_response(206, [{'id': 1, 'name': 'PRN-01'}])
+        past_end = glpi_response(400, ['ERROR_RANGE_EXCEED_TOTAL', 'Provided range exceed total count of data: 1'])
+        
+        with patch.object(glpi_http.session, 'get', side_effect=[full_page, past_end]):
+            assert len(GLPIClient().get_items_expanded('Printer', {}, limit=1, strict=True)) == 1
+        with patch.object(glpi_http.session, 'get', return_value=glpi_response(500, {})):
+            with pytest.raises(requests.exceptions.RequestException):
+                GLPIClient().get_items_expanded('Printer', {}, strict=True)
@@ -9,6 +9,7 @@ import json
 from unittest.mock import patch, Mock
 import requests
 from requests.exceptions import Timeout, ConnectionError
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 
@@ -270,3 +271,668 @@ class TestGraylogAPI:
         response = client.get('/api/graylog/messages')
         # Should either work (if logged in via fixtures) or require auth
         assert response.status_code in [200, 302, 401, 403]
+
+
+@contextmanager
+def _ingest_lock_acquired():
+    yield True
+
+
+def _stored_mark(ingestor, mark):
+    """Patch the ingest lock and the mark table with an in-memory mark"""
+    saved = {'mark': mark}
+    return (patch.object(ingestor, '_ingest_lock', _ingest_lock_acquired),
+            patch.object(ingestor, '_load_mark', side_effect=lambda: (saved['mark'][0], set(saved['mark'][1]))),
+            patch.object(ingestor, '_save_mark', side_effect=lambda: saved.update(mark=ingestor._mark)))
+
+
+class TestGraylogIngest:
+    """Test cases for incremental Graylog ingestion."""
+
+    def test_ingest_fetches_only_messages_after_high_water_mark(self):
+        """Test that a second run skips messages already ingested at the boundary."""
+        from modules.external import graylog
+        
+        messages = [
+            {'message': {'_id': f'id{i}', 'timestamp': f'2024-06-07T10:00:0{i // 2}.000Z',
+                         'message': f'worker - request {i}'}}
+            for i in range(6)
+        ]
+        searches = []
+        
+        def search(url, params=None, **kwargs):
+            searches.append(params['from'])
+            response = Mock()
+            response.json.return_value = {'messages': [
+                m for m in messages if m['message']['timestamp'] >= params['from']
+            ][params['offset']:params['offset'] + params['limit']]}
+            return response
+        
+        ingestor = graylog.GraylogIngestor(page_size=4, delay=0)
+        ingestor.session.get = search
+        stored = []
+        
+        def store(messages, events, batch_size):
+            stored.extend(messages)
+            return {'rows': len(messages) + len(events), 'duration': 0.01, 'rows_per_sec': 0.0}
+        
+        ingest_lock, load_mark, save_mark = _stored_mark(ingestor, ('2024-06-07T10:00:00.000Z', set()))
+        with patch.object(graylog, 'store_graylog_batch', side_effect=store), ingest_lock, load_mark, save_mark:
+            assert ingestor.ingest() == 6
+            assert ingestor.ingest() == 0
+        
+        assert [m['message_id'] for m in stored] == [f'id{i}' for i in range(6)]
+        assert searches[-1] == '2024-06-07T10:00:02.000Z'
+        assert ingestor.get_stats()['high_water_mark'] == '2024-06-07T10:00:02.000Z'
+
+    def test_remaining_pages_are_fetched_concurrently_and_stored_in_order(self):
+        """Test that pages after the first are fetched in parallel but written in offset order."""
+        import threading
+        import time
+        from modules.external import graylog
+        
+        messages = [
+            {'message': {'_id': f'id{i}', 'timestamp': f'2024-06-07T10:00:0{i}.000Z',
+                         'message': f'worker - request {i}'}}
+            for i in range(7)
+        ]
+        offsets = []
+        in_flight = {'now': 0, 'max': 0}
+        lock = threading.Lock()
+        
+        def search(url, params=None, **kwargs):
+            with lock:
+                offsets.append(params['offset'])
+                in_flight['now'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            # Późniejsze strony wracają szybciej
+            time.sleep(0.05 if params['offset'] == 0 else 0.2 / params['offset'])
+            with lock:
+                in_flight['now'] -= 1
+            response = Mock()
+            response.json.return_value = {
+                'total_results': len(messages),
+                'messages': messages[params['offset']:params['offset'] + params['limit']]
+            }
+            return response
+        
+        ingestor = graylog.GraylogIngestor(page_size=2, delay=0, workers=3)
+        ingestor.session.get = search
+        stored = []
+        
+        def store(messages, events, batch_size):
+            stored.extend(messages)
+            return {'rows': len(messages), 'duration': 0.01, 'rows_per_sec': 0.0}
+        
+        ingest_lock, load_mark, save_mark = _stored_mark(ingestor, ('2024-06-07T09:59:59.000Z', set()))
+        with patch.object(graylog, 'store_graylog_batch', side_effect=store), ingest_lock, load_mark, save_mark:
+            assert ingestor.ingest() == 7
+        
+        assert sorted(offsets) == [0, 2, 4, 6]
+        assert in_flight['max'] > 1
+        assert [m['message_id'] for m in stored] == [f'id{i}' for i in range(7)]
+        assert ingestor.get_stats()['high_water_mark'] == '2024-06-07T10:00:06.000Z'
+
+    def test_ingest_rereads_the_mark_and_skips_while_another_worker_ingests(self):
+        """Test that each run starts from the stored mark and a held lock skips the run."""
+        from modules.external import graylog
+        
+        @contextmanager
+        def lock_taken():
+            yield False
+        
+        ingestor = graylog.GraylogIngestor(delay=0)
+        ingestor.session.get = Mock(side_effect=AssertionError('no search while another worker ingests'))
+        with patch.object(ingestor, '_ingest_lock', lock_taken), patch.object(ingestor, '_load_mark') as load_mark:
+            assert ingestor.ingest() == 0
+        load_mark.assert_not_called()
+        
+        searches = []
+        
+        def search(url, params=None, **kwargs):
+            searches.append(params['from'])
+            return Mock(**{'json.return_value': {'messages': []}})
+        
+        ingestor.session.get = search
+        ingest_lock, load_mark, save_mark = _stored_mark(ingestor, ('2024-06-07T10:00:00.000Z', set()))
+        with ingest_lock, load_mark as load, save_mark:
+            ingestor.ingest()
+            # Inny worker przesunął znacznik w bazie
+            load.side_effect = lambda: ('2024-06-07T10:05:00.000Z', set())
+            ingestor.ingest()
+        assert searches == ['2024-06-07T10:00:00.000Z', '2024-06-07T10:05:00.000Z']
+
+    def test_message_that_fails_processing_is_skipped_and_the_mark_advances(self):
+        """Test that one unprocessable message does not stall ingestion at the same mark."""
+        from modules.external import graylog
+        
+        messages = [
+            {'message': {'_id': f'id{i}', 'timestamp': f'2024-06-07T10:00:0{i}.000Z',
+                         'message': f'worker - request {i}'}}
+            for i in range(3)
+        ]
+        
+        def search(url, params=None, **kwargs):
+            return Mock(**{'json.return_value': {'messages': [
+                m for m in messages if m['message']['timestamp'] >= params['from']
+            ]}})
+        
+        def process(msg):
+            if msg['message']['_id'] == 'id2':
+                raise ValueError('unexpected payload')
+            return real_process(msg)
+        
+        real_process = graylog.process_message
+        ingestor = graylog.GraylogIngestor(page_size=10, delay=0)
+        ingestor.session.get = search
+        stored = []
+        
+        def store(messages, events, batch_size):
+            stored.extend(messages)
+            return {'rows': len(messages), 'duration': 0.01, 'rows_per_sec': 0.0}
+        
+        ingest_lock, load_mark, save_mark = _stored_mark(ingestor, ('2024-06-07T09:59:59.000Z', set()))
+        with patch.object(graylog, 'store_graylog_batch', side_effect=store), \
+                patch.object(graylog, 'process_message', side_effect=process), ingest_lock, load_mark, save_mark:
+            assert ingestor.ingest() == 2
+            # Wadliwa wiadomość była ostatnia - kolejne pobranie jej nie powtarza
+            assert ingestor.ingest() == 0
+        
+        assert [m['message_id'] for m in stored] == ['id0', 'id1']
+        stats = ingestor.get_stats()
+        assert stats['high_water_mark'] == '2024-06-07T10:00:02.000Z'
+        assert stats['skipped_messages'] == 1
+
+    def test_ingest_lock_is_held_on_a_connection_outside_the_pool(self):
+        """Test that the long-held GET_LOCK does not take a pooled connection."""
+        from modules.core import database
+        from modules.external import graylog
+        
+        conn = Mock()
+        cursor = conn.cursor.return_value
+        cursor.fetchone.return_value = {'acquired': 1}
+        ingestor = graylog.GraylogIngestor(delay=0)
+        
+        with patch.object(database.mysql.connector, 'connect', create=True, return_value=conn) as connect, \
+                patch.object(database, 'connection_pool') as pool:
+            with ingestor._ingest_lock() as acquired:
+                assert acquired
+                conn.close.assert_not_called()
+        
+        pool.get_connection.assert_not_called()
+        assert not any(key.startswith('pool_') for key in connect.call_args[1])
+        assert [call[0][0].split('(')[0] for call in cursor.execute.call_args_list] == \
+            ['SELECT GET_LOCK', 'SELECT RELEASE_LOCK']
+        conn.close.assert_called_once()
+
+    def test_store_page_writes_messages_and_system_logs_in_one_batch(self):
+        """Test that a page is written with one bulk call including the system_logs mirror."""
+        from modules.external import graylog
+        
+        processed = [graylog.process_message({'message': {'_id': f'id{i}', 'timestamp': '2024-06-07T10:00:00.000Z',
+                                                          'message': text}})
+                     for i, text in enumerate(['worker - Error: failed', 'wls - status ok'])]
+        ingestor = graylog.GraylogIngestor(delay=0, write_batch_size=500)
+        
+        with patch.object(graylog, 'store_graylog_batch',
+                          return_value={'rows': 4, 'duration': 0.5, 'rows_per_sec': 8.0}) as store:
+            ingestor._store_page(processed)
+        
+        store.assert_called_once()
+        messages, events, batch_size = store.call_args[0]
+        assert messages == processed
+        assert [(event[0], event[1]) for event in events] == [('graylog', 'critical'), ('graylog', 'info')]
+        assert batch_size == 500
+        assert ingestor.get_stats()['rows_written'] == 4
+
+
+class TestLogClassifier:
+    """Test cases for the compiled severity/category classifier."""
+
+    def test_default_rules_keep_first_match_priority(self):
+        """Test that severity and category follow the order of the rules."""
+        from modules.utils.log_classifier import log_classifier
+        
+        assert log_classifier.classify('Unexpected ERROR after timeout', 'INFO') == ('high', 'System Error')
+        assert log_classifier.classify('Warning: access denied', 'INFO') == ('medium', 'Security Alert')
+        assert log_classifier.classify('Service started', 'ERROR') == ('high', 'Service Status')
+        assert log_classifier.classify('Slow query', 'WARN') == ('medium', 'Performance Issue')
+        assert log_classifier.classify('Session opened', 'INFO') == ('low', 'General Warning')
+
+    def test_custom_rules_match_overlapping_keywords(self):
+        """Test that keywords sharing characters are all found in one message."""
+        from modules.utils.log_classifier import LogClassifier
+        
+        classifier = LogClassifier({
+            'severity': [{'value': 'critical', 'keywords': ['panic']}],
+            'default_severity': 'info',
+            'category': [
+                {'value': 'Disk', 'keywords': ['diskfull']},
+                {'value': 'Kernel', 'keywords': ['kernel']},
+                {'value': 'Fuller', 'keywords': ['fuller']}
+            ],
+            'default_category': 'Other'
+        })
+        
+        assert classifier.classify('kernel panic: diskfuller') == ('critical', 'Disk')
+        assert classifier.classify('diskfuller') == ('info', 'Disk')
+        assert classifier.classify('disk fuller') == ('info', 'Fuller')
+
+
+class TestGraylogParser:
+    """Test cases for the fast-path payload parser."""
+
+    def test_parse_nested_json_plain_text_and_truncated_payloads(self):
+        """Test that each payload shape is parsed without raising."""
+        from modules.external.graylog_parser import parse_log_message
+        
+        nested = parse_log_message({'message': '4711 - {"formsDbSessionId": "42", "type": "ERROR", '
+                                               '"message": " ORA-01017 "}'})
+        assert nested['process_id'] == '4711'
+        assert nested['formsdbsessionid'] == '42'
+        assert nested['type'] == 'ERROR'
+        assert nested['message'] == 'ORA-01017'
+        
+        assert parse_log_message({'message': 'WLS_FORMS - Server state RUNNING'}) == \
+            {'message': 'WLS_FORMS - Server state RUNNING'}
+        assert parse_log_message({'message': '4711 - {"type": "INFO", "mess'}) == \
+            {'message': '4711 - {"type": "INFO", "mess'}
+        assert parse_log_message('plain text line') == {'message': 'plain text line'}
+
+    def test_cached_payload_is_returned_as_copy(self):
+        """Test that callers cannot modify the memoized result."""
+        from modules.external.graylog_parser import parse_log_message
+        
+        fields = {'message': 'wls1 - {"type": "INFO", "message": "Heartbeat OK"}'}
+        first = parse_log_message(fields)
+        first['message'] = 'changed'
+        
+        assert parse_log_message(fields)['message'] == 'Heartbeat OK'
+
+    def test_long_payloads_are_parsed_without_caching(self):
+        """Test that payloads above the size limit do not enter the cache."""
+        from modules.external.graylog_parser import parse_log_message, get_cache_stats, PAYLOAD_CACHE_MAX_CHARS
+        
+        size = get_cache_stats()['size']
+        text = 'wls1 - {"type": "ERROR", "message": "' + 'x' * PAYLOAD_CACHE_MAX_CHARS + '"}'
+        
+        assert parse_log_message({'message': text})['type'] == 'ERROR'
+        assert get_cache_stats()['size'] == size
+
+    def test_non_string_message_and_null_type_do_not_raise(self):
+        """Test that unexpected JSON value types fall back instead of aborting the ingest."""
+        from modules.external import graylog
+        from modules.external.graylog_parser import parse_log_message
+        
+        assert parse_log_message({'message': '1234 - {"message": {"a":1}}'}) == \
+            {'message': '1234 - {"message": {"a":1}}'}
+        assert parse_log_message({'message': '1234 - {"message": 42}'})['message'] == '42'
+        
+        processed = graylog.process_message({'message': {'timestamp': '2024-06-07T10:00:00.000Z',
+                                                         'message': '1234 - {"type": null, "message": 42}'}})
+        assert processed['level'] == 'INFO'
+        assert processed['message'] == '42'
+
+
+class TestBoundedCache:
+    """Test cases for the memory-bounded Graylog result cache."""
+
+    def test_lru_entries_are_evicted_to_stay_within_byte_budget(self):
+        """Test that the least recently used entry is evicted when the budget is exceeded."""
+        from modules.core.cache import BoundedCache
+        
+        entry = {'logs': ['x' * 1000]}
+        cache = BoundedCache('test', max_bytes=2500, ttl=60)
+        cache.set('a', entry)
+        cache.set('b', entry)
+        assert cache.get('a') == entry
+        cache.set('c', entry)
+        
+        assert cache.get('b') is None
+        assert cache.get('a') == entry
+        assert cache.get('c') == entry
+        stats = cache.get_stats()
+        assert stats['evictions'] == 1
+        assert stats['used_bytes'] <= 2500
+        assert (stats['hits'], stats['misses']) == (3, 1)
+
+    def test_expired_entries_and_oversized_values_are_not_returned(self):
+        """Test TTL expiry and rejection of values larger than the whole budget."""
+        from modules.core.cache import BoundedCache
+        
+        cache = BoundedCache('test', max_bytes=500, ttl=60)
+        with patch('modules.core.cache.time.monotonic', return_value=1000.0):
+            cache.set('short', 'value', ttl=5)
+        with patch('modules.core.cache.time.monotonic', return_value=1006.0):
+            assert cache.get('short') is None
+        
+        assert cache.set('big', 'x' * 1000) is False
+        assert cache.get('big') is None
+        assert cache.get_stats()['expirations'] == 1
+        assert cache.get_stats()['rejected'] == 1
+
+    def test_shared_backend_failures_are_not_raised(self):
+        """Test that get, set and delete survive an unavailable shared backend."""
+        from modules.core.cache import BoundedCache
+        
+        backend = Mock()
+        backend.get.side_effect = backend.set.side_effect = backend.delete.side_effect = ConnectionError('down')
+        cache = BoundedCache('test', 1024, 60, backend=backend)
+        
+        assert cache.set('a', 1) is False
+        assert cache.get('a', 'default') == 'default'
+        cache.delete('a')
+        backend.delete.assert_called_once()
+
+    def test_graylog_buffer_keeps_its_interface(self):
+        """Test that GraylogBuffer stores results per time range on top of the cache."""
+        from modules.external.graylog import GraylogBuffer
+        
+        buffer = GraylogBuffer(max_bytes=1024 * 1024, ttl=60)
+        result = {'logs': [], 'time_range': 'Last 5 minutes'}
+        buffer.add_logs(5, result)
+        
+        assert buffer.get_logs(5) == result
+        assert buffer.get_logs(60) is None
+        assert buffer.get_latest_data() == result
+        assert buffer.get_last_refresh() is not None
+        # Wynik zapisany raz - 'latest' jest tylko wskaźnikiem na klucz
+        assert buffer.cache.get('latest') == 'logs:5'
+        buffer.cache.delete('logs:5')
+        assert buffer.get_latest_data() is None
+
+
+class TestGraylogRollups:
+    """Test cases for the pre-aggregated Graylog timeline."""
+
+    def test_stored_messages_update_every_rollup(self):
+        """Test that stored messages are counted per severity in minute, hour and day buckets."""
+        from modules.core import database
+        
+        cursor = Mock()
+        # INSERT IGNORE wstawia wszystkie wiersze
+        cursor.rowcount = 3
+        messages = [
+            {'timestamp': '2024-06-07 10:00:01.000', 'level': 'ERROR', 'severity': 'high',
+             'category': 'System Error', 'message': 'a', 'details': {}},
+            {'timestamp': '2024-06-07 10:00:59.000', 'level': 'INFO', 'severity': 'low',
+             'category': 'General Warning', 'message': 'b', 'details': {}},
+            {'timestamp': '2024-06-07 10:01:00.000', 'level': 'WARN', 'severity': 'medium',
+             'category': 'General Warning', 'message': 'c', 'details': {}}
+        ]
+        
+        database.store_graylog_messages(messages, cursor)
+        
+        rollups = {call[0][0].split()[2]: sorted(call[0][1]) for call in cursor.executemany.call_args_list
+                   if 'graylog_rollup' in call[0][0]}
+        assert rollups['graylog_rollup_minute'] == [('2024-06-07 10:00:00', 1, 0, 1, 2),
+                                                    ('2024-06-07 10:01:00', 0, 1, 0, 1)]
+        assert rollups['graylog_rollup_hour'] == [('2024-06-07 10:00:00', 1, 1, 1, 3)]
+        assert rollups['graylog_rollup_day'] == [('2024-06-07 00:00:00', 1, 1, 1, 3)]
+
+    def test_restoring_the_same_window_is_a_no_op(self):
+        """Test that messages already stored by hash are skipped together with their rollup counts."""
+        from contextlib import contextmanager
+        from modules.core import database
+        from modules.external import graylog
+        
+        class FakeCursor:
+            def __init__(self):
+                self.hashes = set()
+                # Zapisane przez inny proces po początku transakcji - niewidoczne dla SELECT
+                self.concurrent = set()
+                self.rollup_rows = 0
+                self.system_logs = 0
+                self.rowcount = 0
+                self._result = []
+                self._savepoint = set()
+            
+            def execute(self, sql, params=None):
+                if sql.startswith('SAVEPOINT'):
+                    self._savepoint = set(self.hashes)
+                elif sql.startswith('ROLLBACK TO'):
+                    self.hashes = self._savepoint
+                elif 'INTO graylog_messages' in sql:
+                    self.executemany(sql, [params])
+                else:
+                    self._result = [{'message_hash': h} for h in params if h in self.hashes]
+            
+            def fetchall(self):
+                return self._result
+            
+            def executemany(self, sql, rows):
+                if 'INTO graylog_messages' in sql:
+                    # INSERT IGNORE - wiersz z istniejącym hashem jest pomijany
+                    new = [row for row in rows if row[-1] is None or row[-1] not in self.hashes | self.concurrent]
+                    # Wiersze innego procesu są już zatwierdzone - przy READ COMMITTED widoczne dla SELECT
+                    self.hashes.update(row[-1] for row in new)
+                    self.hashes.update(self.concurrent)
+                    self.rowcount = len(new)
+                elif 'graylog_rollup_minute' in sql:
+                    self.rollup_rows += sum(row[4] for row in rows)
+                elif 'system_logs' in sql:
+                    self.system_logs += len(rows)
+        
+        cursor = FakeCursor()
+        
+        @contextmanager
+        def db_cursor():
+            yield cursor
+        
+        window = [graylog.process_message({'message': {'_id': f'0000000{i}-0000-0000-0000-000000000000',
+                                                       'timestamp': '2024-06-07T10:00:00.000Z',
+                                                       'message': f'worker - request {i}'}})
+                  for i in range(3)]
+        window.append(graylog.process_message({'message': {'timestamp': '2024-06-07T10:00:01.000Z',
+                                                           'source': 'forms01', 'message': 'no id'}}))
+        events = [('graylog', 'info', 'unknown', msg['message']) for msg in window]
+        
+        with patch.object(database, 'get_db_cursor', db_cursor):
+            first = database.store_graylog_batch(window, events)
+            second = database.store_graylog_batch(window + window[:1], events + events[:1])
+        
+        assert (first['rows'], first['duplicates']) == (8, 0)
+        assert (second['rows'], second['duplicates']) == (0, 5)
+        assert len(cursor.hashes) == 4
+        assert cursor.rollup_rows == 4
+        assert cursor.system_logs == 4
+        
+        # Wiadomość zapisana równolegle przez inny worker nie jest liczona drugi raz
+        racing = [graylog.process_message({'message': {'_id': f'1000000{i}-0000-0000-0000-000000000000',
+                                                       'timestamp': '2024-06-07T10:00:02.000Z',
+                                                       'message': f'worker - request {i}'}})
+                  for i in range(2)]
+        cursor.concurrent.add(racing[0]['message_hash'])
+        with patch.object(database, 'get_db_cursor', db_cursor):
+            third = database.store_graylog_batch(racing, events[:2])
+        
+        assert (third['rows'], third['duplicates']) == (2, 1)
+        assert cursor.rollup_rows == 5
+        assert cursor.system_logs == 5
+
+    def test_timeline_reads_coarsest_rollup(self):
+        """Test that an hourly timeline is built from the hour rollup with empty buckets filled in."""
+        from datetime import datetime
+        from contextlib import contextmanager
+        from modules.core import database
+        
+        cursor = Mock()
+        cursor.fetchall.return_value = [
+            {'bucket': datetime(2024, 6, 7, 8, 0), 'high_count': 2, 'medium_count': 0,
+             'low_count': 5, 'total_count': 7}
+        ]
+        
+        @contextmanager
+        def db_cursor():
+            yield cursor
+        
+        with patch.object(database, 'get_db_cursor', db_cursor):
+            timeline = database.get_messages_timeline(datetime(2024, 6, 7, 6, 30),
+                                                      datetime(2024, 6, 7, 9, 15), '60 minutes')
+        
+        assert 'graylog_rollup_hour' in cursor.execute.call_args[0][0]
+        assert [row['time_interval'] for row in timeline] == [
+            '2024-06-07 06:00', '2024-06-07 07:00', '2024-06-07 08:00', '2024-06-07 09:00']
+        assert [row['high_count'] for row in timeline] == [0, 0, 2, 0]
+        assert timeline[2]['total_count'] == 7
+
+
+class TestGraylogExport:
+    """Test cases for streaming export ingestion."""
+
+    def test_export_rows_are_stored_in_bounded_batches(self):
+        """Test that CSV export rows, including multi-line messages, are written batch by batch."""
+        import io
+        from modules.external import graylog_export
+        
+        lines = ['timestamp,source,message,_id\r\n']
+        for i in range(5):
+            lines.append(f'2024-06-07T10:00:0{i}.000Z,forms01,"worker - request {i}",id{i}\r\n')
+        lines.append('2024-06-07T10:00:06.000Z,forms01,"worker - Error: failed\nat line 2",id6\r\n')
+        batches = []
+        
+        def store(messages, events, batch_size):
+            batches.append([m['message_id'] for m in messages])
+            assert len(events) == len(messages)
+            return {'rows': 2 * len(messages), 'duplicates': 0, 'duration': 0.01, 'rows_per_sec': 0.0}
+        
+        ingestor = graylog_export.GraylogExportIngestor(batch_size=4)
+        summary = {'read': 0, 'stored': 0, 'duplicates': 0, 'skipped': 0, 'batches': 0,
+                   'errors': 0, 'started': 0}
+        with patch.object(graylog_export, 'store_graylog_batch', side_effect=store), \
+             patch.object(graylog_export, 'process_message', wraps=graylog_export.process_message) as process:
+            ingestor.ingest_rows(graylog_export.iter_csv_rows(io.StringIO(''.join(lines), newline='')), summary)
+        
+        assert batches == [['id0', 'id1', 'id2', 'id3'], ['id4', 'id6']]
+        assert summary['read'] == 6
+        assert summary['stored'] == 6
+        last = process.call_args[0][0]['message']
+        assert last['message'] == 'worker - Error: failed\nat line 2'
+
+    def test_broken_export_stream_fails_only_its_chunk(self):
+        """Test that a connection dropped while reading the stream is reported and the run goes on."""
+        import io
+        from datetime import timezone
+        import urllib3
+        from modules.external import graylog_export
+        
+        class BrokenStream(io.BufferedIOBase):
+            def readable(self):
+                return True
+            
+            def read(self, size=-1):
+                raise urllib3.exceptions.ReadTimeoutError(None, None, 'Read timed out')
+            
+            read1 = read
+        
+        def stream(start, end):
+            if start.hour == 10:
+                raise requests.exceptions.ConnectionError('Connection broken')
+            yield 'timestamp,source,message,_id\r\n'
+        
+        response = Mock()
+        response.raw = BrokenStream()
+        ingestor = graylog_export.GraylogExportIngestor(chunk_hours=1)
+        with patch.object(ingestor.session, 'get', return_value=response):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                list(ingestor.stream_export(datetime(2024, 6, 7, 10, tzinfo=timezone.utc),
+                                            datetime(2024, 6, 7, 11, tzinfo=timezone.utc)))
+        
+        with patch.object(ingestor, 'stream_export', side_effect=stream):
+            summary = ingestor.run(datetime(2024, 6, 7, 10, tzinfo=timezone.utc),
+                                   datetime(2024, 6, 7, 12, tzinfo=timezone.utc))
+        assert summary['errors'] == 1
+
+    def test_ndjson_rows_accept_search_result_entries(self):
+        """Test that NDJSON lines with bare fields or wrapped search results are both read."""
+        from modules.external.graylog_export import iter_ndjson_rows
+        
+        rows = list(iter_ndjson_rows([
+            '{"timestamp": "2024-06-07T10:00:00.000Z", "message": "a", "_id": "id0"}',
+            '',
+            '{"message": {"timestamp": "2024-06-07T10:00:01.000Z", "message": "b", "_id": "id1"}}',
+            'not json'
+        ]))
+        
+        assert [row['_id'] for row in rows] == ['id0', 'id1']
+
+
+
+class TestLogTemplates:
+    """Test cases for log template mining and grouped views."""
+
+    def test_similar_messages_share_a_template_with_parameters(self):
+        """Test that messages differing in variable tokens join one template and keep its first id."""
+        from modules.utils.log_templates import TemplateMiner
+        
+        miner = TemplateMiner(similarity=0.5)
+        first_id, template, params = miner.add('Executing query on block EMP returned 12 rows')
+        second_id, _, _ = miner.add('Executing query on block DEPT returned 7 rows')
+        third_id, template, params = miner.add('Executing query on block ORDERS returned 500 rows')
+        other_id, other, _ = miner.add('Session closed by user')
+        
+        assert first_id == second_id == third_id != other_id
+        assert template == 'Executing query on block <*> returned <*> rows'
+        assert params == ['ORDERS', '500']
+        assert other == 'Session closed by user'
+        assert miner.add('') == (None, None, [])
+        
+        # Po restarcie szablony odtworzone z bazy zachowują identyfikator
+        restored = TemplateMiner(similarity=0.5)
+        assert restored.load([(first_id, template), (other_id, other)]) == 2
+        assert restored.add('Executing query on block EMP returned 3 rows')[0] == first_id
+
+    def test_stored_messages_update_template_registry_and_rollups(self):
+        """Test that new messages are counted per template and bucket."""
+        from modules.core import database
+        
+        cursor = Mock()
+        # INSERT IGNORE wstawia wszystkie wiersze
+        cursor.rowcount = 3
+        messages = [
+            {'timestamp': '2024-06-07 10:00:01.000', 'level': 'ERROR', 'severity': 'high',
+             'category': 'System Error', 'message': 'error 1', 'details': {},
+             'template_id': 11, 'template': 'error <*>'},
+            {'timestamp': '2024-06-07 10:02:00.000', 'level': 'INFO', 'severity': 'low',
+             'category': 'System Error', 'message': 'error 2', 'details': {},
+             'template_id': 11, 'template': 'error <*>'},
+            {'timestamp': '2024-06-07 10:02:30.000', 'level': 'INFO', 'severity': 'low',
+             'category': 'General Warning', 'message': '', 'details': {},
+             'template_id': None, 'template': None}
+        ]
+        
+        database.store_graylog_messages(messages, cursor)
+        
+        calls = {call[0][0].split('INTO')[1].split()[0]: sorted(call[0][1])
+                 for call in cursor.executemany.call_args_list}
+        assert calls['graylog_templates'] == [
+            (11, 'error <*>', '2024-06-07 10:00:01', '2024-06-07 10:02:00', 2)]
+        assert calls['graylog_template_rollup_minute'] == [('2024-06-07 10:00:00', 11, 1, 0, 0, 1),
+                                                           ('2024-06-07 10:02:00', 11, 0, 0, 1, 1)]
+        assert calls['graylog_template_rollup_hour'] == [('2024-06-07 10:00:00', 11, 1, 0, 1, 2)]
+        assert [row[6] for row in calls['graylog_messages']] == [11, 11, None]
+
+    def test_top_templates_use_hour_rollup_for_long_windows(self):
+        """Test that a day-long window reads whole hours from the hour rollup."""
+        from datetime import datetime
+        from contextlib import contextmanager
+        from modules.core import database
+        
+        cursor = Mock()
+        cursor.fetchall.return_value = [
+            {'template_id': 11, 'template': 'error <*>', 'first_seen': datetime(2024, 6, 6, 9, 0),
+             'last_seen': datetime(2024, 6, 7, 10, 2), 'high_count': 3, 'medium_count': 0,
+             'low_count': 2, 'total_count': 5}
+        ]
+        
+        @contextmanager
+        def db_cursor():
+            yield cursor
+        
+        with patch.object(database, 'get_db_cursor', db_cursor):
+            templates = database.get_top_templates(datetime(2024, 6, 6, 10, 30), datetime(2024, 6, 7, 10, 30), 20)
+        
+        sql, params = cursor.execute.call_args[0]
+        assert 'graylog_template_rollup_hour' in sql
+        assert params == (datetime(2024, 6, 6, 10, 0), datetime(2024, 6, 7, 10, 30), 20)
+        assert templates[0]['total_count'] == 5
@@ -3,23 +3,39 @@ Integration tests for Zabbix API endpoints.
 Tests the /api/zabbix/refresh endpoint with various scenarios.
 """
 import pytest
+import copy
 import json
 from unittest.mock import patch, Mock
 import requests
 from requests.exceptions import Timeout, ConnectionError
 
 
+def zabbix_api_responder(api_response, trigger_result=None):
+    """Build a Session.post side effect answering single and batch JSON-RPC calls."""
+    def respond(url, json=None, **kwargs):
+        def answer(payload):
+            if payload['method'] == 'trigger.get':
+                return {"jsonrpc": "2.0", "result": trigger_result or [], "id": payload['id']}
+            return {**api_response, "id": payload['id']}
+        
+        response = Mock()
+        response.status_code = 200
+        if isinstance(json, list):
+            response.json.return_value = [answer(payload) for payload in json]
+        else:
+            response.json.return_value = answer(json)
+        return response
+    return respond
+
+
 class TestZabbixAPI:
     """Test cases for Zabbix API integration."""
 
     def test_zabbix_hosts_success(self, client, mock_zabbix_response):
         """Test successful retrieval of Zabbix hosts."""
-        with patch('modules.external.zabbix.requests.post') as mock_post:
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
             # Configure mock response
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.json.return_value = mock_zabbix_response
-            mock_post.return_value = mock_response
+            mock_post.side_effect = zabbix_api_responder(mock_zabbix_response)
             
             # Make request to API endpoint
             response = client.get('/api/zabbix/refresh')
@@ -43,15 +59,17 @@ class TestZabbixAPI:
             assert 'cpu' in host['metrics']
             assert 'memory' in host['metrics']
             
-            # Verify API was called with correct parameters
+            # Verify hosts and alerts were fetched in a single batch request
             mock_post.assert_called_once()
             call_args = mock_post.call_args
-            assert call_args[1]['json']['method'] == 'host.get'
-            assert 'auth' in call_args[1]['json']
+            batch = call_args[1]['json']
+            assert isinstance(batch, list)
+            assert [call['method'] for call in batch] == ['host.get', 'trigger.get']
+            assert all('auth' in call for call in batch)
 
     def test_zabbix_hosts_unauthorized(self, client, mock_auth_error):
         """Test Zabbix API with invalid authentication token."""
-        with patch('modules.external.zabbix.requests.post') as mock_post:
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
             mock_post.return_value = mock_auth_error
             
             response = client.get('/api/zabbix/refresh')
@@ -65,7 +83,7 @@ class TestZabbixAPI:
             
     def test_zabbix_hosts_forbidden(self, client, mock_forbidden_error):
         """Test Zabbix API with insufficient permissions."""
-        with patch('modules.external.zabbix.requests.post') as mock_post:
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
             mock_post.return_value = mock_forbidden_error
             
             response = client.get('/api/zabbix/refresh')
@@ -91,11 +109,8 @@ class TestZabbixAPI:
             "id": 1
         }
         
-        with patch('modules.external.zabbix.requests.post') as mock_post:
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.json.return_value = malformed_response
-            mock_post.return_value = mock_response
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
+            mock_post.side_effect = zabbix_api_responder(malformed_response)
             
             response = client.get('/api/zabbix/refresh')
             
@@ -107,11 +122,8 @@ class TestZabbixAPI:
 
     def test_zabbix_hosts_data_format_validation(self, client, mock_zabbix_response):
         """Test that Zabbix host data conforms to expected format."""
-        with patch('modules.external.zabbix.requests.post') as mock_post:
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.json.return_value = mock_zabbix_response
-            mock_post.return_value = mock_response
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
+            mock_post.side_effect = zabbix_api_responder(mock_zabbix_response)
             
             response = client.get('/api/zabbix/refresh')
             
@@ -147,3 +159,369 @@ class TestZabbixAPI:
                     for alert in alerts:
                         assert isinstance(alert, dict)
                         assert 'description' in alert
+
+    def test_zabbix_hosts_served_from_poller_snapshot(self, client, mock_zabbix_response):
+        """Test that a published poller snapshot is served without calling Zabbix."""
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
+            mock_post.side_effect = zabbix_api_responder(mock_zabbix_response)
+            
+            # First request seeds the snapshot, the second one only reads it
+            first = client.get('/api/zabbix/refresh')
+            second = client.get('/api/zabbix/refresh')
+            
+            assert first.status_code == 200
+            assert second.status_code == 200
+            assert json.loads(first.data) == json.loads(second.data)
+            mock_post.assert_called_once()
+
+    def test_zabbix_data_unknown_hosts_from_same_batch(self, client, mock_zabbix_response):
+        """Test that /api/data derives unknown hosts from the batched host.get result."""
+        mock_zabbix_response['result'][0]['interfaces'][0]['available'] = '2'
+        
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post, \
+             patch('app.get_logs') as mock_get_logs:
+            mock_post.side_effect = zabbix_api_responder(mock_zabbix_response)
+            mock_get_logs.return_value = {}
+            
+            response = client.get('/api/data')
+            
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['unknown'] == [{'hostid': '10001', 'name': 'test-server-01'}]
+            mock_post.assert_called_once()
+
+    def test_zabbix_metrics_kept_numeric(self, client, mock_zabbix_response):
+        """Test that raw metric values are kept as numbers and formatted separately."""
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
+            mock_post.side_effect = zabbix_api_responder(mock_zabbix_response)
+            
+            response = client.get('/api/zabbix/refresh')
+            
+            assert response.status_code == 200
+            host = json.loads(response.data)['result'][0]
+            assert host['metric_values']['cpu'] == {'value': 25.5, 'unit': '%'}
+            assert host['metric_values']['memory'] == {'value': 8589934592.0, 'unit': 'B'}
+            assert host['metrics']['cpu'] == '25.50%'
+            assert host['metrics']['memory'] == '8.00 GB'
+            assert host['metrics']['disk'] == 'Brak danych'
+
+    def test_zabbix_metrics_per_filesystem_series(self, client, mock_zabbix_response):
+        """Test that every filesystem gets its own series and the disk family is summed."""
+        mock_zabbix_response['result'][0]['items'].extend([
+            {"name": "Total disk space on /", "key_": "vfs.fs.size[/,total]",
+             "lastvalue": "10737418240", "units": "B"},
+            {"name": "Total disk space on /var", "key_": "vfs.fs.size[/var,total]",
+             "lastvalue": "21474836480", "units": "B"}
+        ])
+        
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
+            mock_post.side_effect = zabbix_api_responder(mock_zabbix_response)
+            
+            response = client.get('/api/zabbix/refresh')
+            
+            assert response.status_code == 200
+            host = json.loads(response.data)['result'][0]
+            assert host['metric_values']['disk[/]']['value'] == 10737418240.0
+            assert host['metric_values']['disk[/var]']['value'] == 21474836480.0
+            assert host['metric_values']['disk']['value'] == 32212254720.0
+            assert host['metrics']['disk'] == '30.00 GB'
+
+    def test_interface_error_counters_do_not_change_bandwidth(self):
+        """Test that errors/dropped items of an interface are not classified as bandwidth."""
+        from modules.external.zabbix_metrics import MetricKeyRegistry, DEFAULT_METRIC_RULES
+        
+        registry = MetricKeyRegistry(DEFAULT_METRIC_RULES)
+        items = [
+            {'key_': 'net.if.in[eth0]', 'lastvalue': '8000', 'units': 'bps'},
+            {'key_': 'net.if.out[eth0,bytes]', 'lastvalue': '2000', 'units': 'bps'},
+            {'key_': 'net.if.in[eth0,errors]', 'lastvalue': '3', 'units': ''},
+            {'key_': 'net.if.in[eth0,dropped]', 'lastvalue': '5', 'units': ''},
+            {'key_': 'net.if.out[eth0,errors]', 'lastvalue': '7', 'units': ''}
+        ]
+        
+        metric_values = registry.collect(items)
+        assert registry.classify('net.if.in[eth0,errors]') is None
+        assert metric_values['network_in[eth0]']['value'] == 8000.0
+        assert metric_values['network_in']['value'] == 8000.0
+        assert metric_values['network_out[eth0]']['value'] == 2000.0
+        assert metric_values['network']['value'] == 10000.0
+
+    def test_zabbix_incremental_poll_merges_changed_items(self, client, mock_zabbix_response):
+        """Test that an incremental poll fetches history deltas and merges them into cached items."""
+        items = mock_zabbix_response['result'][0]['items']
+        items[0].update({'itemid': '20001', 'lastclock': '1700000000', 'value_type': '0'})
+        items[1].update({'itemid': '20002', 'lastclock': '1700000000', 'value_type': '3'})
+        history = [{'itemid': '20001', 'clock': '1700000060', 'value': '75.0'}]
+        # Każda odpowiedź dostaje świeżą kopię - poll dopisuje metric_values/alerts do zwróconych hostów
+        fleet = copy.deepcopy(mock_zabbix_response['result'])
+        batches = []
+        history_itemids = []
+        
+        def respond(url, json=None, **kwargs):
+            batches.append([payload['method'] for payload in json])
+            
+            def answer(payload):
+                if payload['method'] == 'history.get':
+                    history_itemids.append(payload['params']['itemids'])
+                    result = history if payload['params']['history'] == 0 else []
+                elif payload['method'] == 'trigger.get':
+                    result = []
+                elif 'selectItems' in payload['params']:
+                    result = copy.deepcopy(fleet)
+                else:
+                    result = [{k: v for k, v in host.items() if k != 'items'}
+                              for host in copy.deepcopy(fleet)]
+                return {"jsonrpc": "2.0", "result": result, "id": payload['id']}
+            
+            response = Mock()
+            response.status_code = 200
+            response.json.return_value = [answer(payload) for payload in json]
+            return response
+        
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post:
+            mock_post.side_effect = respond
+            
+            client.get('/api/zabbix/force_refresh')
+            response = client.get('/api/zabbix/force_refresh')
+            
+            assert response.status_code == 200
+            assert batches[0] == ['host.get', 'trigger.get']
+            assert batches[1] == ['host.get', 'trigger.get', 'history.get', 'history.get']
+            assert history_itemids == [['20001'], ['20002']]
+            host = json.loads(response.data)['result'][0]
+            assert host['metric_values']['cpu']['value'] == 75.0
+            assert host['metric_values']['memory']['value'] == 8589934592.0
+
+    def test_zabbix_incremental_poll_picks_up_late_values(self):
+        """Test that history is queried with an overlap and late values apply per item."""
+        from modules.external.zabbix import ItemDeltaCache
+        
+        cache = ItemDeltaCache(full_resync_interval=900, history_overlap=300)
+        cache.load_full([{'hostid': '10001', 'items': [
+            {'itemid': '1', 'key_': 'system.cpu.util', 'value_type': '0', 'lastclock': '1700000600', 'lastvalue': '10'},
+            {'itemid': '2', 'key_': 'vm.memory.size[total]', 'value_type': '3', 'lastclock': '1700000000',
+             'lastvalue': '20'},
+            {'itemid': '3', 'key_': 'net.if.in[eth0,errors]', 'value_type': '3', 'lastclock': '1700000000',
+             'lastvalue': '0'},
+            {'itemid': '4', 'key_': 'system.hostname', 'value_type': '1', 'lastclock': '1700000000', 'lastvalue': 'web01'}
+        ]}])
+        
+        assert cache.time_from() == 1700000300
+        # history.get tylko dla itemów, z których powstają metryki
+        assert cache.tracked_itemids() == {0: ['1'], 3: ['2']}
+        hosts = [{'hostid': '10001'}]
+        # Item 2 spóźniony (przez proxy), item 1 powtórzony z zakładki
+        assert cache.merge(hosts, [[
+            {'itemid': '2', 'clock': '1700000400', 'value': '21'},
+            {'itemid': '1', 'clock': '1700000500', 'value': '9'}
+        ]])
+        values = {item['itemid']: item['lastvalue'] for item in hosts[0]['items']}
+        assert values == {'1': '10', '2': '21', '3': '0', '4': 'web01'}
+
+    def test_zabbix_sharded_poll_fetches_shards_in_parallel(self, client, mock_zabbix_response):
+        """Test that a sharded full poll requests each host shard separately and keeps host order."""
+        second_host = json.loads(json.dumps(mock_zabbix_response['result'][0]))
+        second_host.update({'hostid': '10002', 'name': 'test-server-02'})
+        fleet = mock_zabbix_response['result'] + [second_host]
+        host_queries = []
+        
+        def respond(url, json=None, **kwargs):
+            params = json['params']
+            if json['method'] == 'trigger.get':
+                result = []
+            elif params.get('output') == ['hostid']:
+                result = [{'hostid': host['hostid']} for host in fleet]
+            else:
+                host_queries.append(params['hostids'])
+                result = [host for host in fleet if host['hostid'] in params['hostids']]
+            response = Mock()
+            response.status_code = 200
+            response.json.return_value = {"jsonrpc": "2.0", "result": result, "id": json['id']}
+            return response
+        
+        with patch('modules.external.zabbix.requests.Session.post') as mock_post, \
+             patch('modules.external.zabbix.ZABBIX_SHARD_SIZE', 1):
+            mock_post.side_effect = respond
+            
+            response = client.get('/api/zabbix/refresh')
+            
+            assert response.status_code == 200
+            assert sorted(host_queries) == [['10001'], ['10002']]
+            hosts = json.loads(response.data)['result']
+            assert [host['hostid'] for host in hosts] == ['10001', '10002']
+            assert hosts[1]['metrics']['cpu'] == '25.50%'
+
+
+class TestZabbixBackfill:
+    """Test cases for the history backfill importer."""
+
+    def test_backfill_skips_checkpointed_chunks(self):
+        """Test that completed chunks are not fetched again and rows are classified."""
+        from datetime import datetime
+        from modules.external import zabbix_backfill
+        
+        client = Mock()
+        client.call.return_value = [
+            {'itemid': '1', 'hostid': '10', 'key_': 'system.cpu.util', 'units': '%', 'value_type': '0'},
+            {'itemid': '2', 'hostid': '10', 'key_': 'proc.num[]', 'units': '', 'value_type': '3'}
+        ]
+        client.batch.side_effect = lambda calls: [
+            [{'itemid': '1', 'clock': str(params['time_from'] + 5), 'value': '42.5'}] for _, params in calls
+        ]
+        backfill = zabbix_backfill.ZabbixBackfill(client=client, workers=2, chunk_hours=6)
+        written = []
+        
+        with patch.object(zabbix_backfill, 'setup_backfill_table'), \
+             patch.object(backfill, 'completed_chunks',
+                          return_value={('10', datetime(2024, 5, 1, 0, 0)): datetime(2024, 5, 1, 6, 0)}), \
+             patch.object(backfill, 'write_chunk', side_effect=lambda *args: written.append(args) or len(args[-1])):
+            summary = backfill.run(datetime(2024, 5, 1, 0, 0), datetime(2024, 5, 1, 12, 0))
+        
+        assert summary['skipped'] == 1
+        assert summary['chunks'] == 1
+        assert client.batch.call_count == 1
+        host_id, source, start, end, rows = written[0]
+        assert (host_id, start, end) == ('10', datetime(2024, 5, 1, 6, 0), datetime(2024, 5, 1, 12, 0))
+        assert [(row[1], row[2]) for row in rows] == [('cpu', 42.5)]
+
+    def test_backfill_chunks_lie_on_a_fixed_grid(self):
+        """Test that chunk boundaries do not depend on the requested range."""
+        from datetime import datetime, timedelta
+        from modules.external.zabbix_backfill import split_range
+        
+        chunks = list(split_range(datetime(2024, 5, 1, 3, 30), datetime(2024, 5, 1, 13, 0), timedelta(hours=6)))
+        
+        assert [start for start, _ in chunks] == [
+            datetime(2024, 5, 1, 0, 0), datetime(2024, 5, 1, 6, 0), datetime(2024, 5, 1, 12, 0)]
+        assert chunks[-1][1] == datetime(2024, 5, 1, 13, 0)
+
+    def test_backfill_write_skips_existing_buckets(self):
+        """Test that rows already stored for a metric bucket are not inserted again."""
+        from contextlib import contextmanager
+        from datetime import datetime
+        from modules.external import zabbix_backfill
+        
+        cursor = Mock()
+        cursor.fetchall.return_value = [{'metric_type': 'cpu', 'timestamp': datetime(2024, 5, 1, 6, 0, 42)}]
+        
+        @contextmanager
+        def db_cursor():
+            yield cursor
+        
+        rows = [('10', 'cpu', 42.5, 42.5, '%', datetime(2024, 5, 1, 6, 0), None),
+                ('10', 'cpu', 40.0, 40.0, '%', datetime(2024, 5, 1, 6, 1), None)]
+        backfill = zabbix_backfill.ZabbixBackfill(client=Mock(), chunk_hours=6)
+        with patch.object(zabbix_backfill, 'get_db_cursor', db_cursor):
+            inserted = backfill.write_chunk('10', 'history', datetime(2024, 5, 1, 6, 0),
+                                            datetime(2024, 5, 1, 12, 0), rows)
+        
+        assert inserted == 1
+        assert cursor.executemany.call_args[0][1] == rows[1:]
+        assert cursor.execute.call_args[0][1][4] == 2
+
+
+class TestProblemState:
+    """Test cases for the Zabbix problem open/close tracker."""
+
+    def test_transitions_logged_only_for_rows_this_worker_changed(self):
+        """Test that a transition already applied by another worker is not logged again."""
+        from contextlib import contextmanager
+        from datetime import datetime
+        from modules.external import zabbix_state
+        
+        cursor = Mock()
+        cursor.fetchall.return_value = [
+            {'host_id': '10001', 'trigger_key': '500', 'host_name': 'srv-01', 'description': 'Disk full',
+             'severity': 'warning', 'opened_at': datetime(2024, 5, 1, 10, 0)},
+            {'host_id': '10001', 'trigger_key': '501', 'host_name': 'srv-01', 'description': 'High load',
+             'severity': 'warning', 'opened_at': datetime(2024, 5, 1, 10, 0)}
+        ]
+        # DELETE 500: 1 wiersz, DELETE 501: usunięty już przez inny worker, INSERT 502: 1 wiersz
+        rowcounts = iter([None, 1, 0, 1])
+        cursor.execute.side_effect = lambda *args: setattr(cursor, 'rowcount', next(rowcounts))
+        
+        @contextmanager
+        def db_cursor():
+            yield cursor
+        
+        hosts = [{'hostid': '10001', 'name': 'srv-01', 'triggers': [
+            {'triggerid': '502', 'description': 'Service down', 'status': '0', 'state': '1', 'priority': '4'}
+        ]}]
+        tracker = zabbix_state.AlertStateTracker()
+        with patch.object(zabbix_state, 'setup_zabbix_state_table'), \
+             patch.object(zabbix_state, 'get_db_cursor', db_cursor), \
+             patch.object(zabbix_state, 'log_system_events') as log_events:
+            result = tracker.process_poll(hosts)
+        
+        assert result == {'opened': [('10001', '502')], 'closed': [('10001', '500')]}
+        events = log_events.call_args[0][0]
+        assert len(events) == 2
+        assert events[0][3].startswith('Resolved: Disk full (open for')
+        assert events[1][1:] == ('critical', 'srv-01', 'Service down')
+
+
+class TestHostStatusSLA:
+    """Test cases for availability computed from status transitions."""
+
+    def test_availability_from_transitions(self):
+        """Test that time is split between transitions and repeated statuses are ignored."""
+        from datetime import datetime
+        from modules.reports.sla import compute_availability
+        
+        transitions = [
+            (datetime(2024, 1, 1, 6, 0), 'unavailable'),
+            (datetime(2024, 1, 1, 7, 0), 'unavailable'),
+            (datetime(2024, 1, 1, 12, 0), 'available')
+        ]
+        sla = compute_availability(transitions, datetime(2024, 1, 1), datetime(2024, 1, 2), 'available')
+        
+        assert sla['availability'] == 75.0
+        assert sla['unavailable_seconds'] == 6 * 3600
+        assert sla['transitions'] == 2
+
+    def test_availability_excludes_time_without_data(self):
+        """Test that the period before the first known status is reported as unknown."""
+        from datetime import datetime
+        from modules.reports.sla import compute_availability
+        
+        sla = compute_availability([(datetime(2024, 1, 1, 12, 0), 'available')],
+                                   datetime(2024, 1, 1), datetime(2024, 1, 2))
+        
+        assert sla['availability'] == 100.0
+        assert sla['unknown_seconds'] == 12 * 3600
+    
+    def test_hosts_missing_from_a_full_poll_are_closed_out(self):
+        """Test that hosts removed from Zabbix stop counting in their last status."""
+        from datetime import datetime
+        from modules.core.database import _record_status_transitions
+        
+        current = [
+            {'host_id': '1', 'host_name': 'web01', 'status': 'available', 'host_groups': '[]', 'removed_at': None},
+            {'host_id': '2', 'host_name': 'old01', 'status': 'unavailable', 'host_groups': '[]', 'removed_at': None}
+        ]
+        cursor = Mock()
+        cursor.fetchall.return_value = current
+        poll = [{'hostid': '1', 'name': 'web01', 'availability': 'Available'}]
+        now = datetime(2024, 1, 1, 12, 0)
+        
+        # Pojedynczy host (archive_host_status) to nie cały poll - nic nie zamykamy
+        assert _record_status_transitions(cursor, poll, now) == 0
+        cursor.executemany.assert_not_called()
+        
+        assert _record_status_transitions(cursor, poll, now, complete=True) == 1
+        history_sql, history_rows = cursor.executemany.call_args_list[0][0]
+        assert 'host_status_history' in history_sql
+        assert history_rows == [('2', 'old01', 'unknown', None, None, now)]
+        update_sql, update_rows = cursor.executemany.call_args_list[1][0]
+        assert 'removed_at' in update_sql
+        assert update_rows == [(now, now, '2')]
+        
+        # Kolejny poll nie zamyka ponownie już usuniętego hosta
+        current[1].update(status='unknown', removed_at=now)
+        cursor.reset_mock()
+        assert _record_status_transitions(cursor, poll, now, complete=True) == 0
+        cursor.executemany.assert_not_called()
+        
+        # Pusty wynik host.get nie zamyka całej floty
+        assert _record_status_transitions(cursor, [], now, complete=True) == 0
+        cursor.executemany.assert_not_called()